@@ -0,0 +1,297 @@
+"""Compact model artifacts replacing pickled sklearn pipelines.
+
+An artifact is a `{name}.model` directory beside the model's pickle holding the
+model's trees and a `manifest.json`:
+
+	{name}.model/
+		manifest.json   # kind, features, classes, scaler, file hashes and a content hash
+		trees/*.npy     # flattened trees (see `fwi_predict.trees`)
+		booster.ubj     # XGBoost models exported with `native=True`: the booster as UBJSON
+
+Only pipelines of an optional `StandardScaler` followed by an `XGBClassifier` or a
+`HistGradientBoostingClassifier` without categorical splits can be exported.
+Flattened trees are checked against the model on export, memory-mapped on load
+and evaluated with NumPy, so neither sklearn nor xgboost is imported to load or
+predict with them. File hashes are written on export and only checked on load
+when asked for.
+"""
+import hashlib
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .trees import TreeEnsemble, check_ensemble
+
+ARTIFACT_SUFFIX = '.model'
+MANIFEST_NAME = 'manifest.json'
+BOOSTER_NAME = 'booster.ubj'
+FORMAT_VERSION = 2
+
+XGBOOST = 'xgboost'
+HIST_GRADIENT_BOOSTING = 'hist_gradient_boosting'
+
+COMPILED = 'compiled' # Flattened trees evaluated with NumPy.
+NATIVE = 'native' # The XGBoost booster.
+AUTO = 'auto' # Native for artifacts with a booster if xgboost is installed, as it is faster, else compiled.
+
+CHECK_ROWS = 2000 # Synthetic rows flattened trees are checked on when exported.
+
+
+class UnsupportedModelError(ValueError):
+	"""Raised when exporting a model whose pipeline or trees artifacts cannot represent."""
+
+
+def get_artifact_path(model_path: Union[str, Path]) -> Path:
+	"""Get the artifact directory of a model pickle, e.g. 'XGBoost.pkl' -> 'XGBoost.model'."""
+	model_path = Path(model_path)
+	return model_path.with_name(f"{model_path.stem}{ARTIFACT_SUFFIX}")
+
+
+def _sha256(path: Path) -> str:
+	digest = hashlib.sha256()
+	with open(path, 'rb') as f:
+		for block in iter(lambda: f.read(2 ** 20), b''):
+			digest.update(block)
+	return digest.hexdigest()
+
+
+def _content_hash(manifest: Dict) -> str:
+	"""Hash of everything in a manifest but the hash itself, covering file hashes."""
+	content = {key: value for key, value in manifest.items() if key != 'content_hash'}
+	return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+class ClassEncoder:
+	"""Label encoder restored from an artifact's class names.
+
+	Attributes:
+		classes_: class names, in encoded order.
+	"""
+
+	def __init__(self, classes: List):
+		self.classes_ = np.asarray(classes)
+
+
+	def transform(self, y) -> np.ndarray:
+		return np.searchsorted(self.classes_, y)
+
+
+	def inverse_transform(self, y) -> np.ndarray:
+		return self.classes_[np.asarray(y)]
+
+
+class ArtifactModel:
+	"""Classifier loaded from an artifact, with the `predict_proba` interface of the pipeline.
+
+	Attributes:
+		manifest: the artifact manifest.
+		ensemble: flattened trees.
+		booster: XGBoost booster, if loaded.
+		backend: 'compiled' to predict with the flattened trees, or 'native' with the booster.
+		n_threads: threads the flattened trees are evaluated on.
+		feature_names_in_: features the model expects, in order.
+		classes_: encoded classes, in the order of probability columns.
+	"""
+
+	def __init__(self, manifest: Dict, ensemble: TreeEnsemble, booster=None, n_threads: int = 1):
+		self.manifest = manifest
+		self.ensemble = ensemble
+		self.booster = booster
+		self.backend = COMPILED if booster is None else NATIVE
+		self.n_threads = n_threads
+		self.feature_names_in_ = np.asarray(manifest['feature_names'], dtype=object)
+		self.classes_ = np.asarray(manifest['classes'])
+		scaler = manifest['scaler']
+		self._mean = None if scaler is None or scaler['mean'] is None else np.asarray(scaler['mean'])
+		self._scale = None if scaler is None or scaler['scale'] is None else np.asarray(scaler['scale'])
+
+
+	def _transform(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+		"""Get scaled inputs as an array, keeping float32 inputs float32 like StandardScaler."""
+		if isinstance(X, pd.DataFrame):
+			if list(X.columns) != self.manifest['feature_names']:
+				X = X[self.manifest['feature_names']]
+			X = X.to_numpy()
+		dtype = X.dtype if X.dtype in (np.float32, np.float64) else np.float64
+		X = np.array(X, dtype=dtype, copy=self._mean is not None or self._scale is not None)
+		if self._mean is not None:
+			X -= self._mean
+		if self._scale is not None:
+			X /= self._scale
+		return X
+
+
+	def predict_proba(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+		X = self._transform(X)
+		if self.backend == NATIVE:
+			proba = self.booster.inplace_predict(X, iteration_range=tuple(self.manifest['iteration_range']))
+			return np.column_stack([1 - proba, proba]) if proba.ndim == 1 else proba
+		return self.ensemble.predict_proba(X, n_threads=self.n_threads)
+
+
+	def predict(self, X: Union[pd.DataFrame, np.ndarray]) -> np.ndarray:
+		return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def _split_pipeline(pipeline) -> Tuple[object, object]:
+	"""Get the scaler and classifier of a pipeline, or raise an UnsupportedModelError for other pipelines."""
+	steps = [step for _, step in pipeline.steps] if hasattr(pipeline, 'steps') else [pipeline]
+	steps = [step for step in steps if step not in (None, 'passthrough')]
+	names = [type(step).__name__ for step in steps]
+	if names not in (['XGBClassifier'], ['HistGradientBoostingClassifier'],
+									 ['StandardScaler', 'XGBClassifier'], ['StandardScaler', 'HistGradientBoostingClassifier']):
+		raise UnsupportedModelError(f"Cannot export a pipeline of {names}.")
+	return (steps[0], steps[1]) if len(steps) == 2 else (None, steps[0])
+
+
+def _get_check_inputs(n_features: int, seed: int = 0) -> np.ndarray:
+	"""Get synthetic scaled inputs, with missing values, to check flattened trees on."""
+	rng = np.random.default_rng(seed)
+	X = rng.normal(scale=2, size=(CHECK_ROWS, n_features))
+	X[rng.random(X.shape) < 0.05] = np.nan
+	return X
+
+
+def export_model(model, outdir: Union[str, Path], encoder=None, feature_names: List[str] = None,
+								 atol: float = 1e-6, native: bool = False) -> Dict:
+	"""Export a fitted pipeline as an artifact.
+
+	Args:
+		model: pipeline of an optional StandardScaler and an XGBClassifier or
+			HistGradientBoostingClassifier.
+		outdir: artifact directory to create, replacing any existing artifact.
+		encoder: label encoder of the target, if any.
+		feature_names: features of the model. Defaults to `model.feature_names_in_`.
+		atol: largest allowed difference of the flattened trees' probabilities from
+			the classifier's on synthetic inputs.
+		native: also save the booster of XGBoost models, for the native backend.
+
+	Returns:
+		The artifact manifest.
+
+	Raises:
+		UnsupportedModelError: if the model is not a pipeline of supported steps, or
+			its classifier cannot be flattened (e.g. it has categorical splits).
+		ValueError: if the flattened trees do not match the classifier.
+	"""
+	scaler, classifier = _split_pipeline(model)
+	kind = XGBOOST if type(classifier).__name__ == 'XGBClassifier' else HIST_GRADIENT_BOOSTING
+	if feature_names is None:
+		feature_names = list(model.feature_names_in_)
+
+	outdir = Path(outdir)
+	tmpdir = outdir.with_name(f"{outdir.name}.tmp")
+	if tmpdir.exists():
+		shutil.rmtree(tmpdir)
+	tmpdir.mkdir(parents=True)
+
+	manifest = {
+		'format_version': FORMAT_VERSION,
+		'kind': kind,
+		'feature_names': [str(name) for name in feature_names],
+		'classes': np.asarray(classifier.classes_).tolist(),
+		'encoder_classes': None if encoder is None else np.asarray(encoder.classes_).tolist(),
+		'scaler': None if scaler is None else {
+			'mean': None if scaler.mean_ is None or not scaler.with_mean else scaler.mean_.tolist(),
+			'scale': None if scaler.scale_ is None or not scaler.with_std else scaler.scale_.tolist()
+		}
+	}
+
+	check_X = _get_check_inputs(len(feature_names))
+	if kind == XGBOOST:
+		booster = classifier.get_booster().copy()
+		best_iteration = booster.attr('best_iteration')
+		booster.feature_names = None # Inputs are ordered by the manifest, so arrays need no names.
+		booster.feature_types = None
+		if native:
+			(tmpdir / BOOSTER_NAME).write_bytes(booster.save_raw('ubj'))
+		manifest['iteration_range'] = [0, 0 if best_iteration is None else int(best_iteration) + 1]
+		check_X = check_X.astype(np.float32)
+	try:
+		if kind == XGBOOST:
+			ensemble = TreeEnsemble.from_xgboost(booster, tuple(manifest['iteration_range']))
+		else:
+			ensemble = TreeEnsemble.from_hist_gradient_boosting(classifier)
+	except ValueError as e:
+		shutil.rmtree(tmpdir)
+		raise UnsupportedModelError(str(e)) from e
+	manifest['max_abs_diff'] = check_ensemble(ensemble, classifier, check_X, atol=atol)
+	manifest['ensemble'] = ensemble.save(tmpdir / 'trees')
+
+	manifest['files'] = {
+		path.relative_to(tmpdir).as_posix(): _sha256(path)
+		for path in sorted(tmpdir.rglob('*')) if path.is_file()
+	}
+	manifest['content_hash'] = _content_hash(manifest)
+	(tmpdir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+
+	if outdir.exists():
+		shutil.rmtree(outdir)
+	tmpdir.rename(outdir)
+	return manifest
+
+
+def read_manifest(path: Union[str, Path]) -> Dict:
+	"""Read the manifest of an artifact."""
+	with open(Path(path) / MANIFEST_NAME) as f:
+		return json.load(f)
+
+
+def load_artifact(path: Union[str, Path], verify: bool = False, mmap: bool = True, backend: str = AUTO,
+									n_threads: int = 1) -> Tuple[ArtifactModel, ClassEncoder]:
+	"""Load a model artifact.
+
+	Args:
+		path: artifact directory.
+		verify: check the artifact files against the hashes in the manifest, which
+			reads every file. Off by default, as files are hashed when exported.
+		mmap: memory-map tree arrays rather than reading them.
+		backend: 'compiled', 'native' (XGBoost models exported with `native=True`
+			only) or 'auto'.
+		n_threads: threads flattened trees are evaluated on.
+
+	Returns:
+		The model and its label encoder, or None if it has none.
+
+	Raises:
+		ValueError: if the artifact has an unknown format or fails verification.
+	"""
+	path = Path(path)
+	manifest = read_manifest(path)
+	if manifest.get('format_version') != FORMAT_VERSION:
+		raise ValueError(f"Unknown format version {manifest.get('format_version')} of {path}. "
+										 f"Re-export it with scripts/export_models.py.")
+
+	if verify:
+		if _content_hash(manifest) != manifest['content_hash']:
+			raise ValueError(f"Manifest of {path} does not match its content hash.")
+		for name, digest in manifest['files'].items():
+			if _sha256(path / name) != digest:
+				raise ValueError(f"{path / name} does not match its hash in the manifest.")
+
+	if backend not in (AUTO, COMPILED, NATIVE):
+		raise ValueError(f"Unknown backend '{backend}'.")
+	has_booster = BOOSTER_NAME in manifest['files']
+	if backend == NATIVE and not has_booster:
+		raise ValueError(f"{path} has no booster for the native backend. "
+										 f"Export XGBoost models with native=True to add one.")
+
+	booster = None
+	if has_booster and backend != COMPILED:
+		try:
+			import xgboost as xgb # Only needed for the native backend.
+		except ImportError:
+			if backend == NATIVE:
+				raise
+		else:
+			booster = xgb.Booster()
+			booster.load_model(bytearray((path / BOOSTER_NAME).read_bytes()))
+
+	ensemble = TreeEnsemble.load(path / 'trees', manifest['ensemble'], mmap=mmap)
+	model = ArtifactModel(manifest, ensemble, booster=booster, n_threads=n_threads)
+	encoder = None if manifest['encoder_classes'] is None else ClassEncoder(manifest['encoder_classes'])
+	return model, encoder
@@ -0,0 +1,104 @@
+"""Content-addressed local cache of per-sample features."""
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Union
+
+import geopandas as gpd
+import pandas as pd
+import pyarrow.parquet as pq
+
+KEY_COLUMN = 'feature_key'
+SHARD_PREFIX_LENGTH = 2 # Hex digits of the key naming its shard, giving 256 shards.
+
+
+def get_feature_keys(samples: gpd.GeoDataFrame,
+										 forecast_times: List[int],
+										 bands: List[str],
+										 version: int,
+										 projection: Dict[str, List[str]] = None) -> pd.Series:
+	"""Hash what determines each sample's features into a cache key.
+
+	Keys cover the sample geometry (as WGS84 WKB), the UTC sample time, the forecast
+	times, the bands, the feature code version and any projection of the bands, so
+	changing any of them misses the cache rather than returning stale or partial
+	features.
+
+	Args:
+		samples: samples with `sample_dt` and geometry columns.
+		forecast_times: forecast times features are computed for.
+		bands: GFS bands features are computed from.
+		version: version of the feature code.
+		projection: bands computed by forecast time label, if only some are computed.
+
+	Returns:
+		Hex digest keys, indexed like samples.
+	"""
+	geometry = samples.geometry
+	if geometry.crs is not None and not geometry.crs.equals("EPSG:4326"):
+		geometry = geometry.to_crs(4326)
+
+	config = [list(forecast_times), list(bands), version]
+	if projection is not None:
+		config.append(projection)
+	config = json.dumps(config, sort_keys=True)
+	wkbs = geometry.to_wkb(hex=True)
+	times = pd.to_datetime(samples['sample_dt'], utc=True).dt.strftime('%Y-%m-%dT%H:%M:%S')
+
+	return pd.Series(
+		[hashlib.sha256(f"{config}|{wkb}|{t}".encode()).hexdigest() for wkb, t in zip(wkbs, times)],
+		index=samples.index
+	)
+
+
+class FeatureCache:
+	"""Features stored by content key in append-only Parquet files sharded by key prefix.
+
+	Each `save` writes one file of new rows per shard, named after a hash of its
+	keys, to `{root}/{prefix}/`, where the prefix is the first `SHARD_PREFIX_LENGTH`
+	hex digits of the key. Loading only reads the shards of the requested keys and
+	filters rows on read, so its cost grows with the request rather than the cache.
+	Concurrent or repeated runs never rewrite existing files.
+
+	Attributes:
+		root: directory holding the cache shards.
+	"""
+
+	def __init__(self, root: Union[str, Path]):
+		self.root = Path(root)
+
+
+	def load(self, keys: pd.Series) -> pd.DataFrame:
+		"""Load cached features for keys.
+
+		Returns:
+			Features indexed by key, for the keys found in the cache.
+		"""
+		keys = pd.Index(keys).unique()
+		tables = []
+		for prefix, shard_keys in pd.Series(keys, index=keys).groupby(keys.str[:SHARD_PREFIX_LENGTH]):
+			for path in sorted((self.root / prefix).glob("*.parquet")):
+				tables.append(pq.read_table(path, filters=[(KEY_COLUMN, 'in', shard_keys.tolist())]).to_pandas())
+
+		tables = [table for table in tables if not table.empty]
+		if not tables:
+			return pd.DataFrame(index=pd.Index([], name=KEY_COLUMN))
+
+		cached = pd.concat(tables).set_index(KEY_COLUMN)
+		return cached[~cached.index.duplicated(keep='last')]
+
+
+	def save(self, features: pd.DataFrame) -> None:
+		"""Add features indexed by key to the cache."""
+		features = features[~features.index.duplicated(keep='last')]
+		if features.empty:
+			return
+
+		features = features.rename_axis(KEY_COLUMN)
+		for prefix, shard in features.groupby(features.index.str[:SHARD_PREFIX_LENGTH]):
+			digest = hashlib.sha256("".join(sorted(shard.index)).encode()).hexdigest()[:16]
+			shard_dir = self.root / prefix
+			shard_dir.mkdir(parents=True, exist_ok=True)
+			tmp_path = shard_dir / f"{digest}.parquet.tmp"
+			shard.reset_index().to_parquet(tmp_path, index=False)
+			tmp_path.replace(shard_dir / f"{digest}.parquet")
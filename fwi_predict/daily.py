@@ -0,0 +1,133 @@
+"""Prediction samples for daily inference."""
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from timezonefinder import TimezoneFinder
+
+from .instrument import count, instrumented
+
+TIMEZONE_CACHE_PATH = './data/clean/pond_timezones.csv'
+LOCATION_DECIMALS = 6 # About 0.1 m, so ponds at the same location share one lookup.
+
+# Model features derived from stored columns when model inputs are built, as
+# (stored columns needed, function of the stored features), following training.
+DERIVED_FEATURES = {
+	'morning': (['hour'], lambda features: features['hour'] < 12),
+	'winkler': (['do_winkler'], lambda features: features['do_winkler'].astype(bool)),
+	'half_hour': (['sample_dt'], lambda features: (features['sample_dt'].dt.hour * 2 +
+																								 (features['sample_dt'].dt.minute >= 30).astype(int)))
+}
+
+
+def get_pond_timezones(ponds: gpd.GeoDataFrame,
+											 cache_path: Union[str, Path] = TIMEZONE_CACHE_PATH) -> pd.Series:
+	"""Get the timezone name of each pond, looking each location up only once.
+
+	Timezones are cached by rounded longitude and latitude in a CSV kept beside the
+	pond metadata. Only locations missing from the cache are looked up, with a single
+	`TimezoneFinder`, and added to the cache.
+
+	Args:
+		ponds: ponds with point geometries.
+		cache_path: CSV of cached timezones, or None to skip the cache.
+
+	Returns:
+		Timezone names, indexed like ponds.
+	"""
+	points = ponds.geometry if ponds.crs is None or ponds.crs.equals("EPSG:4326") else ponds.geometry.to_crs(4326)
+	locations = pd.DataFrame({
+		'lon': points.x.round(LOCATION_DECIMALS).to_numpy(),
+		'lat': points.y.round(LOCATION_DECIMALS).to_numpy()
+	})
+
+	cache_path = None if cache_path is None else Path(cache_path)
+	if cache_path is not None and cache_path.exists():
+		cached = pd.read_csv(cache_path, float_precision='round_trip')
+	else:
+		cached = pd.DataFrame({'lon': pd.Series(dtype=float), 'lat': pd.Series(dtype=float),
+													 'timezone': pd.Series(dtype=object)})
+
+	missing = locations.drop_duplicates().merge(cached[['lon', 'lat']], how='left', indicator=True)
+	missing = missing.loc[missing['_merge'] == 'left_only', ['lon', 'lat']]
+	if len(missing) > 0:
+		finder = TimezoneFinder()
+		missing['timezone'] = [finder.timezone_at(lng=lon, lat=lat) for lon, lat in zip(missing['lon'], missing['lat'])]
+		cached = pd.concat([cached, missing], ignore_index=True)
+		if cache_path is not None:
+			cache_path.parent.mkdir(parents=True, exist_ok=True)
+			cached.to_csv(cache_path, index=False)
+	count(locations_looked_up=len(missing))
+
+	return pd.Series(locations.merge(cached, how='left')['timezone'].to_numpy(), index=ponds.index)
+
+
+@instrumented()
+def prep_daily_sample(pond_metadata: gpd.GeoDataFrame,
+					  					target_date: Union[int, str] = 'tomorrow',
+					  					times_of_day: List[str] = ['08:00:00', '16:00:00'],
+											timezone_cache_path: Union[str, Path] = TIMEZONE_CACHE_PATH) -> gpd.GeoDataFrame:
+	"""Get dataframe of samples to predict for a given day and times of day.
+
+	Sample times are built with vectorized datetime operations and localized once
+	per pond timezone (see `get_pond_timezones`).
+	"""
+
+	keep_cols = ['pond_id', 'farmer', 'village', 'geometry', 'pond_depth_meters']
+	ponds = pond_metadata[keep_cols].copy()
+	ponds['do_winkler'] = True
+
+	# Add timezone information
+	ponds['timezones'] = get_pond_timezones(ponds, timezone_cache_path)
+
+	predict_samples = (
+		ponds.loc[ponds.index.repeat(len(times_of_day))]
+		.assign(
+			time_of_day=np.tile(np.asarray(times_of_day, dtype=object), len(ponds))
+		)
+		.reset_index(drop=True)
+	)
+
+	# Localize wall clock sample times in each pond's timezone. Like pytz's `localize`,
+	# ambiguous times are taken as standard time and times skipped by a DST transition
+	# are read with the offset before it, i.e. shifted forward by the (one hour) gap.
+	local_dt = pd.Timestamp(target_date) + pd.to_timedelta(predict_samples['time_of_day'])
+	sample_dt = [
+		local_dt[idx].dt.tz_localize(tz, ambiguous=np.zeros(len(idx), dtype=bool), nonexistent=pd.Timedelta(1, unit='h'))
+		for tz, idx in predict_samples.groupby('timezones').groups.items()
+	]
+	predict_samples['sample_dt'] = sample_dt[0] if len(sample_dt) == 1 else pd.concat(sample_dt).astype(object)
+
+	predict_samples['sample_idx'] = pd.Series(range(len(predict_samples)))
+	predict_samples = gpd.GeoDataFrame(predict_samples)
+	count(rows=len(predict_samples))
+
+	print(predict_samples.head())
+
+	return predict_samples
+
+
+def get_feature_columns(feature_names: List[str]) -> List[str]:
+	"""Get the stored feature columns needed to build a model's inputs (see `DERIVED_FEATURES`)."""
+	columns = [col for name in feature_names for col in DERIVED_FEATURES.get(name, ([name], None))[0]]
+	return list(dict.fromkeys(columns))
+
+
+def prep_model_input(features: pd.DataFrame, feature_names: List[str]) -> pd.DataFrame:
+	"""Get model inputs from stored features, adding the derived features a model uses."""
+	derived = {name: derive(features) for name, (_, derive) in DERIVED_FEATURES.items() if name in feature_names}
+	return features.assign(**derived)[feature_names]
+
+
+def predict_in_range(model, encoder, X: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+	"""Predict the class of each sample and its probability.
+
+	Returns:
+		Decoded class predictions and the probability of each predicted class.
+	"""
+	probs = model.predict_proba(X)
+	best = probs.argmax(axis=1)
+	preds = encoder.inverse_transform(np.asarray(model.classes_)[best])
+	return preds, probs[np.arange(len(X)), best]
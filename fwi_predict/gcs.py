@@ -1,45 +1,149 @@
 from pathlib import Path
-from typing import Union
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 
 from google.cloud import storage
 
+from .storage import CHUNK_SIZE, Storage
+
+
+class GCSStorage(Storage):
+	"""Files in a Google Cloud Storage bucket.
+
+	Downloads resume from a `.part` file left by an interrupted download, and
+	uploads use chunked resumable uploads so failed chunks are retried rather than
+	the whole file.
+
+	Attributes:
+		bucket: the GCS bucket.
+	"""
+
+	def __init__(self,
+							 bucket: str,
+							 project: str = 'fwi-water-quality-sensing',
+							 client: storage.Client = None):
+		client = storage.Client(project=project) if client is None else client
+		self.bucket = client.bucket(bucket)
+		self._blobs: Dict[str, storage.Blob] = {}
+
+
+	def list(self, glob: str) -> List[str]:
+		blobs = [blob for blob in self.bucket.list_blobs(match_glob=glob) if not blob.name.endswith('/')]
+		self._blobs.update({blob.name: blob for blob in blobs})
+		return [blob.name for blob in blobs]
+
+
+	def open(self, name: str) -> BinaryIO:
+		return self.bucket.blob(name).open('rb')
+
+
+	def _get_blob(self, name: str) -> Optional[storage.Blob]:
+		"""Get blob metadata, reusing metadata fetched by `list`."""
+		if name not in self._blobs:
+			blob = self.bucket.get_blob(name)
+			if blob is None:
+				return None
+			self._blobs[name] = blob
+		return self._blobs[name]
+
+
+	def stat(self, name: str) -> Optional[Tuple[int, str]]:
+		blob = self._get_blob(name)
+		return None if blob is None else (blob.size, blob.crc32c)
+
+
+	def _get(self, name: str, path: Path) -> int:
+		blob = self._get_blob(name)
+		part = path.with_name(path.name + '.part')
+		offset = part.stat().st_size if part.exists() else 0
+		if offset and offset >= blob.size:
+			part.unlink()
+			offset = 0
+
+		with open(part, 'ab') as f:
+			blob.download_to_file(f, start=offset or None, checksum=None)
+
+		# A stale partial file from an older version of the blob fails the check.
+		if not self.matches(name, part):
+			part.unlink()
+			if offset == 0:
+				raise IOError(f"Checksum mismatch downloading gs://{self.bucket.name}/{name}.")
+			return self._get(name, path)
+
+		part.replace(path)
+		return blob.size - offset
+
+
+	def _put(self, path: Path, name: str) -> int:
+		blob = self.bucket.blob(name, chunk_size=CHUNK_SIZE)
+		blob.upload_from_filename(path, checksum='crc32c')
+		self._blobs.pop(name, None)
+		return path.stat().st_size
+
 
 def download_files(bucket: str,
                    file_glob: Union[str, Path],
 				   				 download_dir: str,
-                   project: str = 'fwi-water-quality-sensing') -> None:
-	"""Download files from GCS bucket."""
-	client = storage.Client(project=project)
-	bucket = client.bucket(bucket)
-	glob = Path(file_glob).as_posix()
-	file_blobs = bucket.list_blobs(match_glob=glob)
+                   project: str = 'fwi-water-quality-sensing',
+                   max_workers: int = 8,
+                   client: storage.Client = None,
+                   storage_backend: Storage = None) -> List[Path]:
+	"""Download files from GCS bucket.
+
+	Files are downloaded concurrently. Local files with the size and CRC32C of their
+	blob are skipped, and interrupted downloads resume from their `.part` file.
+
+	Args:
+		bucket: name of the GCS bucket.
+		file_glob: glob of blob names to download.
+		download_dir: local directory to download blobs into, keeping their paths.
+		project: GCP project ID.
+		max_workers: number of concurrent downloads.
+		client: storage client, e.g. one pointed at a storage emulator. Defaults to
+			`storage.Client(project=project)`.
+		storage_backend: storage to download from instead of the GCS bucket, e.g. a
+			`LocalStorage` or `MirroredStorage`.
 
-	for blob in file_blobs:
-		fp = Path(download_dir) / blob.name
-		fp.parent.mkdir(parents=True, exist_ok=True)
-		blob.download_to_filename(fp)
+	Returns:
+		Local paths of the downloaded files.
+	"""
+	if storage_backend is None:
+		storage_backend = GCSStorage(bucket, project=project, client=client)
+
+	return storage_backend.download_files(file_glob, download_dir, max_workers=max_workers)
 
 
 def upload_files(source_path: Union[str, Path],
                  destination_path: Union[str, Path],
                  bucket: str,
                  project: str = 'fwi-water-quality-sensing',
-                 recursive: bool = True) -> None:
+                 recursive: bool = True,
+                 max_workers: int = 8,
+                 client: storage.Client = None,
+                 storage_backend: Storage = None) -> None:
     """Upload files or folders to Google Cloud Storage.
-    
+
+    Files are uploaded concurrently and files whose blob already has the same size
+    and CRC32C are skipped, so re-running an interrupted upload only sends what is
+    missing.
+
     Args:
         source_path: Local file/folder path to upload. Can be a glob pattern.
         destination_path: Destination path in GCS bucket.
         bucket: Name of the GCS bucket.
         project: GCP project ID. Defaults to 'fwi-water-quality-sensing'.
         recursive: Whether to recursively upload folders. Defaults to True.
+        max_workers: Number of concurrent uploads. Defaults to 8.
+        client: Storage client, e.g. one pointed at a storage emulator. Defaults to
+            `storage.Client(project=project)`.
+        storage_backend: Storage to upload to instead of the GCS bucket, e.g. a
+            `LocalStorage` to keep everything on local disk.
     """
-    client = storage.Client(project=project)
-    bucket = client.bucket(bucket)
-    
+    if storage_backend is None:
+        storage_backend = GCSStorage(bucket, project=project, client=client)
+
     source = Path(source_path)
     dest = Path(destination_path)
-    
+
     # Handle both file and folder uploads
     if source.is_file():
         files = [source]
@@ -47,13 +151,12 @@ def upload_files(source_path: Union[str, Path],
         # Use rglob for recursive search, glob for non-recursive
         glob_func = source.rglob if recursive else source.glob
         files = list(glob_func('*'))
-        
+
+    uploads = []
     for file_path in files:
         if file_path.is_file():
             # Calculate relative path to maintain folder structure
             rel_path = file_path.relative_to(source.parent if source.is_file() else source)
-            blob_path = dest / rel_path
-            
-            # Create blob and upload
-            blob = bucket.blob(blob_path.as_posix())
-            blob.upload_from_filename(file_path)
+            uploads.append((file_path, (dest / rel_path).as_posix()))
+
+    storage_backend.upload_files(uploads, max_workers=max_workers)
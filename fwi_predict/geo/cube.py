@@ -0,0 +1,556 @@
+"""Local GFS forecast cache and a NumPy implementation of GFS sample features."""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import ee
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from ..constants import FORECAST_TIMES, TZ_STRING
+from .ee import GFS_COMMON_BANDS, get_gfs, initialize
+from .grid import GFS_RESOLUTION, snap_to_gfs_grid
+
+HOUR_MS = 1000 * 60 * 60
+DAY_MS = 24 * HOUR_MS
+CYCLE_MS = 6 * HOUR_MS # GFS is initialized every six hours.
+GFS_MAX_LEAD_HOURS = 384 # Longest lead time of a GFS forecast cycle.
+MAX_CUBE_BYTES = 8 * 2 ** 30 # Largest cube pulled unless a caller allows more.
+
+
+class GFSCube:
+	"""GFS forecasts on the GFS grid, indexed by valid time and creation time.
+
+	Values are stored as a float32 array of shape
+	(time, creation_time, band, lat, lon) that is NaN wherever a forecast cycle
+	has no forecast for a time. Cubes saved with `save` are memory-mapped by `load`.
+
+	Attributes:
+		values: forecast values.
+		times: hourly forecast valid times in epoch milliseconds.
+		creation_times: forecast creation times in epoch milliseconds.
+		bands: band names.
+		lats: latitudes of pixel centres, north to south.
+		lons: longitudes of pixel centres, west to east.
+		start: earliest creation time requested when the cube was pulled.
+		end: creation time (exclusive) up to which the cube was requested.
+		pulled_at: time the cube was pulled in epoch milliseconds.
+		max_time: forecast valid time up to which each cycle was pulled, or None if
+			every cycle was pulled up to the longest lead time.
+	"""
+
+	def __init__(self, values: np.ndarray, times, creation_times, bands: List[str],
+							 lats, lons, start: int = None, end: int = None, pulled_at: int = None,
+							 max_time: int = None):
+		self.values = values
+		self.times = np.asarray(times, dtype=np.int64)
+		self.creation_times = np.asarray(creation_times, dtype=np.int64)
+		self.bands = list(bands)
+		self.lats = np.asarray(lats, dtype=np.float64)
+		self.lons = np.asarray(lons, dtype=np.float64)
+		self.start = int(self.creation_times.min()) if start is None else int(start)
+		self.end = int(self.creation_times.max()) + 1 if end is None else int(end)
+		self.pulled_at = int(time.time() * 1000) if pulled_at is None else int(pulled_at)
+		self.max_time = None if max_time is None else int(max_time)
+		self._available = None
+
+
+	@property
+	def available(self) -> np.ndarray:
+		"""Boolean (time, creation_time) mask of forecasts present in the cube."""
+		if self._available is None:
+			self._available = np.isfinite(self.values[:, :, 0]).any(axis=(-2, -1))
+		return self._available
+
+
+	@property
+	def max_lead_hours(self) -> int:
+		"""Longest forecast lead time held in the cube."""
+		t_idx, c_idx = np.nonzero(self.available)
+		if len(t_idx) == 0:
+			return 0
+		return int((self.times[t_idx] - self.creation_times[c_idx]).max() // HOUR_MS)
+
+
+	def covers(self, bounds: Tuple[float, float, float, float], start: int, end: int) -> bool:
+		"""Check whether the cube spans a bounding box and creation time window."""
+		min_lon, min_lat, max_lon, max_lat = bounds
+		tol = GFS_RESOLUTION / 2
+		return (
+			self.lons.min() - tol <= min_lon and max_lon <= self.lons.max() + tol and
+			self.lats.min() - tol <= min_lat and max_lat <= self.lats.max() + tol and
+			self.start <= start and end <= self.end
+		)
+
+
+	def save(self, path: Union[str, Path]) -> None:
+		"""Save cube as `values.npy` and `coords.json` in a directory."""
+		path = Path(path)
+		path.mkdir(parents=True, exist_ok=True)
+		if not (isinstance(self.values, np.memmap) and Path(self.values.filename) == (path / "values.npy").resolve()):
+			np.save(path / "values.npy", np.asarray(self.values, dtype=np.float32))
+		else:
+			self.values.flush()
+
+		coords = {
+			'times': self.times.tolist(),
+			'creation_times': self.creation_times.tolist(),
+			'bands': self.bands,
+			'lats': self.lats.tolist(),
+			'lons': self.lons.tolist(),
+			'start': self.start,
+			'end': self.end,
+			'pulled_at': self.pulled_at,
+			'max_time': self.max_time
+		}
+		with open(path / "coords.json", 'w') as f:
+			json.dump(coords, f)
+
+
+	@classmethod
+	def load(cls, path: Union[str, Path], mmap_mode: Optional[str] = 'r') -> 'GFSCube':
+		"""Load a saved cube, memory-mapping its values by default."""
+		path = Path(path)
+		with open(path / "coords.json") as f:
+			coords = json.load(f)
+		values = np.load(path / "values.npy", mmap_mode=mmap_mode)
+
+		return cls(values, **coords)
+
+
+def get_gfs_cube_bounds(samples: gpd.GeoDataFrame) -> Tuple[float, float, float, float]:
+	"""Get bounds of the GFS pixel centres containing samples."""
+	cells = snap_to_gfs_grid(samples)
+	return (cells['gfs_lon'].min(), cells['gfs_lat'].min(),
+					cells['gfs_lon'].max(), cells['gfs_lat'].max())
+
+
+def get_gfs_cube_window(samples: gpd.GeoDataFrame) -> Tuple[int, int]:
+	"""Get the creation time window needed to compute features for samples.
+
+	The seven day cumulative sums look furthest back, to forecasts created from
+	eight days before midnight (UTC) of the day prior to the sample, and no feature
+	uses forecasts created after the sample time.
+
+	Returns:
+		Tuple of (start, end) creation times in epoch milliseconds, end exclusive.
+	"""
+	sample_ms = _to_epoch_ms(samples['sample_dt'])
+	day_prior = sample_ms // DAY_MS * DAY_MS - DAY_MS
+	start = int(day_prior.min() - 8 * DAY_MS)
+	end = int(-(-sample_ms.max() // CYCLE_MS) * CYCLE_MS) # Round up to a forecast cycle.
+
+	return start, end
+
+
+def get_gfs_cube_max_time(samples: gpd.GeoDataFrame, forecast_times: List[int] = FORECAST_TIMES) -> int:
+	"""Get the latest forecast valid time needed to compute features for samples.
+
+	That is the later of the last forecast time and the sample time rounded to the
+	hour, which ends the same day sums.
+
+	Returns:
+		Forecast valid time in epoch milliseconds.
+	"""
+	sample_ms = _to_epoch_ms(samples['sample_dt'])
+	day_prior = sample_ms // DAY_MS * DAY_MS - DAY_MS
+	rounded = (sample_ms + HOUR_MS // 2) // HOUR_MS * HOUR_MS
+	last_forecast = day_prior + max(forecast_times) * HOUR_MS - 6 * HOUR_MS
+
+	return int(np.maximum(rounded, last_forecast).max())
+
+
+def get_latest_gfs_cycle(cube_root: Union[str, Path],
+												 gfs: ee.ImageCollection = None,
+												 project: str = 'fwi-water-quality-sensing') -> int:
+	"""Get the creation time of the latest GFS cycle in Earth Engine.
+
+	The result is cached in `latest_cycle.json` under `cube_root` and Earth Engine is
+	only asked again once a new six hour cycle has started, so reruns within a cycle
+	do not query Earth Engine. Earth Engine is only initialized (for `project`) when
+	it is queried.
+
+	Returns:
+		Creation time of the latest cycle in epoch milliseconds.
+	"""
+	path = Path(cube_root) / "latest_cycle.json"
+	now = int(time.time() * 1000)
+	current_cycle = now // CYCLE_MS * CYCLE_MS
+	if path.exists():
+		with open(path) as f:
+			cached = json.load(f)
+		if cached['checked_at'] >= current_cycle:
+			return cached['creation_time']
+
+	if gfs is None:
+		initialize(project)
+		gfs = get_gfs()
+	latest = int(gfs.filterDate(current_cycle - 2 * DAY_MS, now).aggregate_max('creation_time').getInfo())
+	print(f"Latest GFS cycle in Earth Engine was created {pd.Timestamp(latest, unit='ms'):%Y-%m-%d %H}:00 UTC.")
+
+	path.parent.mkdir(parents=True, exist_ok=True)
+	with open(path, 'w') as f:
+		json.dump({'creation_time': latest, 'checked_at': now}, f)
+
+	return latest
+
+
+def get_gfs_cube_nbytes(bounds: Tuple[float, float, float, float],
+												start: int,
+												end: int,
+												max_lead_hours: int = 72,
+												n_bands: int = len(GFS_COMMON_BANDS)) -> int:
+	"""Get an upper bound on the size of the values of a cube, assuming a cycle every six hours.
+
+	Cubes are dense over (time, creation_time, band, lat, lon), so their size grows
+	with the square of the creation time window.
+	"""
+	min_lon, min_lat, max_lon, max_lat = bounds
+	n_lons = int(round((max_lon - min_lon) / GFS_RESOLUTION)) + 1
+	n_lats = int(round((max_lat - min_lat) / GFS_RESOLUTION)) + 1
+	n_cycles = -(-(end - start) // CYCLE_MS)
+	n_times = (n_cycles - 1) * CYCLE_MS // HOUR_MS + max_lead_hours + 1
+
+	return int(n_times * n_cycles * n_bands * n_lats * n_lons * np.dtype(np.float32).itemsize)
+
+
+def download_gfs_cube(path: Union[str, Path],
+											bounds: Tuple[float, float, float, float],
+											start: int,
+											end: int,
+											max_lead_hours: int = 72,
+											bands: List[str] = GFS_COMMON_BANDS,
+											gfs: ee.ImageCollection = None,
+											images_per_request: int = 100,
+											max_workers: int = 8,
+											max_time: int = None,
+											max_bytes: int = MAX_CUBE_BYTES,
+											project: str = 'fwi-water-quality-sensing') -> GFSCube:
+	"""Pull GFS forecasts over a bounding box into a memory-mapped cube on disk.
+
+	Each request fetches up to `images_per_request` forecasts of one forecast cycle
+	as a single multi-band array with `ee.data.computePixels`. Cubes are dense, so
+	long creation windows (e.g. a multi-year training set) are refused rather than
+	allocating a file of hundreds of GB; export their features instead.
+
+	Args:
+		path: directory to write the cube to.
+		bounds: (min lon, min lat, max lon, max lat) of pixel centres to pull.
+		start: earliest creation time to pull in epoch milliseconds.
+		end: creation time (exclusive) to pull up to in epoch milliseconds.
+		max_lead_hours: longest forecast lead time to pull.
+		bands: GFS bands to pull.
+		gfs: GFS image collection. Defaults to the full GFS collection.
+		images_per_request: maximum number of forecast images per request.
+		max_workers: number of concurrent requests.
+		max_time: if given, only pull lead times of each cycle up to this forecast
+			valid time in epoch milliseconds, so older cycles are not pulled at long leads.
+		max_bytes: largest cube to allocate (see `get_gfs_cube_nbytes`).
+		project: Earth Engine project to initialize if `gfs` is not given.
+
+	Returns:
+		The downloaded cube.
+
+	Raises:
+		ValueError: if the cube would be larger than `max_bytes`, or no forecasts
+			were created in the window.
+	"""
+	nbytes = get_gfs_cube_nbytes(bounds, start, end, max_lead_hours, len(bands))
+	if nbytes > max_bytes:
+		raise ValueError(f"A GFS cube of {len(bands)} bands from {pd.Timestamp(start, unit='ms'):%Y-%m-%d} to "
+										 f"{pd.Timestamp(end, unit='ms'):%Y-%m-%d} over {bounds} would take up to "
+										 f"{nbytes / 2 ** 30:.1f} GiB, more than {max_bytes / 2 ** 30:.1f} GiB. Split the samples "
+										 f"by date or export their features instead.")
+
+	if gfs is None:
+		initialize(project)
+		gfs = get_gfs()
+
+	gfs = gfs \
+		.filterDate(start, end) \
+		.filter(ee.Filter.lte('forecast_hours', max_lead_hours)) \
+		.select(bands)
+
+	creation_times = np.array(sorted(gfs.aggregate_array('creation_time').distinct().getInfo()), dtype=np.int64)
+	if len(creation_times) == 0:
+		raise ValueError("No GFS forecasts were created in the requested window.")
+
+	min_lon, min_lat, max_lon, max_lat = bounds
+	lons = np.arange(min_lon, max_lon + GFS_RESOLUTION / 2, GFS_RESOLUTION)
+	lats = np.arange(max_lat, min_lat - GFS_RESOLUTION / 2, -GFS_RESOLUTION)
+	times = np.arange(creation_times[0], creation_times[-1] + (max_lead_hours + 1) * HOUR_MS, HOUR_MS)
+	grid = {
+		'dimensions': {'width': len(lons), 'height': len(lats)},
+		'affineTransform': {
+			'scaleX': GFS_RESOLUTION, 'shearX': 0, 'translateX': lons[0] - GFS_RESOLUTION / 2,
+			'shearY': 0, 'scaleY': -GFS_RESOLUTION, 'translateY': lats[0] + GFS_RESOLUTION / 2
+		},
+		'crsCode': 'EPSG:4326'
+	}
+
+	path = Path(path)
+	path.mkdir(parents=True, exist_ok=True)
+	values = np.lib.format.open_memmap(
+		path / "values.npy", mode='w+', dtype=np.float32,
+		shape=(len(times), len(creation_times), len(bands), len(lats), len(lons))
+	)
+	values[:] = np.nan
+
+	def pull(request: Tuple[int, int, int]) -> None:
+		"""Pull a range of lead times for one forecast cycle into the cube."""
+		c_idx, min_lead, max_lead = request
+		images = gfs \
+			.filter(ee.Filter.eq('creation_time', int(creation_times[c_idx]))) \
+			.filter(ee.Filter.rangeContains('forecast_hours', min_lead, max_lead))
+		pixels = ee.data.computePixels({
+			'expression': images.toBands(),
+			'fileFormat': 'NUMPY_NDARRAY',
+			'grid': grid
+		})
+
+		# toBands names bands {system:index}_{band}, e.g. 2025022518F008_temperature_2m_above_ground
+		for name in pixels.dtype.names:
+			index, band = name.split('_', 1)
+			lead = int(index.split('F')[-1])
+			t_idx = (creation_times[c_idx] + lead * HOUR_MS - times[0]) // HOUR_MS
+			values[t_idx, c_idx, bands.index(band)] = pixels[name]
+
+	lead_chunk = max(1, images_per_request - 1)
+	cycle_max_leads = np.full(len(creation_times), max_lead_hours)
+	if max_time is not None:
+		cycle_max_leads = np.clip(-(-(max_time - creation_times) // HOUR_MS), 0, max_lead_hours)
+	requests = [(c_idx, min_lead, min(min_lead + lead_chunk, int(cycle_max_leads[c_idx])))
+							for c_idx in range(len(creation_times))
+							for min_lead in range(0, int(cycle_max_leads[c_idx]) + 1, lead_chunk + 1)]
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		list(executor.map(pull, requests))
+
+	cube = GFSCube(values, times, creation_times, bands, lats, lons, start=start, end=end, max_time=max_time)
+	cube.save(path)
+
+	return cube
+
+
+def get_gfs_cube(cube_root: Union[str, Path],
+								 samples: gpd.GeoDataFrame,
+								 max_lead_hours: int = 72,
+								 bands: List[str] = GFS_COMMON_BANDS,
+								 forecast_times: List[int] = FORECAST_TIMES,
+								 project: str = 'fwi-water-quality-sensing') -> GFSCube:
+	"""Get a cube covering samples, reusing a cached cube when one is current.
+
+	A cached cube is reused if it spans the samples' grid cells, creation time
+	window and forecast valid times, and was pulled after the last forecast cycle
+	that could have appeared since (the window end, or the start of the current
+	cycle if that is earlier).
+
+	For samples whose window reaches past the latest GFS cycle (see
+	`get_latest_gfs_cycle`), e.g. predictions for tomorrow and following days, the
+	window ends at that cycle and lead times are extended to reach the last sample.
+	One cube per cycle then serves every target date the cycle covers, and reruns
+	within the cycle reuse it without querying Earth Engine.
+
+	Forecasts for a sample's forecast times (and sample time) must be created at
+	most 36 hours before its earliest forecast time, i.e. from 75 hours before
+	midnight (UTC) of the day prior to the sample for the default forecast times.
+	Samples more than about four days past the latest cycle therefore get no
+	single forecast features, only partial sums, and a warning is printed.
+
+	Args:
+		cube_root: directory holding cached cubes.
+		samples: samples with `sample_dt` and geometry columns.
+		max_lead_hours: longest forecast lead time to pull if a new cube is needed.
+		bands: GFS bands to pull if a new cube is needed.
+		forecast_times: forecast times features will be computed for.
+		project: Earth Engine project to initialize, only if Earth Engine is queried.
+
+	Returns:
+		A cube covering the samples.
+	"""
+	cube_root = Path(cube_root)
+	bounds = get_gfs_cube_bounds(samples)
+	start, end = get_gfs_cube_window(samples)
+	max_time = get_gfs_cube_max_time(samples, forecast_times)
+	current_cycle = int(time.time() * 1000) // CYCLE_MS * CYCLE_MS
+
+	# Only look up the latest cycle if the window could reach past it.
+	if end > current_cycle - 2 * DAY_MS:
+		latest_cycle = get_latest_gfs_cycle(cube_root, project=project)
+		sample_ms = _to_epoch_ms(samples['sample_dt'])
+		day_prior = sample_ms // DAY_MS * DAY_MS - DAY_MS
+		earliest_creation = day_prior + (min(forecast_times) - 6 - 36) * HOUR_MS
+		past_horizon = earliest_creation > latest_cycle
+		if past_horizon.any():
+			print(f"Warning: {past_horizon.sum()} of {len(samples)} samples are past the single forecast horizon "
+						f"of the latest GFS cycle ({pd.Timestamp(latest_cycle, unit='ms'):%Y-%m-%d %H}:00 UTC). "
+						f"Their forecast time features will be missing.")
+		if end > latest_cycle:
+			end = latest_cycle + 1
+			lead_hours = -(-(max_time - latest_cycle) // HOUR_MS)
+			if lead_hours > GFS_MAX_LEAD_HOURS:
+				print(f"Samples reach {lead_hours} hours past the latest GFS cycle, beyond its "
+							f"{GFS_MAX_LEAD_HOURS} hour forecasts. Features past that will be missing.")
+			max_lead_hours = int(min(max(max_lead_hours, lead_hours), GFS_MAX_LEAD_HOURS))
+
+	for coords_path in sorted(cube_root.glob("*/coords.json"), reverse=True):
+		cube = GFSCube.load(coords_path.parent)
+		is_current = cube.pulled_at >= min(end, current_cycle)
+		reaches = cube.times[-1] >= min(max_time, cube.creation_times[-1] + max_lead_hours * HOUR_MS) and \
+			(cube.max_time is None or cube.max_time >= max_time)
+		if cube.covers(bounds, start, end) and is_current and reaches and set(bands) <= set(cube.bands):
+			print(f"Using cached GFS cube {coords_path.parent}.")
+			return cube
+
+	cube_name = f"{pd.Timestamp(start, unit='ms'):%Y%m%d%H}_{pd.Timestamp(end, unit='ms'):%Y%m%d%H}"
+	print(f"Pulling GFS cube {cube_name} from Earth Engine.")
+	return download_gfs_cube(cube_root / cube_name, bounds, start, end,
+													 max_lead_hours=max_lead_hours, bands=bands, max_time=max_time, project=project)
+
+
+def _to_epoch_ms(datetimes: pd.Series) -> np.ndarray:
+	"""Convert (possibly mixed timezone) datetimes to UTC epoch milliseconds."""
+	utc = pd.to_datetime(datetimes, utc=True)
+	return utc.to_numpy(dtype='datetime64[ms]').astype(np.int64)
+
+
+def _local_time_at(utc_ms: np.ndarray, timezone: str, hour: int, minute: int) -> np.ndarray:
+	"""Get epoch millis of a local time of day on the local date of UTC times."""
+	local = pd.to_datetime(utc_ms, unit='ms', utc=True).tz_convert(timezone)
+	local = local.normalize() + pd.Timedelta(hour * 60 + minute, unit='m')
+	return local.tz_convert('UTC').to_numpy(dtype='datetime64[ms]').astype(np.int64)
+
+
+def _get_latest_forecasts(cube: GFSCube,
+													forecast_times: np.ndarray,
+													min_creation: np.ndarray,
+													max_creation: np.ndarray,
+													before_forecast_time: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+	"""Find the latest forecast for each requested time within a creation window.
+
+	Args:
+		cube: GFS cube.
+		forecast_times: (n, k) forecast valid times in epoch milliseconds.
+		min_creation: (n, 1) inclusive lower bound on creation time.
+		max_creation: (n, 1) exclusive upper bound on creation time.
+		before_forecast_time: whether creation must also precede the forecast time.
+
+	Returns:
+		Tuple of (time index, creation time index, found) arrays of shape (n, k).
+	"""
+	t_idx = (forecast_times - cube.times[0]) // HOUR_MS
+	in_cube = (t_idx >= 0) & (t_idx < len(cube.times)) & ((forecast_times - cube.times[0]) % HOUR_MS == 0)
+	t_idx = np.where(in_cube, t_idx, 0)
+
+	creation = cube.creation_times[None, None, :]
+	valid = cube.available[t_idx] & in_cube[..., None] & \
+		(creation >= min_creation[..., None]) & (creation < max_creation[..., None])
+	if before_forecast_time:
+		valid &= creation < forecast_times[..., None]
+
+	# Latest valid creation time is the last True along the creation axis.
+	c_idx = len(cube.creation_times) - 1 - np.argmax(valid[..., ::-1], axis=-1)
+	found = valid.any(axis=-1)
+
+	return t_idx, np.where(found, c_idx, 0), found
+
+
+def _gather(cube: GFSCube, t_idx, c_idx, found, lat_idx, lon_idx) -> np.ndarray:
+	"""Gather (n, k, band) values for found forecasts, NaN elsewhere."""
+	values = cube.values[t_idx, c_idx, :, lat_idx[:, None], lon_idx[:, None]].astype(np.float64)
+	values[~found] = np.nan
+	return values
+
+
+def get_cube_gfs_forecasts(cube: GFSCube,
+													 samples: gpd.GeoDataFrame,
+													 forecast_times: List[int] = FORECAST_TIMES,
+													 timezone: str = TZ_STRING) -> pd.DataFrame:
+	"""Compute `get_sample_gfs_forecast` features for all samples from a local cube.
+
+	Mirrors the Earth Engine implementation: forecasts are the latest created before
+	both the forecast time and midnight (UTC) of the day before the sample; daily
+	cumulative sums add the latest forecasts for 09:00 UTC on each of the preceding
+	days; hourly sums add the latest forecasts for each hour from 00:30 local time.
+
+	Args:
+		cube: GFS cube covering the samples.
+		samples: samples with `sample_idx`, `sample_dt` and geometry columns.
+		forecast_times: hours relative to midnight of the day before the sample.
+		timezone: timezone used to delimit daily sums.
+
+	Returns:
+		Long format dataframe in the layout of the Earth Engine export, one row per
+		sample and `forecast_time`, ready for `clean_gfs`.
+	"""
+	cells = snap_to_gfs_grid(samples)
+	lon_idx = np.rint((cells['gfs_lon'].to_numpy() - cube.lons[0]) / GFS_RESOLUTION).astype(int)
+	lat_idx = np.rint((cube.lats[0] - cells['gfs_lat'].to_numpy()) / GFS_RESOLUTION).astype(int)
+	if ((lon_idx < 0) | (lon_idx >= len(cube.lons)) | (lat_idx < 0) | (lat_idx >= len(cube.lats))).any():
+		raise ValueError("Samples fall outside of the GFS cube.")
+
+	sample_idx = samples['sample_idx'].to_numpy()
+	sample_ms = _to_epoch_ms(samples['sample_dt'])[:, None]
+	day_prior = sample_ms // DAY_MS * DAY_MS - DAY_MS
+	rounded = (sample_ms + HOUR_MS // 2) // HOUR_MS * HOUR_MS # Round half up like EE.
+	hours = np.asarray(forecast_times, dtype=np.int64)
+	earliest = day_prior + hours.min() * HOUR_MS - 6 * HOUR_MS - 36 * HOUR_MS
+
+	blocks = []
+
+	def add_block(label: str, values: np.ndarray, num_sum: np.ndarray,
+								creation_dt: np.ndarray = None, forecast_hour: np.ndarray = None) -> None:
+		block = pd.DataFrame(values, columns=cube.bands)
+		block.insert(0, 'sample_idx', sample_idx)
+		block.insert(1, 'forecast_time', label)
+		block.insert(2, 'forecast_creation_dt', creation_dt)
+		block.insert(3, 'forecast_hour', forecast_hour)
+		block['num_sum'] = num_sum
+		blocks.append(block)
+
+	def add_forecasts(labels: List[str], times: np.ndarray) -> None:
+		"""Add latest single forecasts created before the day prior."""
+		t_idx, c_idx, found = _get_latest_forecasts(cube, times, earliest, day_prior, before_forecast_time=True)
+		values = _gather(cube, t_idx, c_idx, found, lat_idx, lon_idx)
+		creation = pd.to_datetime(cube.creation_times[c_idx].ravel(), unit='ms').strftime('%Y%m%d%H').to_numpy()
+		lead = ((cube.times[t_idx] - cube.creation_times[c_idx]) // HOUR_MS).ravel()
+		creation = np.where(found.ravel(), creation, None).reshape(found.shape)
+		lead = np.array([f"{h:03d}" for h in lead], dtype=object).reshape(found.shape)
+		lead[~found] = None
+		for j, label in enumerate(labels):
+			add_block(label, values[:, j], found[:, j].astype(int), creation[:, j], lead[:, j])
+
+	def add_sum(label: str, times: np.ndarray, mask: np.ndarray, min_creation: np.ndarray,
+							max_creation: np.ndarray) -> None:
+		"""Add sum of the latest forecasts for each of a set of times."""
+		t_idx, c_idx, found = _get_latest_forecasts(cube, times, min_creation, max_creation)
+		found &= mask
+		values = _gather(cube, t_idx, c_idx, found, lat_idx, lon_idx)
+		num_sum = found.sum(axis=1)
+		totals = np.nansum(values, axis=1)
+		totals[num_sum == 0] = np.nan
+		add_block(label, totals, num_sum)
+
+	# Latest forecasts for forecast times and sample time
+	add_forecasts([str(h) for h in forecast_times], day_prior + hours * HOUR_MS - 6 * HOUR_MS)
+	add_forecasts(['sample'], rounded)
+
+	# Daily cumulative values at 09:00 UTC (15:30 IST)
+	for lookback_days, label in [(3, 'three_day_cum'), (7, 'seven_day_cum')]:
+		days = np.arange(0, -lookback_days - 1, -1)
+		times = day_prior + days * DAY_MS + 9 * HOUR_MS
+		add_sum(label, times, np.ones(times.shape, dtype=bool),
+						day_prior - (lookback_days + 1) * DAY_MS, sample_ms)
+
+	# Hourly sums up to sample time on the sample day and over the day before
+	same_day_start = _local_time_at(rounded[:, 0], timezone, 0, 30)[:, None]
+	before_day_start = _local_time_at(rounded[:, 0] - DAY_MS, timezone, 0, 30)[:, None]
+	for label, cum_start, cum_end in [('same_day_sum', same_day_start, rounded),
+																		('before_day_sum', before_day_start, before_day_start + DAY_MS)]:
+		n_hours = int(((cum_end - cum_start) // HOUR_MS).max()) + 1
+		times = cum_start + np.arange(max(n_hours, 0)) * HOUR_MS
+		add_sum(label, times, times <= cum_end, cum_start - 4 * DAY_MS, day_prior)
+
+	return pd.concat(blocks, ignore_index=True)
@@ -1,15 +1,23 @@
 """Utilities for Google Earth Engine."""
-import time
+import numbers
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Literal, Union
+from typing import Callable, Dict, List, Literal, Optional, Union
 
 import datetime
 import ee
 import geopandas as gpd
+import httplib2
 import pandas as pd
+import requests
 from geemap import gdf_to_ee
+from googleapiclient.errors import HttpError
 
 from ..constants import TZ_STRING
+from ..instrument import count, instrumented
+from .grid import shard_samples
+from .tasks import TaskMonitor, run_export_tasks, run_sync
 
 SENTINEL2_SCL_MAP = {
  	1: "Saturated/defective",
@@ -55,6 +63,58 @@ GFS_COMMON_BANDS = [
     'downward_shortwave_radiation_flux'
 ]
 
+GFS_SCALE = 27830 # Nominal GFS0P25 pixel size in meters.
+
+GFS_FEATURE_VERSION = 1 # Bump whenever GFS feature values change, to invalidate cached features.
+
+# Properties labelling each GFS image and every value sampled from it.
+GFS_LABEL_PROPERTIES = ['forecast_time', 'forecast_creation_dt', 'forecast_hour', 'num_sum']
+
+# Forecast time labels of GFS images other than the numeric forecast times.
+GFS_AGGREGATE_LABELS = ['sample', 'three_day_cum', 'seven_day_cum', 'same_day_sum', 'before_day_sum']
+
+# Errors of a synchronous Earth Engine request: computation errors, HTTP errors and
+# transport failures such as timeouts and dropped connections (OSError).
+EE_REQUEST_ERRORS = (ee.EEException, HttpError, httplib2.HttpLib2Error, requests.RequestException, OSError)
+
+
+_initialized_projects = set()
+_initialize_lock = threading.Lock()
+
+
+def initialize(project: str = 'fwi-water-quality-sensing') -> None:
+	"""Authenticate and initialize Earth Engine for a project, once per process."""
+	with _initialize_lock:
+		if project in _initialized_projects:
+			return
+		ee.Authenticate()
+		ee.Initialize(project=project)
+		_initialized_projects.add(project)
+
+
+def get_gfs_projection(feature_names: List[str], forecast_times: List[int]) -> Dict[str, List[str]]:
+	"""Get the GFS bands needed for each forecast time label by a set of features.
+
+	Feature names follow the `{band}_{forecast_time}` columns of `clean_gfs`, e.g.
+	`temperature_2m_above_ground_-9` or `relative_humidity_2m_above_ground_same_day_sum`.
+	Non GFS features are ignored.
+
+	Args:
+		feature_names: names of the features used by a model, e.g. `feature_names_in_`.
+		forecast_times: forecast times features can be computed for.
+
+	Returns:
+		Bands to compute by forecast time label, in `GFS_COMMON_BANDS` order.
+	"""
+	labels = [str(t) for t in forecast_times] + GFS_AGGREGATE_LABELS
+	projection = {}
+	for band in GFS_COMMON_BANDS:
+		for label in labels:
+			if f"{band}_{label}" in feature_names:
+				projection.setdefault(label, []).append(band)
+
+	return projection
+
 
 def get_sentinel2_l2a() -> ee.ImageCollection: 
 	"""Returns Sentinel-2 image collection."""
@@ -143,30 +203,26 @@ def get_nearest_sentinel2_image(feature: ee.Feature,
 	return ee.Image(collection.first())
 
 
-def monitor_task(task: ee.batch.Task, check_interval: int = 60) -> bool:
-	"""Check for Earth Engine task completion.
+@instrumented()
+def monitor_task(task: ee.batch.Task,
+				 check_interval: int = None,
+				 monitor: TaskMonitor = None) -> bool:
+	"""Wait for Earth Engine task completion.
 	
 	Args:
 		task: an Earth Engine task task.
-		check_interval: check status interval (in seconds).
+		check_interval: fixed check status interval (in seconds). Defaults to the
+			adaptive polling of `TaskMonitor`.
+		monitor: task monitor to wait with, e.g. to keep its task timings.
 
 	Returns:
 		True if task completed successfully, False otherwise.
 	"""
-	while True:
-		status = task.status()
-		state = status['state']
-		if state == 'COMPLETED':
-			print('Task completed.')
-			return True
-		elif state == 'FAILED':
-			print('Task failed.')
-			return False
-		elif state in ['CANCELLED', 'CANCEL_REQUESTED']:
-			print('Task was cancelled.')
-			return False
-		else:
-			time.sleep(check_interval)
+	if monitor is None:
+		monitor = TaskMonitor() if check_interval is None else \
+			TaskMonitor(min_interval=check_interval, max_interval=check_interval)
+
+	return run_sync(monitor.wait(task))
 
 
 def intersect_lists(previous, current):
@@ -190,217 +246,349 @@ def get_common_bands(collection: ee.ImageCollection) -> ee.List:
 def get_sample_gfs_forecast(sample: ee.Feature,
 							forecast_times: List,
 							gfs: ee.ImageCollection = None,
-							timezone: str = TZ_STRING) -> ee.FeatureCollection:
-	"""Add docstring."""
+							timezone: str = TZ_STRING,
+							projection: Dict[str, List[str]] = None) -> ee.FeatureCollection:
+	"""Get GFS forecast and cumulative values at a sample.
+
+	Args:
+		sample: sample with `sample_idx` and `sample_dt` properties.
+		forecast_times: hours relative to midnight of the day before the sample
+			for which to get the latest forecast.
+		gfs: GFS image collection. Defaults to the full GFS collection.
+		timezone: timezone used to delimit daily sums.
+		projection: bands to compute by forecast time label (see `get_gfs_projection`).
+			Defaults to all bands for all labels.
+
+	Returns:
+		Feature collection with one feature per `forecast_time`.
+	"""
 	if gfs is None:
 		gfs = get_gfs()
 
 	gfs = gfs.select(GFS_COMMON_BANDS)
 
-	# Get times for which we want forecasts.
-	sample_idx = sample.get('sample_idx') # Get sample index
-	sample_dt = ee.Date(sample.get('sample_dt'))
+	sample_idx = sample.get('sample_idx')
+	images = get_gfs_forecast_images(ee.Date(sample.get('sample_dt')), forecast_times, gfs, timezone, projection)
+
+	# Labels are carried through from each image, keeping the graph linear in forecast times.
+	return ee.FeatureCollection(images.map(lambda img: img
+		.sample(sample.geometry(), dropNulls=False)
+		.first()
+		.copyProperties(img, GFS_LABEL_PROPERTIES)
+		.set('sample_idx', sample_idx)
+	))
+
+
+def get_gfs_forecast_images(sample_dt: ee.Date,
+							forecast_times: List,
+							gfs: ee.ImageCollection = None,
+							timezone: str = TZ_STRING,
+							projection: Dict[str, List[str]] = None) -> ee.ImageCollection:
+	"""Get the labelled GFS images describing conditions at a sample time.
+
+	Builds the forecast, sample time and cumulative images that describe a sample,
+	with `forecast_time`, `num_sum` and forecast creation metadata set on the images
+	themselves so that the labels travel with values sampled from them at any number
+	of points sharing the sample time.
+
+	Args:
+		sample_dt: time of the sample.
+		forecast_times: hours relative to midnight of the day before the sample
+			for which to get the latest forecast.
+		gfs: GFS image collection. Defaults to the full GFS collection.
+		timezone: timezone used to delimit daily sums.
+		projection: bands to compute by forecast time label (see `get_gfs_projection`).
+			Labels missing from the projection are not computed. Defaults to all bands
+			for all labels.
+
+	Returns:
+		Image collection with one image per `forecast_time` label.
+	"""
+	if gfs is None:
+		gfs = get_gfs().select(GFS_COMMON_BANDS)
+
+	def is_needed(label) -> bool:
+		"""Check whether a label is in the projection."""
+		return projection is None or str(label) in projection
+
+	def project(image, label):
+		"""Select the bands of an image or collection needed for a label."""
+		return image if projection is None else image.select(projection[str(label)])
+
+	sample_dt = ee.Date(sample_dt)
 	day_prior = sample_dt \
-    	.advance(-1, 'day') \
-    	.update(hour=0, minute=0, second=0)
-  
-	forecast_time_list = ee.List(forecast_times).map(
-    	lambda hours: day_prior.advance(hours, 'hour').advance(-6, 'hour').millis() # Adjusting for IST timezone
- 	)
-
-  	# Pre-filter GFS to reduce computation
-	forecast_subset = gfs.filterDate( 
-    	ee.Date(forecast_time_list.sort().getNumber(0)).advance(-1.5, 'day'), # Earliest forecast initialization time we are interested in.
-    	day_prior # Want forecasts initialized one day before sample was taken (5:30am IST)
-  	)
-
-  	# Get latest forecast for each forecast (that is at least one day older than sample time)
+		.advance(-1, 'day') \
+		.update(hour=0, minute=0, second=0)
+
+	def get_forecast_time(hours: ee.Number) -> ee.Number:
+		"""Get forecast time in millis for hours after the day prior."""
+		return day_prior.advance(hours, 'hour').advance(-6, 'hour').millis() # Adjusting for IST timezone
+
+	earliest_forecast_time = ee.List(forecast_times).map(get_forecast_time).sort().getNumber(0)
+	forecast_subset = gfs.filterDate(
+		ee.Date(earliest_forecast_time).advance(-1.5, 'day'), # Earliest forecast initialization time we are interested in.
+		day_prior # Want forecasts initialized one day before sample was taken (5:30am IST)
+	)
+
 	def get_latest_forecast_for_time(forecast_time: ee.Number) -> ee.Image:
 		"""Get most recent forecast for a given forecast time."""
-    	# Get frecast for specific time of interest
 		subset = forecast_subset \
 			.filter(ee.Filter.lt('creation_time', forecast_time)) \
 			.filter(ee.Filter.eq('forecast_time', forecast_time))
-      
-    	# Then get most recent forecast
 		latest_init_time = subset.aggregate_array('creation_time').sort().get(-1)
-	
-		return subset.filter(ee.Filter.eq('creation_time', latest_init_time)).first()
-  
-  	# Extract forecast values
-	forecasts_for_times = ee.ImageCollection(
-    	forecast_time_list.map(get_latest_forecast_for_time)
-  	)
-	
-  # Assign metadata to forecast values and cumulative values
-	forecast_values = forecasts_for_times \
-		.map(lambda img: img.sample(sample.geometry(), dropNulls=False)) \
-		.flatten() \
-		.map(lambda f: f # Set metadata
-			.set('forecast_creation_dt', f.id().slice(0, 10)) # Same as below
-			.set('forecast_hour', f.id().slice(11, 14)) # Would be good to make this less hacky
-			.set('sample_idx', sample_idx)
-			.set('num_sum', 1)
-    	)
-	
-	# Map each element of forecast_time_list to each feature of forecast_values
-	forecast_values_list = forecast_values.toList(forecast_values.size())
-	forecast_values = ee.FeatureCollection(
-		forecast_values.map(lambda f: f.set('forecast_time', 
-			ee.List(forecast_times).get(forecast_values_list.indexOf(f))))
-	)
 
-  	# Get forecast at time of sample
+		return ee.Image(subset.filter(ee.Filter.eq('creation_time', latest_init_time)).first())
+
+	def label_forecast(image: ee.Image, label) -> ee.Image:
+		"""Label a single forecast image with its creation metadata."""
+		id = image.getString('system:id').split("/").getString(2)
+		return image.set({
+			'forecast_time': label,
+			'forecast_creation_dt': id.slice(0, 10),
+			'forecast_hour': id.slice(11, 14),
+			'num_sum': 1
+		})
+
+	# Latest forecast for each forecast time, labelled by forecast hours.
+	if projection is None:
+		forecast_images = ee.List(forecast_times).map(
+			lambda hours: label_forecast(get_latest_forecast_for_time(get_forecast_time(hours)), hours)
+		)
+	else:
+		forecast_images = [
+			project(label_forecast(get_latest_forecast_for_time(get_forecast_time(hours)), hours), hours)
+			for hours in forecast_times if is_needed(hours)
+		]
+
+	# Forecast at time of sample
 	sample_dt_rounded = ee.Date(
 		sample_dt.millis().divide(1000 * 60 * 60).round().multiply(1000 * 60 * 60)
 	) # Round sample time to nearest hour
-	sample_time_forecast = ee.Image(get_latest_forecast_for_time(sample_dt_rounded.millis()))
-
-	id = sample_time_forecast.getString('system:id').split("/").getString(2)
-	sample_time_forecast = sample_time_forecast \
-    	.sample(sample.geometry(), dropNulls=False) \
-    	.first()
-  
-	sample_time_forecast = sample_time_forecast \
-    	.set('forecast_creation_dt', id.slice(0, 10)) \
-		.set('forecast_hour', id.slice(11, 14)) \
-    	.set('forecast_time', 'sample') \
-    	.set('sample_idx', sample_idx) \
-		.set('num_sum', 1)
-
-  	# Get cumulative values in days prior at fixed time
-	def get_daily_cum(lookback_days: ee.Number) -> ee.Feature:
+	sample_time_forecast = label_forecast(
+		get_latest_forecast_for_time(sample_dt_rounded.millis()), 'sample'
+	)
+
+	def sum_forecasts(forecasts: ee.ImageCollection, label: str) -> ee.Image:
+		"""Sum a collection of forecasts, keeping original band names."""
+		total = ee.Image(project(forecasts, label).reduce(ee.Reducer.sum()))
+		return total \
+			.rename(total.bandNames().map(lambda name: ee.String(name).slice(0, -4))) \
+			.set({'forecast_time': label, 'num_sum': forecasts.size()})
+
+	def get_daily_cum(lookback_days: int, label: str) -> ee.Image:
 		"""Get cumulative history for a given number of days."""
-		cum_days = ee.List.sequence(0, ee.Number(lookback_days).multiply(-1), step=-1)
+		cum_days = ee.List.sequence(0, -lookback_days, step=-1)
 		gfs_subset = gfs.filterDate(
 			day_prior.advance(cum_days.sort().getNumber(0).subtract(1), 'day'),
 			sample_dt
 		)
+		history = ee.ImageCollection(
+			cum_days
+			.map(lambda day: day_prior.advance(day, 'day').update(hour=9).millis()) # 15:30 IST
+			.map(lambda f_time: gfs_subset.filter(ee.Filter.eq('forecast_time', f_time)).sort('creation_time', False).first())
+		)
+		return sum_forecasts(history, label)
 
-		global_history = ee.ImageCollection(
-      		cum_days
-      		.map(lambda day: day_prior.advance(day, 'day').update(hour=9).millis()) # 15:30 IST
-      		.map(lambda f_time: gfs_subset.filter(ee.Filter.eq('forecast_time', f_time)).sort('creation_time', False).first())
-    	)
-		global_aggregate = global_history.reduce(ee.Reducer.sum())
-    
-		cum_values = ee.Image(global_aggregate)
-		cum_values = cum_values \
-      		.rename(cum_values.bandNames().map(lambda name: ee.String(name).slice(0, -4))) \
-      		.sample(sample.geometry(), dropNulls=False) \
-      		.first() \
-			.set('num_sum', global_history.size())
-		
-		return cum_values
-		
-	three_day_history = get_daily_cum(3)
-	week_history = get_daily_cum(7)
-
-	three_day_history = three_day_history \
-    	.set('sample_idx', sample_idx) \
-    	.set('forecast_time', 'three_day_cum')
-  
-	week_history = week_history \
-    	.set('sample_idx', sample_idx) \
-    	.set('forecast_time', 'seven_day_cum')
-	
-
-	# Get cumulative values over course of a day
-	def get_hourly_cum(cum_start: ee.Date, cum_end: ee.Date) -> ee.Feature:
-		"""Vibes.
-		
-		Args:
-			cum_start: start time. Must be rounded to an hour.
-			cum_end: time to end sum. Must be rounded to an hour.
-			
-		Returns:
-			Feature containing the sum of hourly forecasts.
-		"""
-		forecast_subset = gfs.filterDate( 
+	def get_hourly_cum(cum_start: ee.Date, cum_end: ee.Date, label: str) -> ee.Image:
+		"""Get sum of hourly forecasts between two times rounded to the hour."""
+		hourly_subset = gfs.filterDate(
 			cum_start.advance(-4, 'day'),
 			day_prior # Want forecasts initialized one day before sample was taken (5:30am IST)
 		)
-
-		# Get hourly forecasts between start and end times
-		hourly_times = ee.List.sequence(
-			cum_start.millis(),
-			cum_end.millis(),
-			1000 * 60 * 60 # 1 hour steps
-		)
-
 		hourly_forecasts = ee.ImageCollection(
-			hourly_times
-			.map(lambda f_time: forecast_subset
+			ee.List.sequence(cum_start.millis(), cum_end.millis(), 1000 * 60 * 60) # 1 hour steps
+			.map(lambda f_time: hourly_subset
 				.filter(ee.Filter.eq('forecast_time', f_time))
 				.sort('creation_time', False)
 				.first()
 			)
 		)
+		return sum_forecasts(hourly_forecasts, label)
 
-		# Sum values across all hours
-		hourly_aggregate = hourly_forecasts.reduce(ee.Reducer.sum())
-		hourly_values = ee.Image(hourly_aggregate)
-		hourly_values = hourly_values \
-			.rename(hourly_values.bandNames().map(lambda name: ee.String(name).slice(0, -4))) \
-			.sample(sample.geometry(), dropNulls=False) \
-			.first() \
-			.set('num_sum', hourly_forecasts.size())
+	same_day_start = sample_dt_rounded.update(hour=0, minute=30, second=0, timeZone=timezone) # Offset due to Indian timezone.
+	before_day_start = sample_dt_rounded \
+		.advance(-1, 'day') \
+		.update(hour=0, minute=30, second=0, timeZone=timezone)
 
-		return hourly_values
+	aggregate_images = {
+		'sample': lambda: project(sample_time_forecast, 'sample'),
+		'three_day_cum': lambda: get_daily_cum(3, 'three_day_cum'),
+		'seven_day_cum': lambda: get_daily_cum(7, 'seven_day_cum'),
+		'same_day_sum': lambda: get_hourly_cum(same_day_start, sample_dt_rounded, 'same_day_sum'),
+		'before_day_sum': lambda: get_hourly_cum(before_day_start, before_day_start.advance(1, 'day'), 'before_day_sum')
+	}
 
+	return ee.ImageCollection.fromImages(forecast_images).merge(ee.ImageCollection.fromImages([
+		get_image() for label, get_image in aggregate_images.items() if is_needed(label)
+	]))
 
-	# Get sum of values up to sample time on day
-	cum_start = sample_dt_rounded.update(hour=0, minute=30, second=0, timeZone=timezone) # Offset due to Indian timezone.
-	same_day_sums = get_hourly_cum(cum_start, sample_dt_rounded)
-	
-	same_day_sums = same_day_sums \
-		.set('sample_idx', sample_idx) \
-		.set('forecast_time', 'same_day_sum')
 
-	# Get sum of values over previous day
-	cum_start = sample_dt_rounded \
-		.advance(-1, 'day') \
-		.update(hour=0, minute=30, second=0, timeZone=timezone)
-	cum_end = cum_start.advance(1, 'day')
-	before_day_sums = get_hourly_cum(cum_start, cum_end)
-
-	before_day_sums = before_day_sums \
-		.set('sample_idx', sample_idx) \
-		.set('forecast_time', 'before_day_sum')
-
-  # Merge and return
-	forecast_values = forecast_values.merge(
-		ee.FeatureCollection(
-			[
-				sample_time_forecast,
-				three_day_history,
-				week_history,
-				same_day_sums,
-				before_day_sums
-			]
-		)
-	)
-  
-	return forecast_values
+def get_gfs_forecasts_for_samples(samples: ee.FeatureCollection,
+								  forecast_times: List,
+								  gfs: ee.ImageCollection = None,
+								  timezone: str = TZ_STRING,
+								  projection: Dict[str, List[str]] = None) -> ee.FeatureCollection:
+	"""Sample GFS forecasts for many samples with one reduceRegions call per image.
 
+	Samples are grouped by `sample_dt`, the forecast images for each sample time
+	are built once and all sample points at that time are sampled against each
+	image together. Produces the same long format table as mapping
+	`get_sample_gfs_forecast` over the samples.
 
-def export_forecasts_for_samples(samples: gpd.GeoDataFrame,
-								 forecast_times: List[int],
-								 filepath: Union[str, Path],
-								 description: str = None,
-								 bucket: str = 'fwi-predict',
-								 project: str = 'fwi-water-quality-sensing') -> ee.batch.Task:
-	"""Export GFS forecasts for samples."""
-	ee.Authenticate()
-	ee.Initialize(project=project)
+	Args:
+		samples: samples with `sample_idx` and `sample_dt` properties.
+		forecast_times: hours relative to midnight of the day before each sample.
+		gfs: GFS image collection. Defaults to the full GFS collection.
+		timezone: timezone used to delimit daily sums.
+		projection: bands to compute by forecast time label. Defaults to all bands
+			for all labels.
+
+	Returns:
+		Feature collection with one feature per sample and `forecast_time`.
+	"""
+	if gfs is None:
+		gfs = get_gfs()
+
+	gfs = gfs.select(GFS_COMMON_BANDS)
+
+	def sample_at_time(time_feature: ee.Feature) -> ee.FeatureCollection:
+		"""Sample all points sharing a sample time."""
+		sample_dt = time_feature.get('sample_dt')
+		points = samples \
+			.filter(ee.Filter.eq('sample_dt', sample_dt)) \
+			.select(['sample_idx'])
+		images = get_gfs_forecast_images(ee.Date(sample_dt), forecast_times, gfs, timezone, projection)
 
-	# Export GFS data
+		# Name outputs after bands: reduceRegions names the output of a single band image 'first'.
+		return images.map(lambda img: img
+			.reduceRegions(collection=points, reducer=ee.Reducer.first().setOutputs(img.bandNames()), scale=GFS_SCALE)
+			.map(lambda f: f.copyProperties(img, GFS_LABEL_PROPERTIES).setGeometry(None))
+		).flatten()
+
+	return samples.distinct('sample_dt').map(sample_at_time).flatten()
+
+
+def samples_to_ee(samples: gpd.GeoDataFrame) -> ee.FeatureCollection:
+	"""Convert samples to an EE feature collection with `sample_idx` and `sample_dt`."""
 	small_df = samples[['sample_idx', 'sample_dt', 'geometry']]
-	samples_ee = gdf_to_ee(small_df, date='sample_dt', date_format="yyyy-MM-dd'T'HH:mm:ssZ")
+	return gdf_to_ee(small_df, date='sample_dt', date_format="yyyy-MM-dd'T'HH:mm:ssZ")
+
 
-	forecast_coll = samples_ee \
-		.map(lambda f: get_sample_gfs_forecast(f, forecast_times)) \
+def get_forecasts_for_samples(samples: gpd.GeoDataFrame,
+							  forecast_times: List[int],
+							  batched: bool = False,
+							  projection: Dict[str, List[str]] = None) -> ee.FeatureCollection:
+	"""Get the GFS forecast feature collection for samples.
+
+	Args:
+		samples: samples with `sample_idx`, `sample_dt` and geometry columns.
+		forecast_times: hours relative to midnight of the day before each sample.
+		batched: whether to use `get_gfs_forecasts_for_samples` rather than mapping
+			`get_sample_gfs_forecast` over the samples.
+		projection: bands to compute by forecast time label (see `get_gfs_projection`).
+			Defaults to all bands for all labels.
+
+	Returns:
+		Long format feature collection of GFS forecasts.
+	"""
+	samples_ee = samples_to_ee(samples)
+
+	if batched:
+		return get_gfs_forecasts_for_samples(samples_ee, forecast_times, projection=projection)
+
+	return samples_ee \
+		.map(lambda f: get_sample_gfs_forecast(f, forecast_times, projection=projection)) \
 		.flatten()
+
+
+class EarthEngineClient:
+	"""Computes GFS forecasts for small batches of samples with Earth Engine.
+
+	`compute_forecasts_for_samples` only calls `compute_gfs_forecasts`, so any object
+	with that method (e.g. one backed by a local `GFSCube`) can stand in for it.
+
+	Attributes:
+		batched: whether to sample forecasts with one reduceRegions call per image.
+		projection: bands to compute by forecast time label. Defaults to all bands
+			for all labels.
+	"""
+
+	def __init__(self, batched: bool = False, projection: Dict[str, List[str]] = None):
+		self.batched = batched
+		self.projection = projection
+
+
+	def compute_gfs_forecasts(self, samples: gpd.GeoDataFrame, forecast_times: List[int]) -> pd.DataFrame:
+		"""Compute the long format GFS forecast table for samples synchronously."""
+		forecast_coll = get_forecasts_for_samples(samples, forecast_times, batched=self.batched,
+																						 projection=self.projection)
+		forecasts = ee.data.computeFeatures({
+			'expression': forecast_coll,
+			'fileFormat': 'PANDAS_DATAFRAME'
+		})
+		forecasts = forecasts.drop(columns=['geo'], errors='ignore')
+
+		# Match the export CSV, where numeric and named forecast times are all read as text.
+		forecasts['forecast_time'] = [str(int(t)) if isinstance(t, numbers.Real) else t
+																	for t in forecasts['forecast_time']]
+		return forecasts
+
+
+@instrumented()
+def compute_forecasts_for_samples(samples: gpd.GeoDataFrame,
+								  forecast_times: List[int],
+								  chunk_size: int = 25,
+								  max_workers: int = 8,
+								  client: EarthEngineClient = None) -> pd.DataFrame:
+	"""Compute GFS forecasts for samples without an export task.
+
+	Splits samples into chunks and computes each chunk's forecasts with a concurrent
+	request, returning the same long format table as an export. Intended for small
+	sample sets such as daily inference, where export and GCS round-trips dominate.
+
+	Args:
+		samples: samples with `sample_idx`, `sample_dt` and geometry columns.
+		forecast_times: hours relative to midnight of the day before each sample.
+		chunk_size: number of samples per request.
+		max_workers: number of concurrent requests.
+		client: client computing forecasts for a chunk. Defaults to `EarthEngineClient()`.
+
+	Returns:
+		Long format GFS forecasts for all samples.
+	"""
+	if client is None:
+		client = EarthEngineClient()
+
+	chunks = [samples.iloc[i:i + chunk_size] for i in range(0, len(samples), chunk_size)]
+	with ThreadPoolExecutor(max_workers=max_workers) as executor:
+		forecasts = list(executor.map(lambda chunk: client.compute_gfs_forecasts(chunk, forecast_times), chunks))
+
+	forecasts = pd.concat(forecasts, ignore_index=True)
+	count(requests=len(chunks), rows=len(forecasts))
+
+	return forecasts
+
+
+def get_shard_path(filepath: Union[str, Path], shard: int = None) -> str:
+	"""Get the path of an export CSV within the bucket, or of one shard of it."""
+	fp = Path(filepath)
+	suffix = '' if shard is None else f"_shard{shard:03d}"
+	return (fp.parent / f"{fp.stem}{suffix}.csv").as_posix()
+
+
+@instrumented()
+def start_forecast_export(samples: gpd.GeoDataFrame,
+						  forecast_times: List[int],
+						  filepath: Union[str, Path],
+						  description: str = None,
+						  bucket: str = 'fwi-predict',
+						  batched: bool = False,
+						  projection: Dict[str, List[str]] = None) -> ee.batch.Task:
+	"""Start a CSV export of GFS forecasts for samples to GCS.
+
+	Assumes Earth Engine is already initialized. See `export_forecasts_for_samples`.
+	"""
+	forecast_coll = get_forecasts_for_samples(samples, forecast_times, batched=batched, projection=projection)
 	
 	# Format filepath
 	fp = Path(filepath)
@@ -422,6 +610,102 @@ def export_forecasts_for_samples(samples: gpd.GeoDataFrame,
 	return task
 
 
+def export_forecasts_for_samples(samples: gpd.GeoDataFrame,
+								 forecast_times: List[int],
+								 filepath: Union[str, Path],
+								 description: str = None,
+								 bucket: str = 'fwi-predict',
+								 project: str = 'fwi-water-quality-sensing',
+								 batched: bool = False,
+								 projection: Dict[str, List[str]] = None) -> ee.batch.Task:
+	"""Export GFS forecasts for samples.
+
+	Args:
+		samples: samples with `sample_idx`, `sample_dt` and geometry columns.
+		forecast_times: hours relative to midnight of the day before each sample.
+		filepath: path within the bucket to export to.
+		description: description of the export task.
+		bucket: GCS bucket to export to.
+		project: Earth Engine project.
+		batched: whether to sample all points sharing a sample time against each
+			forecast image at once (`get_gfs_forecasts_for_samples`) rather than
+			building a separate graph per sample (`get_sample_gfs_forecast`).
+		projection: bands to export by forecast time label (see `get_gfs_projection`).
+			Defaults to all bands for all labels.
+
+	Returns:
+		The started export task.
+	"""
+	initialize(project)
+
+	return start_forecast_export(samples, forecast_times, filepath,
+								 description=description, bucket=bucket, batched=batched,
+								 projection=projection)
+
+
+@instrumented()
+def export_sharded_forecasts_for_samples(samples: gpd.GeoDataFrame,
+										 forecast_times: List[int],
+										 filepath: Union[str, Path],
+										 num_shards: int,
+										 shard_by: Literal['date', 'cell'] = 'date',
+										 description: str = None,
+										 bucket: str = 'fwi-predict',
+										 project: str = 'fwi-water-quality-sensing',
+										 batched: bool = False,
+										 projection: Dict[str, List[str]] = None,
+										 max_concurrent: int = 4,
+										 max_retries: int = 2,
+										 on_complete: Callable[[str], None] = None,
+										 monitor: TaskMonitor = None) -> Optional[List[str]]:
+	"""Export GFS forecasts for samples as concurrent shard exports and wait for them.
+
+	Samples are split with `shard_samples` and shard `i` is exported to
+	`{filepath stem}_shard{i}.csv` beside `filepath`. Shards are run by
+	`run_export_tasks`, so only a failed shard is re-run rather than the whole export.
+
+	Args:
+		samples: samples with `sample_idx`, `sample_dt` and geometry columns.
+		forecast_times: hours relative to midnight of the day before each sample.
+		filepath: path within the bucket that shard paths are derived from.
+		num_shards: maximum number of shards to split samples into.
+		shard_by: whether to shard by ranges of sample date or GFS grid cell.
+		description: description of the export tasks, suffixed with the shard.
+		bucket: GCS bucket to export to.
+		project: Earth Engine project.
+		batched: see `export_forecasts_for_samples`.
+		projection: see `export_forecasts_for_samples`.
+		max_concurrent: maximum number of export tasks running at once.
+		max_retries: maximum number of times to restart a failed shard.
+		on_complete: called with the path of each shard CSV as soon as its export
+			completes, e.g. to download it while other shards are still running.
+		monitor: task monitor to wait on shards with. Defaults to `TaskMonitor()`.
+
+	Returns:
+		Paths of the shard CSVs within the bucket, or None if any shard failed.
+	"""
+	initialize(project)
+
+	shards = shard_samples(samples, num_shards, by=shard_by)
+	shard_paths = [get_shard_path(filepath, i) for i in range(len(shards))]
+	print(f"Exporting {len(samples)} samples in {len(shards)} shards, "
+		  f"at most {max_concurrent} at a time.")
+
+	def start_shard(i: int) -> ee.batch.Task:
+		shard_description = None if description is None else f"{description}_shard{i:03d}"
+		return start_forecast_export(shards[i], forecast_times, shard_paths[i],
+									 description=shard_description, bucket=bucket, batched=batched,
+									 projection=projection)
+
+	shard_complete = None if on_complete is None else (lambda i: on_complete(shard_paths[i]))
+	results = run_export_tasks(start_shard, len(shards), max_concurrent=max_concurrent,
+							   max_retries=max_retries, on_complete=shard_complete, monitor=monitor)
+	if not all(results):
+		return None
+
+	return shard_paths
+
+
 def get_sentinel2_values_at_feature(feature: ee.Feature, back_days: int = 10) -> ee.Feature:
   """Write docstring later."""
   nearest_image = get_nearest_sentinel2_image(feature, back_days=back_days)
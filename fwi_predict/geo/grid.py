@@ -0,0 +1,127 @@
+"""Utilities for planning GFS feature extraction on the forecast grid."""
+from typing import List, Literal, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point
+
+GFS_RESOLUTION = 0.25 # Degrees. GFS0P25 pixel centres sit on multiples of this.
+
+
+def snap_to_gfs_grid(samples: gpd.GeoDataFrame) -> pd.DataFrame:
+	"""Get the GFS grid cell centre containing each sample.
+
+	Args:
+		samples: samples with point (or pond polygon) geometries.
+
+	Returns:
+		Dataframe with `gfs_lon` and `gfs_lat` columns, indexed like samples.
+	"""
+	geometry = samples.geometry
+	if geometry.crs is not None and not geometry.crs.equals("EPSG:4326"):
+		geometry = geometry.to_crs(4326)
+	points = geometry.representative_point()
+
+	return pd.DataFrame({
+		'gfs_lon': np.round(points.x.to_numpy() / GFS_RESOLUTION) * GFS_RESOLUTION,
+		'gfs_lat': np.round(points.y.to_numpy() / GFS_RESOLUTION) * GFS_RESOLUTION
+	}, index=samples.index)
+
+
+def get_gfs_sample_keys(samples: gpd.GeoDataFrame) -> pd.DataFrame:
+	"""Get the (GFS cell, sample date, sample hour) key of each sample.
+
+	Every feature produced by `get_sample_gfs_forecast` depends on the sample only
+	through the GFS pixel it falls in, its UTC date (used for `day_prior`) and its
+	time rounded to the nearest hour, so samples sharing a key share features.
+	"""
+	keys = snap_to_gfs_grid(samples)
+	sample_dt = pd.to_datetime(samples['sample_dt'], utc=True)
+	keys['sample_date'] = sample_dt.dt.floor('D')
+	keys['sample_hour'] = (sample_dt + pd.Timedelta(30, unit='m')).dt.floor('h') # Round half up like EE.
+
+	return keys
+
+
+def plan_gfs_samples(samples: gpd.GeoDataFrame) -> Tuple[gpd.GeoDataFrame, pd.DataFrame]:
+	"""Collapse samples to one GFS query per unique grid cell and sample time.
+
+	Args:
+		samples: samples with `sample_idx`, `sample_dt` and geometry columns.
+
+	Returns:
+		Tuple of (GFS samples, sample map). GFS samples hold one row per unique key,
+		with a fresh `sample_idx`, a representative `sample_dt` and the grid cell centre
+		as geometry, so they can be passed straight to `export_forecasts_for_samples`.
+		The sample map links each original `sample_idx` to its `gfs_sample_idx`.
+	"""
+	keys = get_gfs_sample_keys(samples)
+	key_cols = keys.columns.tolist()
+	gfs_sample_idx = keys.groupby(key_cols, sort=False).ngroup()
+
+	sample_map = pd.DataFrame({
+		'sample_idx': samples['sample_idx'].to_numpy(),
+		'gfs_sample_idx': gfs_sample_idx.to_numpy()
+	})
+
+	first = ~gfs_sample_idx.duplicated()
+	gfs_samples = gpd.GeoDataFrame(
+		{
+			'sample_idx': gfs_sample_idx[first].to_numpy(),
+			'sample_dt': samples.loc[first, 'sample_dt'].reset_index(drop=True)
+		},
+		geometry=[Point(lon, lat) for lon, lat in keys.loc[first, ['gfs_lon', 'gfs_lat']].to_numpy()],
+		crs=4326
+	)
+
+	return gfs_samples, sample_map
+
+
+def fan_out_gfs(gfs_wide: pd.DataFrame, sample_map: pd.DataFrame) -> pd.DataFrame:
+	"""Expand features computed per GFS sample back to the original samples.
+
+	Args:
+		gfs_wide: features indexed by GFS `sample_idx` (output of `clean_gfs`).
+		sample_map: sample map from `plan_gfs_samples`.
+
+	Returns:
+		Features indexed by the original `sample_idx`.
+	"""
+	return sample_map \
+		.join(gfs_wide, on='gfs_sample_idx') \
+		.drop(columns='gfs_sample_idx') \
+		.set_index('sample_idx')
+
+
+def shard_samples(samples: gpd.GeoDataFrame,
+									num_shards: int,
+									by: Literal['date', 'cell'] = 'date') -> List[gpd.GeoDataFrame]:
+	"""Split samples into roughly equal shards of whole sample dates or GFS cells.
+
+	Samples sharing a UTC sample date (or GFS grid cell) always land in the same
+	shard, so each shard's export can share forecast images across its samples.
+
+	Args:
+		samples: samples with `sample_dt` and geometry columns.
+		num_shards: maximum number of shards. Fewer are returned if there are fewer
+			dates (or cells) than shards.
+		by: whether to shard contiguous ranges of sample dates or of GFS grid cells.
+
+	Returns:
+		List of non-empty sample shards.
+	"""
+	if by == 'date':
+		dates = pd.to_datetime(samples['sample_dt'], utc=True).dt.floor('D')
+		group = pd.factorize(dates, sort=True)[0]
+	elif by == 'cell':
+		group = snap_to_gfs_grid(samples).groupby(['gfs_lon', 'gfs_lat'], sort=True).ngroup().to_numpy()
+	else:
+		raise ValueError(f"Unknown shard key '{by}'. Expected 'date' or 'cell'.")
+
+	# Assign each group to a shard by the number of samples in groups before it.
+	sizes = np.bincount(group)
+	preceding = np.cumsum(sizes) - sizes
+	shard = (preceding * num_shards // len(samples))[group]
+
+	return [samples[shard == i] for i in np.unique(shard)]
@@ -0,0 +1,243 @@
+"""Asynchronous monitoring and scheduling of Earth Engine tasks."""
+import asyncio
+import re
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+import ee
+import pandas as pd
+
+from ..instrument import count
+
+TASK_SUCCESS_STATES = ['COMPLETED']
+TASK_FAILURE_STATES = ['FAILED', 'CANCELLED', 'CANCEL_REQUESTED']
+
+TIMING_COLUMNS = ['task_id', 'description', 'kind', 'state', 'error_message',
+									'queue_s', 'run_s', 'monitor_s']
+
+
+def get_task_kind(description: Optional[str]) -> str:
+	"""Get the kind of a task from its description, dropping trailing dates and shard numbers.
+
+	E.g. `daily_inference_2025-02-27` and `train_shard003` have kinds `daily_inference`
+	and `train_shard`.
+	"""
+	return re.sub(r'[\d_-]+$', '', description or '')
+
+
+def get_task(task_id: str) -> ee.batch.Task:
+	"""Get a handle on an existing Earth Engine task by ID, e.g. one started by an earlier process."""
+	return ee.batch.Task(task_id, 'EXPORT_FEATURES', 'UNKNOWN')
+
+
+def run_sync(coro):
+	"""Run a coroutine to completion, also from within a running event loop (e.g. Jupyter)."""
+	try:
+		asyncio.get_running_loop()
+	except RuntimeError:
+		return asyncio.run(coro)
+
+	with ThreadPoolExecutor(max_workers=1) as executor:
+		return executor.submit(asyncio.run, coro).result()
+
+
+class TaskMonitor:
+	"""Watches any number of Earth Engine tasks concurrently with adaptive polling.
+
+	Each task is polled quickly at first, backing off geometrically the longer it
+	runs. Once tasks of the same kind (see `get_task_kind`) have completed, a running
+	task is instead polled rarely until the median historical run time approaches and
+	quickly around it, so completion is noticed within seconds without polling long
+	tasks every few seconds.
+
+	Queue and run times of every finished task are kept in `records` and, if
+	`history_path` is given, appended to that CSV, which seeds the run time history
+	of later monitors.
+
+	Attributes:
+		min_interval: shortest time between polls of a task (in seconds).
+		max_interval: longest time between polls of a task (in seconds).
+		backoff: factor by which the interval grows on each poll without a history.
+		history_path: CSV of past task timings to read and append to.
+		history: run times (in seconds) of completed tasks by task kind.
+		records: timings of tasks finished under this monitor.
+	"""
+
+	def __init__(self,
+							 min_interval: float = 2,
+							 max_interval: float = 60,
+							 backoff: float = 1.5,
+							 history_path: Union[str, Path] = None):
+		self.min_interval = min_interval
+		self.max_interval = max_interval
+		self.backoff = backoff
+		self.history_path = None if history_path is None else Path(history_path)
+		self.history: Dict[str, List[float]] = {}
+		self.records: List[dict] = []
+
+		if self.history_path is not None and self.history_path.exists():
+			past = pd.read_csv(self.history_path)
+			past = past[past['state'].isin(TASK_SUCCESS_STATES) & past['run_s'].notna()]
+			for kind, run_s in past.groupby(past['kind'].fillna(''))['run_s']:
+				self.history[kind] = run_s.tolist()
+
+
+	def expected_runtime(self, kind: str) -> Optional[float]:
+		"""Median run time (in seconds) of completed tasks of a kind, if any."""
+		runtimes = self.history.get(kind)
+		return statistics.median(runtimes) if runtimes else None
+
+
+	async def wait(self, task: ee.batch.Task) -> bool:
+		"""Wait for a task to finish without blocking the event loop.
+
+		Returns:
+			True if task completed successfully, False otherwise.
+		"""
+		start = time.monotonic()
+		n_polls = 0
+		while True:
+			status = await asyncio.to_thread(task.status)
+			state = status['state']
+			kind = get_task_kind(status.get('description'))
+			if state in TASK_SUCCESS_STATES + TASK_FAILURE_STATES:
+				return self._record(status, kind, time.monotonic() - start)
+
+			# Sleep until shortly before the expected finish, then poll fast and back off.
+			interval = None
+			expected = self.expected_runtime(kind)
+			if expected is not None and state == 'RUNNING' and status.get('start_timestamp_ms'):
+				remaining = expected - (time.time() - status['start_timestamp_ms'] / 1000)
+				if remaining > 0:
+					interval = remaining / 2
+			if interval is None:
+				interval = self.min_interval * self.backoff ** n_polls
+				n_polls += 1
+
+			await asyncio.sleep(min(max(interval, self.min_interval), self.max_interval))
+
+
+	async def wait_all(self, tasks: List[ee.batch.Task]) -> List[bool]:
+		"""Wait for several tasks at once.
+
+		Returns:
+			Whether each task completed successfully.
+		"""
+		return list(await asyncio.gather(*(self.wait(task) for task in tasks)))
+
+
+	def timings(self) -> pd.DataFrame:
+		"""Get queue and run times of tasks finished under this monitor."""
+		return pd.DataFrame(self.records, columns=TIMING_COLUMNS)
+
+
+	def _record(self, status: dict, kind: str, monitor_s: float) -> bool:
+		"""Record timings of a finished task and report its outcome."""
+		created = status.get('creation_timestamp_ms')
+		started = status.get('start_timestamp_ms')
+		updated = status.get('update_timestamp_ms')
+		record = {
+			'task_id': status.get('id'),
+			'description': status.get('description'),
+			'kind': kind,
+			'state': status['state'],
+			'error_message': status.get('error_message'),
+			'queue_s': (started - created) / 1000 if created and started else None,
+			'run_s': (updated - started) / 1000 if started and updated else None,
+			'monitor_s': monitor_s
+		}
+		self.records.append(record)
+		count(ee_tasks=1, ee_queue_s=record['queue_s'] or 0, ee_run_s=record['run_s'] or 0)
+
+		success = record['state'] in TASK_SUCCESS_STATES
+		if success and record['run_s'] is not None:
+			self.history.setdefault(kind, []).append(record['run_s'])
+
+		if self.history_path is not None:
+			self.history_path.parent.mkdir(parents=True, exist_ok=True)
+			pd.DataFrame([record], columns=TIMING_COLUMNS).to_csv(
+				self.history_path, mode='a', index=False, header=not self.history_path.exists()
+			)
+
+		name = record['description'] or record['task_id']
+		if success:
+			print(f'Task {name} completed.')
+		elif record['state'] == 'FAILED':
+			print(f'Task {name} failed ({record["error_message"]}).')
+		else:
+			print(f'Task {name} was cancelled.')
+
+		return success
+
+
+async def run_export_tasks_async(start_task: Callable[[int], ee.batch.Task],
+																 num_tasks: int,
+																 max_concurrent: int = 4,
+																 max_retries: int = 2,
+																 backoff: int = 60,
+																 on_complete: Callable[[int], None] = None,
+																 monitor: TaskMonitor = None) -> List[bool]:
+	"""Run export tasks with a limit on concurrent tasks, retrying failures.
+
+	A failed or cancelled task is restarted up to `max_retries` times, waiting
+	`backoff` seconds before the first retry and doubling the wait for each
+	subsequent one. `on_complete` runs in a worker thread as soon as each task
+	completes, e.g. to download its output while other tasks are still running.
+
+	Args:
+		start_task: starts the task with a given index and returns it.
+		num_tasks: number of tasks to run.
+		max_concurrent: maximum number of tasks running at once.
+		max_retries: maximum number of times to restart a failed task.
+		backoff: seconds to wait before the first retry of a task.
+		on_complete: called with the index of each task that completes.
+		monitor: task monitor to wait on tasks with. Defaults to `TaskMonitor()`.
+
+	Returns:
+		Whether each task completed successfully.
+	"""
+	if monitor is None:
+		monitor = TaskMonitor()
+
+	semaphore = asyncio.Semaphore(max_concurrent)
+
+	async def run(i: int) -> bool:
+		for attempt in range(max_retries + 1):
+			if attempt > 0:
+				delay = backoff * 2 ** (attempt - 1)
+				print(f'Retrying task {i + 1}/{num_tasks} in {delay} seconds.')
+				await asyncio.sleep(delay)
+
+			async with semaphore:
+				try:
+					task = await asyncio.to_thread(start_task, i)
+				except ee.EEException as e:
+					print(f'Task {i + 1}/{num_tasks} failed to start ({e}).')
+					continue
+				success = await monitor.wait(task)
+
+			if success:
+				if on_complete is not None:
+					await asyncio.to_thread(on_complete, i)
+				return True
+
+		print(f'Task {i + 1}/{num_tasks} failed. Giving up after {max_retries + 1} attempts.')
+		return False
+
+	return list(await asyncio.gather(*(run(i) for i in range(num_tasks))))
+
+
+def run_export_tasks(start_task: Callable[[int], ee.batch.Task],
+										 num_tasks: int,
+										 max_concurrent: int = 4,
+										 max_retries: int = 2,
+										 backoff: int = 60,
+										 on_complete: Callable[[int], None] = None,
+										 monitor: TaskMonitor = None) -> List[bool]:
+	"""Blocking version of `run_export_tasks_async`."""
+	return run_sync(run_export_tasks_async(start_task, num_tasks, max_concurrent=max_concurrent,
+																				 max_retries=max_retries, backoff=backoff,
+																				 on_complete=on_complete, monitor=monitor))
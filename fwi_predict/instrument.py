@@ -0,0 +1,168 @@
+"""Optional per-stage timing and resource instrumentation.
+
+Instrumentation is off until `enable` is called. While it is off, `stage` returns a
+shared no-op context and `count` returns immediately, so instrumented code costs a
+global lookup per call.
+"""
+import contextvars
+import functools
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, List, Optional, Union
+
+try:
+	import resource
+except ImportError: # Not available on Windows.
+	resource = None
+
+_recorder = None
+_current_stage = contextvars.ContextVar('current_stage', default=None)
+
+
+def _peak_rss_mib() -> Optional[float]:
+	"""Peak resident set size of the process so far, in MiB."""
+	if resource is None:
+		return None
+	max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return max_rss / 2 ** 20 if sys.platform == 'darwin' else max_rss / 2 ** 10 # Bytes on macOS, KiB on Linux.
+
+
+class Recorder:
+	"""Stage records of one run.
+
+	Attributes:
+		run_id: identifier of the run.
+		started_at: UTC time the recorder was created.
+		records: one record per finished stage, in order of finishing.
+	"""
+
+	def __init__(self, run_id: str = None):
+		self.run_id = uuid.uuid4().hex if run_id is None else run_id
+		self.started_at = datetime.now(timezone.utc).isoformat()
+		self.records: List[dict] = []
+
+
+	def to_dict(self) -> dict:
+		"""Get the run as a JSON serializable dictionary."""
+		return {'run_id': self.run_id, 'started_at': self.started_at, 'stages': self.records}
+
+
+	def write(self, path: Union[str, Path]) -> Path:
+		"""Write the run as JSON."""
+		path = Path(path)
+		path.parent.mkdir(parents=True, exist_ok=True)
+		path.write_text(json.dumps(self.to_dict(), indent=2, default=str))
+		print(f"Saved stage metrics to {path}.")
+		return path
+
+
+class Stage:
+	"""Context timing a stage, recording counts added while it is the current stage.
+
+	Records wall time, process CPU time (of all threads) and the process peak RSS
+	at the end of the stage, along with the name of the enclosing stage.
+	"""
+
+	def __init__(self, name: str, recorder: Recorder):
+		self.name = name
+		self.recorder = recorder
+		self.counts = {}
+
+
+	def __enter__(self) -> 'Stage':
+		self.parent = _current_stage.get()
+		self._token = _current_stage.set(self)
+		self.started_at = datetime.now(timezone.utc).isoformat()
+		self._wall_start = time.perf_counter()
+		self._cpu_start = time.process_time()
+		return self
+
+
+	def __exit__(self, exc_type, exc, tb) -> bool:
+		_current_stage.reset(self._token)
+		self.recorder.records.append({
+			'name': self.name,
+			'parent': None if self.parent is None else self.parent.name,
+			'started_at': self.started_at,
+			'wall_s': time.perf_counter() - self._wall_start,
+			'cpu_s': time.process_time() - self._cpu_start,
+			'peak_rss_mib': _peak_rss_mib(),
+			'error': None if exc_type is None else exc_type.__name__,
+			**self.counts
+		})
+		return False
+
+
+	def count(self, **counts: float) -> None:
+		"""Add to counters of the stage, e.g. `rows` or `bytes_downloaded`."""
+		for key, value in counts.items():
+			self.counts[key] = self.counts.get(key, 0) + value
+
+
+class _NullStage:
+	"""Stage used while instrumentation is off."""
+
+	def __enter__(self) -> '_NullStage':
+		return self
+
+
+	def __exit__(self, exc_type, exc, tb) -> bool:
+		return False
+
+
+	def count(self, **counts: float) -> None:
+		pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def enable(run_id: str = None) -> Recorder:
+	"""Start recording stages into a new recorder."""
+	global _recorder
+	_recorder = Recorder(run_id)
+	return _recorder
+
+
+def disable() -> Optional[Recorder]:
+	"""Stop recording stages, returning the recorder that was in use."""
+	global _recorder
+	recorder, _recorder = _recorder, None
+	return recorder
+
+
+def stage(name: str) -> Union[Stage, _NullStage]:
+	"""Get a context timing a stage, or a no-op context if instrumentation is off."""
+	if _recorder is None:
+		return _NULL_STAGE
+	return Stage(name, _recorder)
+
+
+def count(**counts: float) -> None:
+	"""Add to counters of the current stage, if instrumentation is on."""
+	if _recorder is None:
+		return
+	current = _current_stage.get()
+	if current is not None:
+		current.count(**counts)
+
+
+def instrumented(name: str = None) -> Callable:
+	"""Decorate a function to run as a stage, named after the function by default."""
+	def decorator(fn: Callable) -> Callable:
+		stage_name = fn.__name__ if name is None else name
+
+		@functools.wraps(fn)
+		def wrapper(*args, **kwargs):
+			if _recorder is None:
+				return fn(*args, **kwargs)
+			with Stage(stage_name, _recorder):
+				return fn(*args, **kwargs)
+
+		return wrapper
+
+	return decorator
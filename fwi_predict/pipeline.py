@@ -1,78 +1,467 @@
+import asyncio
 from pathlib import Path
-from typing import Union
+from typing import Dict, List, Optional, Union
 
 import ee
 import geopandas as gpd
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
 
+from .cache import FeatureCache, get_feature_keys
 from .constants import FORECAST_TIMES
-from .geo.ee import export_forecasts_for_samples, monitor_task
-from .gcs import download_files
+from .geo.cube import get_cube_gfs_forecasts, get_gfs_cube
+from .geo.ee import (EE_REQUEST_ERRORS, GFS_AGGREGATE_LABELS, GFS_COMMON_BANDS, GFS_FEATURE_VERSION,
+										 EarthEngineClient, compute_forecasts_for_samples,
+										 export_forecasts_for_samples, export_sharded_forecasts_for_samples,
+										 get_gfs_projection, get_shard_path, initialize, monitor_task, start_forecast_export)
+from .geo.grid import fan_out_gfs, plan_gfs_samples, shard_samples
+from .geo.tasks import TaskMonitor, get_task, run_sync
+from .gcs import GCSStorage
+from .instrument import count, instrumented
+from .run import PipelineRun
+from .storage import MirroredStorage, Storage
+from .store import FeatureStore
 
 
-def clean_gfs(raw_gfs: pd.DataFrame) -> pd.DataFrame:
-	"""Cleans GFS data download."""
+# Columns of a GFS export needed by `clean_gfs`, with the types to parse them as.
+GFS_EXPORT_SCHEMA = {
+	'sample_idx': pa.int64(),
+	'forecast_time': pa.dictionary(pa.int32(), pa.string()),
+	**{col: pa.float32() for col in GFS_COMMON_BANDS + ['num_sum']}
+}
+
+
+@instrumented()
+def read_gfs_export(storage: Storage, names: List[str]) -> pa.Table:
+	"""Stream exported GFS CSVs into one typed Arrow table.
+
+	Each CSV is parsed batch by batch straight from its storage stream, keeping only
+	the `GFS_EXPORT_SCHEMA` columns, so no local copy or float64/object frame of the
+	whole export is made.
+
+	Args:
+		storage: storage holding the export, e.g. a `GCSStorage`.
+		names: names of the export CSVs (one per shard).
+
+	Returns:
+		Long format GFS export with float32 values and dictionary encoded `forecast_time`.
+	"""
+	convert_options = pv.ConvertOptions(column_types=GFS_EXPORT_SCHEMA,
+																			include_columns=list(GFS_EXPORT_SCHEMA),
+																			include_missing_columns=True)
+	tables = []
+	for name in names:
+		with storage.open(name) as f:
+			tables.append(pv.open_csv(f, convert_options=convert_options).read_all())
+			count(bytes_read=f.tell())
+
+	table = pa.concat_tables(tables).unify_dictionaries()
+	count(files=len(names), rows=table.num_rows)
+
+	return table
+
+
+@instrumented()
+def clean_gfs(raw_gfs: Union[pd.DataFrame, pa.Table]) -> pd.DataFrame:
+	"""Cleans GFS data download.
+
+	Pivots the long format export to one row per `sample_idx` and one
+	`{band}_{forecast_time}` column per value column and forecast time, ordered like
+	`DataFrame.pivot` would order them. Values are scattered column by column into a
+	preallocated float32 matrix using integer codes for `sample_idx` and
+	`forecast_time`, so memory peaks at the output plus a single input column.
+	"""
 	# Really ought to get correct time zones for forecasts again.
 	
-	gfs = raw_gfs.copy()
-	gfs = gfs.drop(columns=['system:index', '.geo'])
+	drop_cols = ['system:index', '.geo']
+	front_cols = ['sample_idx', 'forecast_time', 'forecast_creation_dt', 'forecast_hour']
+	value_cols = [col for col in raw_gfs.column_names if col not in front_cols + drop_cols] \
+		if isinstance(raw_gfs, pa.Table) else \
+		[col for col in raw_gfs.columns if col not in front_cols + drop_cols]
+
+	forecast_time = raw_gfs['forecast_time']
+	if isinstance(raw_gfs, pa.Table):
+		forecast_time = forecast_time.to_pandas()
+	if isinstance(forecast_time.dtype, pd.CategoricalDtype):
+		# Order forecast times like strings so columns match text exports.
+		forecast_time = forecast_time.cat.reorder_categories(sorted(forecast_time.cat.categories))
+
+	sample_codes, sample_idx = pd.factorize(raw_gfs['sample_idx'].to_numpy(), sort=True)
+	time_codes, forecast_times = pd.factorize(forecast_time, sort=True)
+	n_samples, n_times = len(sample_idx), len(forecast_times)
 
 	# Check data correctness
-	observations_per_measurement = gfs.groupby('sample_idx').size()
-	assert (observations_per_measurement.eq(observations_per_measurement.iloc[0]).all()), (
+	observations_per_measurement = np.bincount(sample_codes, minlength=n_samples)
+	assert (observations_per_measurement == observations_per_measurement[0]).all(), (
 		"Number of observations per measurement varies."
 	)
-
-	# Reorder columns and rows
-	front_cols = ['sample_idx', 'forecast_time', 'forecast_creation_dt', 'forecast_hour'] 
-	gfs = gfs[front_cols + [col for col in gfs.columns if col not in front_cols]]
-	gfs = gfs.sort_values(['sample_idx', 'forecast_time'])
+	cell_codes = sample_codes.astype(np.int64) * n_times + time_codes
+	if np.bincount(cell_codes).max(initial=0) > 1:
+		raise ValueError("Index contains duplicate entries, cannot reshape")
 
 	# Pivot wide to one observation per measurement
-	value_cols = gfs.columns[~gfs.columns.isin(front_cols)].tolist()
-	gfs_wide = gfs.pivot(index='sample_idx', columns='forecast_time', values=value_cols)
-	gfs_wide.columns = gfs_wide.columns.map('{0[0]}_{0[1]}'.format)
+	gfs_wide = np.full((n_samples, len(value_cols), n_times), np.nan, dtype=np.float32)
+	for j, col in enumerate(value_cols):
+		gfs_wide[sample_codes, j, time_codes] = raw_gfs[col].to_numpy()
 
-	return gfs_wide
+	count(rows_in=len(sample_codes), rows_out=n_samples)
+	return pd.DataFrame(
+		gfs_wide.reshape(n_samples, -1),
+		index=pd.Index(sample_idx, name='sample_idx'),
+		columns=[f"{col}_{time}" for col in value_cols for time in forecast_times]
+	)
 
 
-def create_standard_dataset(samples: gpd.GeoDataFrame,
-														gfs_gcs_filepath: Union[str, Path],
-														gfs_download_dir: str,
-														description: str,
-														gcs_bucket: str = 'fwi-predict',
-														gee_project: str = 'fwi-water-quality-sensing') -> pd.DataFrame:
-	"""Create standard modeling dataset for a set of samples."""
-	ee.Authenticate()
-	ee.Initialize(project=gee_project)
-	
+def run_gfs_export_stages(run: PipelineRun,
+													gfs_samples: gpd.GeoDataFrame,
+													gfs_gcs_filepath: Union[str, Path],
+													description: str,
+													gcs_bucket: str = 'fwi-predict',
+													batched: bool = False,
+													num_shards: int = 1,
+													shard_by: str = 'date',
+													max_retries: int = 2,
+													projection: Dict[str, List[str]] = None) -> Optional[List[str]]:
+	"""Export GFS features for samples as the resumable 'export' and 'wait' stages of a run.
+
+	The 'export' stage submits every shard export and stores its task ID in the run
+	as soon as it starts, so a restarted run waits on tasks already in flight rather
+	than resubmitting them. Earth Engine queues submitted tasks itself. The 'wait'
+	stage restarts failed shards up to `max_retries` times, storing the new task IDs.
+
+	Returns:
+		Paths of the exported CSVs within the bucket, or None if any shard failed.
+	"""
+	if num_shards > 1:
+		shards = shard_samples(gfs_samples, num_shards, by=shard_by)
+		paths = [get_shard_path(gfs_gcs_filepath, i) for i in range(len(shards))]
+		descriptions = [None if description is None else f"{description}_shard{i:03d}" for i in range(len(shards))]
+	else:
+		shards, paths, descriptions = [gfs_samples], [get_shard_path(gfs_gcs_filepath)], [description]
+
+	def start_shard(i: int) -> ee.batch.Task:
+		"""Start a shard export and store its task ID."""
+		task = start_forecast_export(shards[i], FORECAST_TIMES, paths[i], description=descriptions[i],
+																 bucket=gcs_bucket, batched=batched, projection=projection)
+		run.update('tasks', {paths[i]: task.id})
+		return task
+
+	def export() -> Dict[str, str]:
+		"""Start every shard export not already started."""
+		for i, path in enumerate(paths):
+			if path not in run.get('tasks', {}):
+				start_shard(i)
+		return run.get('tasks')
+
+	async def wait_shard(i: int, monitor: TaskMonitor) -> bool:
+		"""Wait on a shard's task, restarting it if it fails."""
+		task = get_task(run.get('tasks')[paths[i]])
+		for attempt in range(max_retries + 1):
+			if attempt > 0:
+				print(f"Restarting export of {paths[i]} (attempt {attempt + 1}/{max_retries + 1}).")
+				task = await asyncio.to_thread(start_shard, i)
+			if await monitor.wait(task):
+				return True
+		return False
+
+	def wait() -> Optional[List[str]]:
+		"""Wait until every shard export has completed."""
+		run.stage('export', export)
+		monitor = TaskMonitor()
+
+		async def wait_all() -> List[bool]:
+			return list(await asyncio.gather(*(wait_shard(i, monitor) for i in range(len(paths)))))
+
+		return paths if all(run_sync(wait_all())) else None
+
+	return run.stage('wait', wait)
+
+
+@instrumented()
+def export_gfs_features(gfs_samples: gpd.GeoDataFrame,
+												gfs_gcs_filepath: Union[str, Path],
+												gfs_download_dir: Optional[str],
+												description: str,
+												gcs_bucket: str = 'fwi-predict',
+												gee_project: str = 'fwi-water-quality-sensing',
+												batched: bool = False,
+												num_shards: int = 1,
+												shard_by: str = 'date',
+												max_concurrent_tasks: int = 4,
+												storage_backend: Storage = None,
+												projection: Dict[str, List[str]] = None,
+												run: PipelineRun = None) -> Optional[pa.Table]:
+	"""Export GFS features for samples through GCS and read the raw export.
+
+	With `num_shards` above one, samples are exported as concurrent shard tasks
+	(see `export_sharded_forecasts_for_samples`) and each shard is read as soon as it
+	completes. Exports are streamed from `storage_backend` if given, otherwise from
+	the GCS bucket, mirrored into `gfs_download_dir` unless it is None. Bands left out
+	of `projection` are read as missing values. With a `run`, the export is resumable
+	(see `run_gfs_export_stages`) and shards are read once all have completed.
+
+	Returns:
+		Raw long format GFS features (see `read_gfs_export`), or None if the export failed.
+	"""
+	if storage_backend is None:
+		storage_backend = GCSStorage(gcs_bucket, project=gee_project)
+		if gfs_download_dir is not None:
+			storage_backend = MirroredStorage(storage_backend, gfs_download_dir)
+
+	if run is not None:
+		paths = run_gfs_export_stages(run, gfs_samples, gfs_gcs_filepath, description,
+																	gcs_bucket=gcs_bucket, batched=batched, num_shards=num_shards,
+																	shard_by=shard_by, projection=projection)
+		if paths is None:
+			print("Data export failed. Please consult GEE task manager for information.")
+			return None
+
+		return read_gfs_export(storage_backend, paths)
+
+	if num_shards > 1:
+		shards = {}
+
+		def read_shard(shard_path: str) -> None:
+			"""Read a shard as soon as its export completes."""
+			shards[shard_path] = read_gfs_export(storage_backend, [shard_path])
+
+		shard_paths = export_sharded_forecasts_for_samples(gfs_samples,
+																											 FORECAST_TIMES,
+																											 gfs_gcs_filepath,
+																											 num_shards,
+																											 shard_by=shard_by,
+																											 description=description,
+																											 bucket=gcs_bucket,
+																											 project=gee_project,
+																											 batched=batched,
+																											 projection=projection,
+																											 max_concurrent=max_concurrent_tasks,
+																											 on_complete=read_shard)
+		if shard_paths is None:
+			print("Data export failed. Please consult GEE task manager for information.")
+			return None
+
+		return pa.concat_tables([shards[shard_path] for shard_path in shard_paths]).unify_dictionaries()
+
 	# Creat export and wait until it resolves.
-	task = export_forecasts_for_samples(samples,
+	task = export_forecasts_for_samples(gfs_samples,
 									 										FORECAST_TIMES,
 																			gfs_gcs_filepath,
 																			description=description,
 																			bucket=gcs_bucket,
-																			project=gee_project)
+																			project=gee_project,
+																			batched=batched,
+																			projection=projection)
 	task_success = monitor_task(task)
 
 	if not task_success:
 		print("Data export failed. Please consult GEE task manager for information.")
 		return None
 	
-	# Download exported data from GCS
-	## Consider using gsutil command line instead as it can multithread downloads
-	download_files(bucket=gcs_bucket,
-								 file_glob=gfs_gcs_filepath,
-								 download_dir=gfs_download_dir,
-								 project=gee_project)
+	# Stream exported data from GCS
+	return read_gfs_export(storage_backend, [get_shard_path(gfs_gcs_filepath)])
+
+
+@instrumented()
+def get_gfs_features(samples: gpd.GeoDataFrame,
+										 gfs_gcs_filepath: Union[str, Path],
+										 gfs_download_dir: Optional[str],
+										 description: str,
+										 gcs_bucket: str = 'fwi-predict',
+										 gee_project: str = 'fwi-water-quality-sensing',
+										 deduplicate: bool = True,
+										 batched: bool = False,
+										 gfs_cube_root: Union[str, Path] = None,
+										 sync_max_samples: int = 200,
+										 num_shards: int = 1,
+										 shard_by: str = 'date',
+										 max_concurrent_tasks: int = 4,
+										 storage_backend: Storage = None,
+										 projection: Dict[str, List[str]] = None,
+										 run: PipelineRun = None) -> Optional[pd.DataFrame]:
+	"""Compute cleaned GFS features for samples.
+
+	See `create_standard_dataset` for arguments. `projection` gives the bands to compute
+	by forecast time label (see `get_gfs_projection`); it is not applied to GFS cubes,
+	which compute every feature locally. With a `run`, the 'plan', 'download' and
+	'clean' stages are persisted in it and skipped once complete. Earth Engine is
+	only initialized once features are requested from it, so runs served by a cached
+	GFS cube or completed stages need no Earth Engine credentials.
+
+	Returns:
+		GFS features indexed by `sample_idx`, or None if the export failed.
+	"""
+	if run is not None and run.is_complete('clean'):
+		return run.load('clean')
+
+	@instrumented('plan')
+	def plan() -> tuple:
+		"""Only ask Earth Engine for each (GFS cell, sample time) once."""
+		if not deduplicate:
+			return samples, None
+
+		gfs_samples, sample_map = plan_gfs_samples(samples)
+		print(f"Extracting GFS features for {len(gfs_samples)} unique grid cell/time keys "
+					f"covering {len(samples)} samples.")
+		return gfs_samples, sample_map
+
+	gfs_samples, sample_map = plan() if run is None else run.stage('plan', plan)
+
+	@instrumented('download')
+	def download() -> Optional[Union[pd.DataFrame, pa.Table]]:
+		"""Get the raw long format GFS features."""
+		if gfs_cube_root is not None:
+			cube = get_gfs_cube(gfs_cube_root, gfs_samples, project=gee_project)
+			return get_cube_gfs_forecasts(cube, gfs_samples, FORECAST_TIMES)
+
+		initialize(gee_project)
+
+		if len(gfs_samples) <= sync_max_samples:
+			try:
+				return compute_forecasts_for_samples(gfs_samples, FORECAST_TIMES,
+																						 client=EarthEngineClient(batched=batched, projection=projection))
+			except EE_REQUEST_ERRORS as e:
+				print(f"Synchronous GFS computation failed ({type(e).__name__}: {e}). Falling back to export.")
+
+		return export_gfs_features(gfs_samples, gfs_gcs_filepath, gfs_download_dir, description,
+															 gcs_bucket=gcs_bucket, gee_project=gee_project, batched=batched,
+															 num_shards=num_shards, shard_by=shard_by,
+															 max_concurrent_tasks=max_concurrent_tasks,
+															 storage_backend=storage_backend, projection=projection, run=run)
+
+	gfs = download() if run is None else run.stage('download', download)
+	if gfs is None:
+		return None
 
 	# Clean GFS data
-	gfs_path = Path(gfs_download_dir) / gfs_gcs_filepath
-	gfs = pd.read_csv(gfs_path)
 	gfs_clean = clean_gfs(gfs)
+	if deduplicate:
+		gfs_clean = fan_out_gfs(gfs_clean, sample_map)
+
+	if run is not None:
+		run.complete('clean', gfs_clean)
+
+	return gfs_clean
+
+
+@instrumented()
+def create_standard_dataset(samples: gpd.GeoDataFrame,
+														gfs_gcs_filepath: Union[str, Path],
+														gfs_download_dir: Optional[str],
+														description: str,
+														gcs_bucket: str = 'fwi-predict',
+														gee_project: str = 'fwi-water-quality-sensing',
+														deduplicate: bool = True,
+														batched: bool = False,
+														gfs_cube_root: Union[str, Path] = None,
+														sync_max_samples: int = 200,
+														num_shards: int = 1,
+														shard_by: str = 'date',
+														max_concurrent_tasks: int = 4,
+														feature_cache_dir: Union[str, Path] = None,
+														feature_store_dir: Union[str, Path] = None,
+														storage_backend: Storage = None,
+														feature_names: List[str] = None,
+														run_dir: Union[str, Path] = None) -> pd.DataFrame:
+	"""Create standard modeling dataset for a set of samples.
+
+	Args:
+		samples: samples with `sample_idx`, `sample_dt` and geometry columns.
+		gfs_gcs_filepath: GCS path to export GFS features to.
+		gfs_download_dir: local directory to mirror the export into, or None to stream it
+			without writing local copies.
+		description: description of the Earth Engine export task.
+		gcs_bucket: GCS bucket to export to.
+		gee_project: Earth Engine project to run the export in.
+		deduplicate: whether to compute GFS features once per unique GFS grid cell and
+			sample time, rather than once per sample.
+		batched: whether to sample GFS images for all samples sharing a sample time
+			at once. See `export_forecasts_for_samples`.
+		gfs_cube_root: if given, compute GFS features locally from a GFS cube cached
+			in this directory (pulling one if needed) instead of exporting them.
+		sync_max_samples: largest number of GFS samples to compute synchronously with
+			concurrent requests instead of an export to GCS. Set to 0 to always export.
+		num_shards: number of export tasks to split a GFS export into.
+		shard_by: whether to shard exports by sample date ('date') or GFS grid cell ('cell').
+		max_concurrent_tasks: maximum number of shard export tasks running at once.
+		feature_cache_dir: if given, reuse GFS features cached in this directory for
+			samples with the same geometry, sample time and feature configuration, and
+			only compute features for the remaining samples.
+		feature_store_dir: if given, also write the dataset to a `FeatureStore` in
+			this directory, replacing stored features for the same sample dates. With
+			`feature_names`, rows are written as projected (see `FeatureStore`).
+		storage_backend: storage to read GFS exports through instead of the GCS bucket,
+			e.g. a `MirroredStorage` so repeated runs read exports from local disk.
+		feature_names: if given, only compute the GFS features among these names (e.g.
+			a model's `feature_names_in_`), leaving other GFS features missing. Defaults
+			to all GFS features.
+		run_dir: if given, persist the state and result of each stage (plan, export,
+			wait, download, clean, join) in this directory, so re-running with the same
+			directory resumes after the last completed stage and waits on export tasks
+			already in flight instead of resubmitting them. The run starts over if the
+			samples, feature names or export configuration differ from those it was
+			started with. See `PipelineRun`.
+
+	Returns:
+		Samples joined with their GFS features, or None if the export failed.
+	"""
+	run = None
+	if run_dir is not None:
+		run = PipelineRun(run_dir, inputs={
+			'samples': samples[['sample_idx', 'sample_dt', 'geometry']],
+			'feature_names': feature_names,
+			'config': {'forecast_times': FORECAST_TIMES, 'feature_version': GFS_FEATURE_VERSION,
+								 'gfs_gcs_filepath': gfs_gcs_filepath, 'gcs_bucket': gcs_bucket,
+								 'deduplicate': deduplicate, 'batched': batched, 'gfs_cube_root': gfs_cube_root,
+								 'num_shards': num_shards, 'shard_by': shard_by}
+		})
+	if run is not None and run.is_complete('join'):
+		return run.load('join')
+
+	projection = None
+	if feature_names is not None:
+		projection = get_gfs_projection(feature_names, FORECAST_TIMES)
+		print(f"Computing {sum(map(len, projection.values()))} of "
+					f"{len(GFS_COMMON_BANDS) * (len(FORECAST_TIMES) + len(GFS_AGGREGATE_LABELS))} GFS band/forecast time pairs.")
+
+	to_compute = samples
+	if feature_cache_dir is not None:
+		cache = FeatureCache(feature_cache_dir)
+		keys = get_feature_keys(samples, FORECAST_TIMES, GFS_COMMON_BANDS, GFS_FEATURE_VERSION,
+														projection=projection)
+		cached = cache.load(keys)
+		is_cached = keys.isin(cached.index)
+		to_compute = samples[~is_cached]
+		print(f"Found cached GFS features for {is_cached.sum()} of {len(samples)} samples.")
+
+	gfs_clean = None
+	if len(to_compute) > 0:
+		gfs_clean = get_gfs_features(to_compute, gfs_gcs_filepath, gfs_download_dir, description,
+																 gcs_bucket=gcs_bucket, gee_project=gee_project,
+																 deduplicate=deduplicate, batched=batched,
+																 gfs_cube_root=gfs_cube_root, sync_max_samples=sync_max_samples,
+																 num_shards=num_shards, shard_by=shard_by,
+																 max_concurrent_tasks=max_concurrent_tasks,
+																 storage_backend=storage_backend, projection=projection, run=run)
+		if gfs_clean is None:
+			return None
+
+	if feature_cache_dir is not None:
+		if gfs_clean is not None:
+			new_keys = keys[~is_cached].set_axis(to_compute['sample_idx'].to_numpy())
+			cache.save(gfs_clean.set_axis(new_keys.reindex(gfs_clean.index).to_numpy()))
+
+		# Join cached rows back in by sample.
+		cached_gfs = cached \
+			.reindex(keys[is_cached].to_numpy()) \
+			.set_axis(samples.loc[is_cached, 'sample_idx'].to_numpy())
+		gfs_clean = pd.concat([df for df in [cached_gfs, gfs_clean] if df is not None])
 
 	# Create prediction dataframe
 	predict_df = samples.set_index('sample_idx').join(gfs_clean).reset_index()
+	count(samples=len(samples), samples_computed=len(to_compute))
 
 	# Add time categoricals
 	predict_df['hour'] = predict_df['sample_dt'].dt.hour
@@ -82,4 +471,10 @@ def create_standard_dataset(samples: gpd.GeoDataFrame,
 	# predict_df['week_of_month'] = (predict_df['sample_dt'].dt.day - 1) // 7 + 1
 	# predict_df['day_of_week'] = predict_df['sample_dt'].dt.dayofweek
 
+	if feature_store_dir is not None:
+		FeatureStore(feature_store_dir).write(predict_df, projected=projection is not None)
+
+	if run is not None:
+		run.complete('join', predict_df)
+
 	return predict_df
\ No newline at end of file
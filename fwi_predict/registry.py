@@ -0,0 +1,210 @@
+"""In-process registry of trained models under the `models/` directory."""
+import json
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from .artifacts import ARTIFACT_SUFFIX, AUTO, MANIFEST_NAME, load_artifact
+from .instrument import count, instrumented
+
+ENCODER_NAME = 'encoder'
+FEATURES_SUFFIX = '_features'
+
+
+class ModelSpec:
+	"""Location of a trained model and its companion artifacts.
+
+	Attributes:
+		model_set: path of the model's target directory's parent relative to the
+			registry root, e.g. 'measurements_with_metadata_simple'. Empty for models
+			stored directly in a target directory such as 'do_mg_per_L'.
+		target: name of the target the model predicts, e.g. 'do_in_range'.
+		name: model name, e.g. 'XGBoost'.
+		path: model pickle, if any.
+		encoder_path: label encoder pickle of the target, if any.
+		features_path: JSON list of the model's features, if any.
+		artifact_path: exported artifact of the model (see `fwi_predict.artifacts`), if any.
+	"""
+
+	def __init__(self, model_set: str, target: str, name: str, path: Path = None,
+							 encoder_path: Path = None, features_path: Path = None, artifact_path: Path = None):
+		self.model_set = model_set
+		self.target = target
+		self.name = name
+		self.path = path
+		self.encoder_path = encoder_path
+		self.features_path = features_path
+		self.artifact_path = artifact_path
+
+
+	@property
+	def key(self) -> Tuple[str, str, str]:
+		return self.model_set, self.target, self.name
+
+
+	def __repr__(self) -> str:
+		return f"ModelSpec({'/'.join(part for part in self.key if part)})"
+
+
+class LoadedModel:
+	"""A loaded model with its encoder and validated feature names.
+
+	Attributes:
+		spec: where the model was loaded from.
+		model: the fitted estimator.
+		encoder: label encoder of the target, or None for models without one.
+		feature_names: features the model expects, in order.
+	"""
+
+	def __init__(self, spec: ModelSpec, model, encoder, feature_names: List[str]):
+		self.spec = spec
+		self.model = model
+		self.encoder = encoder
+		self.feature_names = feature_names
+
+
+	def check_features(self, columns) -> None:
+		"""Raise a ValueError if columns lack any of the model's features."""
+		columns = set(columns)
+		missing = [name for name in self.feature_names if name not in columns]
+		if missing:
+			raise ValueError(f"{self.spec} is missing required features: {missing}")
+
+
+def _load_pickle(path: Path):
+	with open(path, 'rb') as f:
+		return pickle.load(f)
+
+
+class ModelRegistry:
+	"""Index of the models under a directory, loaded lazily and kept warm.
+
+	Every `{model_set}/{target}/{name}.pkl` or exported `{name}.model` artifact under
+	`root` is indexed on creation, alongside the target's `encoder.pkl` and a
+	`{name}_features.json` feature list if present, but nothing is loaded until a
+	model is first requested. Artifacts are loaded in place of pickles when both
+	exist and `use_artifacts` is set. Up to
+	`max_loaded` loaded models are kept in memory, evicting the least recently used,
+	and each target's encoder is loaded once. A model's feature names are checked
+	against its feature list when it is loaded, so repeated predictions never
+	re-read a pickle or re-validate features.
+
+	Attributes:
+		root: directory holding the models.
+		max_loaded: maximum number of models kept loaded.
+		use_artifacts: whether to load artifacts rather than pickles.
+		backend: backend artifacts predict with (see `fwi_predict.artifacts.load_artifact`).
+		specs: indexed models by (model_set, target, name).
+	"""
+
+	def __init__(self, root: Union[str, Path] = './models', max_loaded: int = 16, use_artifacts: bool = True,
+							 backend: str = AUTO):
+		self.root = Path(root)
+		self.max_loaded = max_loaded
+		self.use_artifacts = use_artifacts
+		self.backend = backend
+		self.specs: Dict[Tuple[str, str, str], ModelSpec] = {}
+		self._loaded: 'OrderedDict[Tuple[str, str, str], LoadedModel]' = OrderedDict()
+		self._encoders: Dict[Path, object] = {}
+		self._lock = threading.RLock()
+
+		pickles = [path for path in self.root.rglob("*.pkl") if path.stem != ENCODER_NAME]
+		artifacts = [path.parent for path in self.root.rglob(f"*{ARTIFACT_SUFFIX}/{MANIFEST_NAME}")]
+		for path in sorted(set(path.with_suffix('') for path in pickles + artifacts)):
+			rel_dir = path.parent.relative_to(self.root)
+			model_set = rel_dir.parent.as_posix() if rel_dir.parent != Path('.') else ''
+			pickle_path = path.with_name(f"{path.name}.pkl")
+			encoder_path = path.parent / f"{ENCODER_NAME}.pkl"
+			features_path = path.with_name(f"{path.name}{FEATURES_SUFFIX}.json")
+			artifact_path = path.with_name(f"{path.name}{ARTIFACT_SUFFIX}")
+			spec = ModelSpec(model_set, rel_dir.name, path.name,
+											 path=pickle_path if pickle_path.exists() else None,
+											 encoder_path=encoder_path if encoder_path.exists() else None,
+											 features_path=features_path if features_path.exists() else None,
+											 artifact_path=artifact_path if (artifact_path / MANIFEST_NAME).exists() else None)
+			self.specs[spec.key] = spec
+
+
+	def list(self, target: str = None, model_set: str = None) -> List[ModelSpec]:
+		"""List indexed models, optionally only those of a target or model set."""
+		return [spec for spec in self.specs.values()
+						if (target is None or spec.target == target) and
+						(model_set is None or spec.model_set == model_set)]
+
+
+	def find(self, target: str, name: str, model_set: str = None) -> ModelSpec:
+		"""Find a single indexed model by target and name."""
+		matches = [spec for spec in self.list(target, model_set) if spec.name == name]
+		if len(matches) != 1:
+			where = f" in model set '{model_set}'" if model_set is not None else ''
+			raise KeyError(f"Found {len(matches)} models named '{name}' for target '{target}'{where}. "
+										 f"Pass model_set to choose between {[spec.model_set for spec in matches]}."
+										 if matches else f"No model named '{name}' for target '{target}'{where}.")
+		return matches[0]
+
+
+	def get(self, target: str, name: str, model_set: str = None) -> LoadedModel:
+		"""Get a loaded model, loading it on first use."""
+		spec = self.find(target, name, model_set)
+		with self._lock:
+			if spec.key in self._loaded:
+				self._loaded.move_to_end(spec.key)
+				count(model_cache_hits=1)
+				return self._loaded[spec.key]
+
+			loaded = self._load(spec)
+			self._loaded[spec.key] = loaded
+			while len(self._loaded) > self.max_loaded:
+				self._loaded.popitem(last=False)
+
+			return loaded
+
+
+	def get_all(self, target: str = None, model_set: str = None) -> List[LoadedModel]:
+		"""Get every indexed model of a target or model set, loading them as needed."""
+		return [self.get(spec.target, spec.name, spec.model_set) for spec in self.list(target, model_set)]
+
+
+	@instrumented('load_model')
+	def _load(self, spec: ModelSpec) -> LoadedModel:
+		"""Load a model and its encoder, validating its features."""
+		encoder = None
+		if spec.artifact_path is not None and (self.use_artifacts or spec.path is None):
+			model, encoder = load_artifact(spec.artifact_path, backend=self.backend)
+		else:
+			model = _load_pickle(spec.path)
+
+		if encoder is None and spec.encoder_path is not None:
+			if spec.encoder_path not in self._encoders:
+				self._encoders[spec.encoder_path] = _load_pickle(spec.encoder_path)
+			encoder = self._encoders[spec.encoder_path]
+
+		model_features = getattr(model, 'feature_names_in_', None)
+		listed_features = None
+		if spec.features_path is not None:
+			with open(spec.features_path) as f:
+				listed_features = json.load(f)
+
+		if model_features is not None and listed_features is not None and \
+			list(model_features) != list(listed_features):
+			raise ValueError(f"Features of {spec} do not match {spec.features_path.name}.")
+		if model_features is None and listed_features is None:
+			raise ValueError(f"{spec} has no feature_names_in_ and no {spec.name}{FEATURES_SUFFIX}.json.")
+
+		count(models_loaded=1)
+		feature_names = list(model_features if model_features is not None else listed_features)
+		return LoadedModel(spec, model, encoder, feature_names)
+
+
+_registries: Dict[Path, ModelRegistry] = {}
+
+
+def get_registry(root: Union[str, Path] = './models', max_loaded: int = 16, use_artifacts: bool = True,
+								 backend: str = AUTO) -> ModelRegistry:
+	"""Get the process-wide registry of a models directory, creating it on first use."""
+	root = Path(root).resolve()
+	if root not in _registries:
+		_registries[root] = ModelRegistry(root, max_loaded=max_loaded, use_artifacts=use_artifacts, backend=backend)
+	return _registries[root]
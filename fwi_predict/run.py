@@ -0,0 +1,165 @@
+"""Resumable pipeline runs with stage state and artifacts persisted in a run directory."""
+import hashlib
+import json
+import pickle
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Union
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+STATE_FILE = 'state.json'
+
+
+def _encode_input(obj: Any) -> Any:
+	"""Encode a run input JSON cannot, hashing frames by content."""
+	if isinstance(obj, (pd.DataFrame, pd.Series)):
+		frame = obj.to_frame() if isinstance(obj, pd.Series) else obj
+		if isinstance(frame, gpd.GeoDataFrame):
+			frame = pd.DataFrame(frame).assign(**{col: frame[col].to_wkb(hex=True)
+																						for col in frame.columns[frame.dtypes == 'geometry']})
+		rows = pd.util.hash_pandas_object(frame, index=True).to_numpy()
+		return {'columns': [str(col) for col in frame.columns], 'dtypes': [str(dtype) for dtype in frame.dtypes],
+						'rows': hashlib.sha256(rows.tobytes()).hexdigest()}
+	if isinstance(obj, np.ndarray):
+		return obj.tolist()
+	if isinstance(obj, np.generic):
+		return obj.item()
+	if isinstance(obj, Path):
+		return obj.as_posix()
+	raise TypeError(f"Cannot fingerprint run input of type {type(obj).__name__}.")
+
+
+def fingerprint(inputs: Any) -> str:
+	"""SHA-256 of the JSON of a run's inputs, with data frames hashed by content.
+
+	Args:
+		inputs: JSON serializable inputs, which may contain data frames (geometries
+			are hashed as WKB), arrays and paths.
+	"""
+	encoded = json.dumps(inputs, default=_encode_input, sort_keys=True)
+	return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class PipelineRun:
+	"""A pipeline run whose completed stages survive a restart.
+
+	The result of each completed stage is pickled to `{stage}.pkl` in the run
+	directory, and stage status plus small values such as Earth Engine task IDs are
+	kept in `state.json`, rewritten after every change. Running a completed stage
+	loads its result instead of recomputing it, so a restarted run picks up after
+	the last completed stage and in-flight tasks are waited on rather than resubmitted.
+
+	A run given its `inputs` stores their `fingerprint` in `state.json`. Reopening
+	the run directory with different inputs starts the run over, discarding its
+	stage results and values, rather than resuming with results of other inputs.
+
+	State changes are serialized by a lock, so stages may store values from several
+	threads, e.g. task IDs of exports started concurrently.
+
+	Attributes:
+		run_dir: directory holding the run state and stage artifacts.
+		state: completed stages and stored values.
+	"""
+
+	def __init__(self, run_dir: Union[str, Path], inputs: Any = None):
+		self.run_dir = Path(run_dir)
+		self.state_path = self.run_dir / STATE_FILE
+		self._lock = threading.RLock()
+		if self.state_path.exists():
+			self.state = json.loads(self.state_path.read_text())
+		else:
+			self.state = {'stages': {}, 'values': {}}
+
+		if inputs is not None:
+			inputs_fingerprint = fingerprint(inputs)
+			if self.state['stages'] or self.state['values']:
+				if self.state.get('fingerprint') != inputs_fingerprint:
+					print(f"Inputs of the run in {self.run_dir} have changed. Starting the run over.")
+					self.reset()
+			self.state['fingerprint'] = inputs_fingerprint
+
+
+	def reset(self) -> None:
+		"""Discard every stage result and stored value of the run."""
+		with self._lock:
+			self.state = {'stages': {}, 'values': {}}
+			self._save()
+		for path in self.run_dir.glob('*.pkl'):
+			path.unlink()
+
+
+	def is_complete(self, name: str) -> bool:
+		"""Check whether a stage has completed."""
+		return name in self.state['stages']
+
+
+	def load(self, name: str) -> Any:
+		"""Load the result of a completed stage."""
+		with open(self.run_dir / f"{name}.pkl", 'rb') as f:
+			return pickle.load(f)
+
+
+	def complete(self, name: str, result: Any) -> None:
+		"""Persist the result of a stage and mark it complete."""
+		self.run_dir.mkdir(parents=True, exist_ok=True)
+		with open(self.run_dir / f"{name}.pkl", 'wb') as f:
+			pickle.dump(result, f)
+		with self._lock:
+			self.state['stages'][name] = datetime.now(timezone.utc).isoformat()
+			self._save()
+
+
+	def stage(self, name: str, fn: Callable, *args, **kwargs) -> Any:
+		"""Run a stage unless it has completed, returning its result.
+
+		Stages pull their inputs by calling earlier stages, so only the stages after
+		the last completed one run. A stage returning None has failed and is not
+		marked complete, so it runs again when the run is restarted.
+		"""
+		if self.is_complete(name):
+			print(f"Reusing result of completed stage '{name}' from {self.run_dir}.")
+			return self.load(name)
+
+		result = fn(*args, **kwargs)
+		if result is not None:
+			self.complete(name, result)
+
+		return result
+
+
+	def get(self, key: str, default: Any = None) -> Any:
+		"""Get a stored value."""
+		return self.state['values'].get(key, default)
+
+
+	def set(self, key: str, value: Any) -> None:
+		"""Store a JSON serializable value, persisting it immediately."""
+		with self._lock:
+			self.state['values'][key] = value
+			self._save()
+
+
+	def update(self, key: str, values: Dict[str, Any]) -> None:
+		"""Add entries to a stored dictionary, persisting it immediately.
+
+		Unlike getting, changing and setting the dictionary, concurrent updates
+		never lose each other's entries.
+		"""
+		with self._lock:
+			self.state['values'][key] = {**self.state['values'].get(key, {}), **values}
+			self._save()
+
+
+	def _save(self) -> None:
+		"""Write the state file atomically, so a crash never leaves it half written."""
+		with self._lock:
+			self.run_dir.mkdir(parents=True, exist_ok=True)
+			with tempfile.NamedTemporaryFile('w', dir=self.run_dir, prefix=f"{STATE_FILE}.", suffix='.tmp',
+																			 delete=False) as f:
+				f.write(json.dumps(self.state, indent=2))
+			Path(f.name).replace(self.state_path)
@@ -0,0 +1,100 @@
+"""Score many models on one shared feature matrix."""
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Union
+
+import numpy as np
+import pandas as pd
+
+from .instrument import count, instrumented
+from .registry import LoadedModel
+
+
+def get_score_label(target: str, class_name, model_name: str) -> str:
+	"""Get the name of a class probability column, e.g. 'do_in_range_True_xgboost'."""
+	return f"{target}_{class_name}_{model_name.lower().replace(' ', '_')}"
+
+
+class ScoringEngine:
+	"""Score several models, e.g. every model of every target, on shared features.
+
+	Features of all models are built once into one C-contiguous float32 matrix, with
+	columns ordered so models sharing the first model's features see a slice of it
+	rather than a copy. Each model's columns are resolved to indices once, on
+	creation. All class probabilities are written into one preallocated array,
+	`len(labels)` columns wide.
+
+	Attributes:
+		models: models to score, with their encoders.
+		feature_names: columns of the feature matrix.
+		labels: names of the output columns (see `get_score_label`).
+	"""
+
+	def __init__(self, models: List[LoadedModel]):
+		self.models = models
+		self.feature_names = list(dict.fromkeys(name for loaded in models for name in loaded.feature_names))
+		position = {name: i for i, name in enumerate(self.feature_names)}
+
+		self.labels = []
+		self._columns = [] # Slice, or index array when a model's columns aren't contiguous, by model.
+		self._outputs = [] # Slice of the output columns by model.
+		for loaded in models:
+			idx = np.array([position[name] for name in loaded.feature_names])
+			is_range = (np.diff(idx) == 1).all()
+			self._columns.append(slice(idx[0], idx[-1] + 1) if is_range else idx)
+
+			classes = getattr(loaded.model, 'classes_', None)
+			if loaded.encoder is not None:
+				classes = loaded.encoder.inverse_transform(classes) if classes is not None else loaded.encoder.classes_
+			self._outputs.append(slice(len(self.labels), len(self.labels) + len(classes)))
+			self.labels.extend(get_score_label(loaded.spec.target, class_name, loaded.spec.name) for class_name in classes)
+
+
+	def build(self, features: pd.DataFrame) -> np.ndarray:
+		"""Build the shared float32 feature matrix.
+
+		Raises:
+			ValueError: if features lack any model's features.
+		"""
+		columns = set(features.columns)
+		missing = [name for name in self.feature_names if name not in columns]
+		if missing:
+			raise ValueError(f"Missing required features: {missing}")
+		return np.ascontiguousarray(features[self.feature_names].to_numpy(dtype=np.float32))
+
+
+	def _score_model(self, i: int, X: np.ndarray, out: np.ndarray) -> None:
+		loaded = self.models[i]
+		# Models select columns by name, so each gets a frame over its columns without copying them.
+		model_X = pd.DataFrame(X[:, self._columns[i]], columns=loaded.feature_names, copy=False)
+		out[:, self._outputs[i]] = loaded.model.predict_proba(model_X)
+
+
+	@instrumented('score_models')
+	def score(self, features: Union[pd.DataFrame, np.ndarray], n_jobs: int = 1) -> np.ndarray:
+		"""Get the class probabilities of every model.
+
+		Args:
+			features: features, or a matrix from `build`.
+			n_jobs: number of threads to score models in. Tree ensembles release the
+				GIL while predicting, so threads share the matrix without copies.
+
+		Returns:
+			Probabilities, one row per sample and one column per label.
+		"""
+		X = features if isinstance(features, np.ndarray) else self.build(features)
+		out = np.empty((len(X), len(self.labels)), dtype=np.float32)
+
+		if n_jobs == 1:
+			for i in range(len(self.models)):
+				self._score_model(i, X, out)
+		else:
+			with ThreadPoolExecutor(n_jobs) as executor:
+				list(executor.map(lambda i: self._score_model(i, X, out), range(len(self.models))))
+
+		count(rows=len(X), models=len(self.models))
+		return out
+
+
+	def score_frame(self, features: pd.DataFrame, n_jobs: int = 1) -> pd.DataFrame:
+		"""Get the class probabilities of every model as a frame indexed like features."""
+		return pd.DataFrame(self.score(features, n_jobs=n_jobs), index=features.index, columns=self.labels)
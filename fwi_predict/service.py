@@ -0,0 +1,392 @@
+"""Long-running prediction service answering from models and features kept in memory.
+
+Only the feature store, model registry and pond metadata are used, so the service
+never imports Earth Engine. Features are computed ahead of time by `run_daily.py`.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from .daily import get_feature_columns, predict_in_range, prep_model_input
+from .registry import get_registry
+from .store import PARTITION_COLUMN, FeatureStore
+
+POND_METADATA_PATH = './data/clean/pond_metadata_clean.geojson'
+POND_COLUMNS = ['farmer', 'village', 'pond_depth_meters']
+
+
+class MicroBatcher:
+	"""Run concurrent prediction requests through the model together.
+
+	Requests are queued and a single worker thread takes every request waiting,
+	up to `max_rows` rows, or that arrives within `max_wait_s` of the first, and
+	predicts them with one call to `predict_fn`.
+
+	Attributes:
+		predict_fn: function of one frame of model inputs returning predictions and
+			probabilities as arrays.
+		max_rows: maximum number of rows predicted at once.
+		max_wait_s: longest time to wait for more requests before predicting.
+	"""
+
+	def __init__(self,
+							 predict_fn: Callable[[pd.DataFrame], Tuple[np.ndarray, np.ndarray]],
+							 max_rows: int = 8192,
+							 max_wait_s: float = 0.002):
+		self.predict_fn = predict_fn
+		self.max_rows = max_rows
+		self.max_wait_s = max_wait_s
+		self._queue = queue.Queue()
+		self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+		self._worker.start()
+
+
+	def submit(self, X: pd.DataFrame) -> Future:
+		"""Queue model inputs, returning a future of their predictions and probabilities."""
+		future = Future()
+		self._queue.put((X, future))
+		return future
+
+
+	def predict(self, X: pd.DataFrame, timeout: float = None) -> Tuple[np.ndarray, np.ndarray]:
+		"""Predict model inputs with any other waiting requests."""
+		return self.submit(X).result(timeout=timeout)
+
+
+	def close(self) -> None:
+		"""Stop the worker after the queued requests are predicted."""
+		self._queue.put(None)
+		self._worker.join()
+
+
+	def _run(self) -> None:
+		while True:
+			item = self._queue.get()
+			if item is None:
+				return
+
+			batch, n_rows = [item], len(item[0])
+			deadline = time.perf_counter() + self.max_wait_s
+			closing = False
+			while n_rows < self.max_rows:
+				try:
+					item = self._queue.get(timeout=max(deadline - time.perf_counter(), 0))
+				except queue.Empty:
+					break
+				if item is None:
+					closing = True
+					break
+				batch.append(item)
+				n_rows += len(item[0])
+
+			self._predict(batch)
+			if closing:
+				return
+
+
+	def _predict(self, batch: List[Tuple[pd.DataFrame, Future]]) -> None:
+		try:
+			X = batch[0][0] if len(batch) == 1 else pd.concat([X for X, _ in batch], ignore_index=True)
+			preds, probs = self.predict_fn(X)
+		except Exception as e:
+			for _, future in batch:
+				future.set_exception(e)
+			return
+
+		start = 0
+		for X, future in batch:
+			end = start + len(X)
+			future.set_result((preds[start:end], probs[start:end]))
+			start = end
+
+
+class DateFeatures:
+	"""Model inputs of every stored sample on one date.
+
+	Attributes:
+		date: local sample date (YYYY-MM-DD).
+		mtime: modification time of the date's partition when it was read.
+		keys: `pond_id` and UTC `sample_dt` of each sample.
+		X: model inputs, in the order of keys.
+		rows_by_pond: positions of each pond's samples in keys.
+		predictions: predictions for every sample, filled in on first request.
+	"""
+
+	def __init__(self, date: str, mtime: float, keys: pd.DataFrame, X: pd.DataFrame):
+		self.date = date
+		self.mtime = mtime
+		self.keys = keys
+		self.X = X
+		self.rows_by_pond = keys.groupby('pond_id').indices
+		self.predictions = None
+
+
+class PredictionService:
+	"""Models, pond metadata and feature partitions kept in memory to answer predictions.
+
+	Features of the latest `preload_days` stored dates are read on start and others
+	on first request, keeping at most `max_dates` dates. A date is re-read if its
+	partition has been rewritten since, e.g. by a new `run_daily.py` run. Concurrent
+	requests are predicted together (see `MicroBatcher`), and predictions for all
+	ponds on a date are kept until its features change. The service refuses to
+	start if the preloaded dates lack stored columns the model needs.
+
+	Attributes:
+		loaded: the model, encoder and feature names.
+		ponds: pond metadata by `pond_id`, with longitude and latitude.
+		store: feature store features are read from.
+		max_dates: maximum number of dates kept in memory.
+		batcher: micro-batcher predictions go through.
+	"""
+
+	def __init__(self,
+							 target: str = 'do_in_range',
+							 model_name: str = 'XGBoost',
+							 model_set: str = 'jun_21_dec_24_w_metadata',
+							 model_root: Union[str, Path] = './models',
+							 feature_store_dir: Union[str, Path] = './data/feature_store/daily',
+							 pond_metadata_path: Union[str, Path] = POND_METADATA_PATH,
+							 preload_days: int = 7,
+							 max_dates: int = 31,
+							 max_batch_rows: int = 8192,
+							 max_wait_s: float = 0.002):
+		self.loaded = get_registry(model_root).get(target, model_name, model_set=model_set)
+		self.read_cols = get_feature_columns(self.loaded.feature_names)
+
+		ponds = gpd.read_file(pond_metadata_path)
+		ponds = ponds[ponds['geometry'].is_valid]
+		points = ponds.geometry if ponds.crs is None or ponds.crs.equals("EPSG:4326") else ponds.geometry.to_crs(4326)
+		self.ponds = pd.DataFrame(ponds[[col for col in POND_COLUMNS if col in ponds.columns]]) \
+			.assign(lon=points.x, lat=points.y) \
+			.set_index(ponds['pond_id'])
+
+		self.store = FeatureStore(feature_store_dir)
+		self.max_dates = max_dates
+		self._dates: 'OrderedDict[str, DateFeatures]' = OrderedDict()
+		self._lock = threading.Lock()
+		self.batcher = MicroBatcher(self._predict, max_rows=max_batch_rows, max_wait_s=max_wait_s)
+
+		preload_dates = self.store.dates()[-preload_days:] if preload_days > 0 else []
+		for date in preload_dates:
+			self.check_columns(date)
+		for date in preload_dates:
+			self.get_date(date)
+		print(f"Loaded {self.loaded.spec} for {len(self.ponds)} ponds and {len(self._dates)} dates of features.")
+
+
+	@property
+	def loaded_dates(self) -> List[str]:
+		"""Dates with features in memory, least recently used first."""
+		return list(self._dates)
+
+
+	def _predict(self, X: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+		return predict_in_range(self.loaded.model, self.loaded.encoder, X)
+
+
+	def _partition_mtime(self, date: str) -> float:
+		try:
+			return os.stat(self.store.root / f"{PARTITION_COLUMN}={date}").st_mtime
+		except FileNotFoundError:
+			return None
+
+
+	def check_columns(self, date: str) -> None:
+		"""Check that the features stored for a date have every column the model needs.
+
+		Raises:
+			ValueError: if any column is missing.
+		"""
+		missing = [col for col in self.read_cols if col not in self.store.columns([date])]
+		if missing:
+			raise ValueError(f"Features stored for {date} in {self.store.root} lack columns {missing} needed by "
+											 f"{self.loaded.spec}. Recompute them with run_daily.py, or serve a model trained "
+											 f"on the stored features.")
+
+
+	def get_date(self, date: str) -> DateFeatures:
+		"""Get the model inputs of a date, reading them if not in memory or stale.
+
+		Raises:
+			KeyError: if no features are stored for the date.
+			ValueError: if the stored features lack columns the model needs.
+		"""
+		mtime = self._partition_mtime(date)
+		with self._lock:
+			cached = self._dates.get(date)
+			if cached is not None and cached.mtime == mtime:
+				self._dates.move_to_end(date)
+				return cached
+
+		if mtime is None:
+			raise KeyError(f"No features are stored for {date}. Run run_daily.py for it first.")
+
+		self.check_columns(date)
+		stored = self.store.read(dates=[date], columns=list(dict.fromkeys(['pond_id', 'sample_dt'] + self.read_cols)),
+														 include_projected=True)
+		stored = stored.sort_values(['pond_id', 'sample_dt']).reset_index(drop=True)
+		keys = pd.DataFrame({'pond_id': stored['pond_id'].to_numpy(),
+												 'sample_dt': stored['sample_dt'].dt.tz_convert('UTC')})
+		features = DateFeatures(date, mtime, keys, prep_model_input(stored, self.loaded.feature_names))
+
+		with self._lock:
+			self._dates[date] = features
+			self._dates.move_to_end(date)
+			while len(self._dates) > self.max_dates:
+				self._dates.popitem(last=False)
+
+		return features
+
+
+	def predict_date(self, date: str) -> pd.DataFrame:
+		"""Predict for every stored sample on a local date (YYYY-MM-DD)."""
+		features = self.get_date(date)
+		if features.predictions is None:
+			preds, probs = self.batcher.predict(features.X)
+			features.predictions = features.keys.assign(prediction=preds, prob=probs)
+		return features.predictions
+
+
+	def predict_pond(self, pond_id, sample_dt: Union[str, pd.Timestamp]) -> Dict:
+		"""Predict for a pond at a time, using its stored sample closest to that time on the same date.
+
+		Naive times are taken to be in the feature store timezone.
+
+		Raises:
+			KeyError: if the pond is unknown or has no features stored for the date.
+		"""
+		if pond_id not in self.ponds.index:
+			raise KeyError(f"Unknown pond {pond_id}.")
+
+		sample_dt = pd.Timestamp(sample_dt)
+		if sample_dt.tzinfo is None:
+			sample_dt = sample_dt.tz_localize(self.store.timezone)
+		date = sample_dt.tz_convert(self.store.timezone).strftime('%Y-%m-%d')
+
+		features = self.get_date(date)
+		rows = features.rows_by_pond.get(pond_id)
+		if rows is None:
+			raise KeyError(f"No features are stored for pond {pond_id} on {date}.")
+
+		sample_dts = features.keys['sample_dt'].iloc[rows]
+		row = rows[np.abs((sample_dts - sample_dt.tz_convert('UTC')).dt.total_seconds().to_numpy()).argmin()]
+		if features.predictions is not None:
+			pred, prob = features.predictions['prediction'].iat[row], features.predictions['prob'].iat[row]
+		else:
+			preds, probs = self.batcher.predict(features.X.iloc[[row]])
+			pred, prob = preds[0], probs[0]
+
+		return {
+			'pond_id': pond_id,
+			'sample_dt': features.keys['sample_dt'].iat[row].tz_convert(self.store.timezone).isoformat(),
+			'prediction': pred,
+			'prob': float(prob),
+			**self.ponds.loc[pond_id].to_dict()
+		}
+
+
+	def close(self) -> None:
+		"""Stop the micro-batcher."""
+		self.batcher.close()
+
+
+def _to_json(value):
+	if isinstance(value, np.generic):
+		return value.item()
+	if isinstance(value, pd.Timestamp):
+		return value.isoformat()
+	return str(value)
+
+
+def make_handler(service: PredictionService) -> type:
+	"""Make a request handler answering from a service.
+
+	Endpoints:
+		GET /health: models and dates loaded.
+		GET /predict?pond_id=X&time=T: prediction for pond X at time T.
+		GET /predict?date=D: predictions for every pond on local date D.
+
+	Errors are answered as JSON with an `error` message: 404 for unknown ponds and
+	dates, 400 for invalid requests and 500 for anything unexpected.
+	"""
+
+	class PredictionHandler(BaseHTTPRequestHandler):
+		protocol_version = 'HTTP/1.1'
+
+		def _send(self, status: int, body: Dict) -> None:
+			data = json.dumps(body, default=_to_json).encode()
+			self.send_response(status)
+			self.send_header('Content-Type', 'application/json')
+			self.send_header('Content-Length', str(len(data)))
+			self.end_headers()
+			self.wfile.write(data)
+
+
+		def do_GET(self):
+			url = urlparse(self.path)
+			params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+			start = time.perf_counter()
+			try:
+				if url.path == '/health':
+					body = {'model': repr(service.loaded.spec), 'ponds': len(service.ponds), 'dates': service.loaded_dates}
+				elif url.path == '/predict' and 'date' in params:
+					predictions = service.predict_date(params['date'])
+					predictions = predictions.assign(sample_dt=predictions['sample_dt'].dt.tz_convert(service.store.timezone))
+					body = {'date': params['date'], 'predictions': predictions.to_dict(orient='records')}
+				elif url.path == '/predict' and 'pond_id' in params and 'time' in params:
+					body = service.predict_pond(params['pond_id'], params['time'])
+				else:
+					self._send(404, {'error': "Use /health, /predict?date=YYYY-MM-DD or /predict?pond_id=X&time=T."})
+					return
+			except KeyError as e:
+				self._send(404, {'error': e.args[0]})
+				return
+			except ValueError as e:
+				self._send(400, {'error': str(e)})
+				return
+			except Exception as e:
+				traceback.print_exc()
+				self._send(500, {'error': f"{type(e).__name__}: {e}"})
+				return
+
+			body['elapsed_ms'] = (time.perf_counter() - start) * 1000
+			self._send(200, body)
+
+
+		def log_message(self, format, *args):
+			pass # Request logs would dominate the response time.
+
+	return PredictionHandler
+
+
+class PredictionServer(ThreadingHTTPServer):
+	"""HTTP server with one thread per request."""
+
+	daemon_threads = True
+	request_queue_size = 128 # The default of 5 drops connections from bursts of requests.
+
+
+def serve(service: PredictionService, host: str = '127.0.0.1', port: int = 8080) -> None:
+	"""Answer prediction requests over HTTP until interrupted."""
+	server = PredictionServer((host, port), make_handler(service))
+	print(f"Serving predictions on http://{host}:{port}.")
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		service.close()
@@ -0,0 +1,345 @@
+"""Bucket-like storage backends for exports and datasets."""
+import base64
+import io
+import json
+import re
+import shutil
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+import google_crc32c
+
+from .instrument import count, instrumented
+
+CHUNK_SIZE = 8 * 1024 * 1024 # Bytes per resumable upload request and checksum read.
+
+
+def _encode_crc32c(checksum: google_crc32c.Checksum) -> str:
+	"""Base64 encode a CRC32C checksum, as reported by GCS."""
+	return base64.b64encode(checksum.digest()).decode('utf-8')
+
+
+def file_crc32c(path: Union[str, Path]) -> str:
+	"""Base64 encoded CRC32C of a local file, as reported by GCS."""
+	checksum = google_crc32c.Checksum()
+	with open(path, 'rb') as f:
+		for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+			checksum.update(chunk)
+	return _encode_crc32c(checksum)
+
+
+def _report(action: str, transferred: List[int], skipped: int, start: float) -> None:
+	"""Print number of files transferred and throughput."""
+	seconds = time.perf_counter() - start
+	mb = sum(transferred) / 1e6
+	print(f"{action} {len(transferred)} files ({mb:.1f} MB) in {seconds:.1f}s "
+				f"({mb / max(seconds, 1e-9):.1f} MB/s), skipped {skipped} unchanged files.")
+
+
+def glob_to_regex(glob: str) -> str:
+	"""Translate a glob to a regular expression with the semantics of GCS `match_glob`.
+
+	`*` and `?` do not match across `/`, `**` matches across directories and `**/`
+	also matches no directory at all. Bracket classes match one character, negated
+	with a leading `!` or `^`.
+	"""
+	parts, i = [], 0
+	while i < len(glob):
+		if glob.startswith('**/', i):
+			parts.append('(?:.*/)?')
+			i += 3
+		elif glob.startswith('**', i):
+			parts.append('.*')
+			i += 2
+		elif glob[i] == '*':
+			parts.append('[^/]*')
+			i += 1
+		elif glob[i] == '?':
+			parts.append('[^/]')
+			i += 1
+		elif glob[i] == '[' and glob.find(']', i + 2 + (glob[i + 1:i + 2] in ('!', '^'))) >= 0:
+			negate = glob[i + 1] in '!^'
+			end = glob.find(']', i + 2 + negate) # A leading `]` is part of the class.
+			chars = glob[i + 1 + negate:end].replace('\\', '\\\\').replace('[', '\\[')
+			parts.append(f"[{'^' if negate else ''}{chars}]")
+			i = end + 1
+		else:
+			parts.append(re.escape(glob[i]))
+			i += 1
+	return ''.join(parts) + r'\Z'
+
+
+def is_literal(glob: str) -> bool:
+	"""Check whether a glob has no wildcards, so it matches only the name it spells."""
+	return not any(char in glob for char in '*?[')
+
+
+class Storage(ABC):
+	"""Named files in a bucket-like store.
+
+	Subclasses implement `list`, `stat`, `open`, `_get` and `_put`. Transfers of
+	files that already have the size and CRC32C of their counterpart are skipped.
+	"""
+
+	@abstractmethod
+	def list(self, glob: str) -> List[str]:
+		"""List names of stored files matching a glob (see `glob_to_regex`)."""
+
+
+	@abstractmethod
+	def open(self, name: str) -> BinaryIO:
+		"""Open a stored file as a binary stream, without copying it to disk."""
+
+
+	@abstractmethod
+	def stat(self, name: str) -> Optional[Tuple[int, str]]:
+		"""Get (size, base64 CRC32C) of a stored file, or None if it does not exist."""
+
+
+	@abstractmethod
+	def _get(self, name: str, path: Path) -> int:
+		"""Copy a stored file to a local path. Returns bytes transferred."""
+
+
+	@abstractmethod
+	def _put(self, path: Path, name: str) -> int:
+		"""Store a local file under a name. Returns bytes transferred."""
+
+
+	def matches(self, name: str, path: Union[str, Path]) -> bool:
+		"""Check whether a local file has the size and CRC32C of a stored file."""
+		path = Path(path)
+		stat = self.stat(name)
+		return (
+			stat is not None and path.is_file() and
+			path.stat().st_size == stat[0] and
+			stat[1] is not None and file_crc32c(path) == stat[1]
+		)
+
+
+	def download(self, name: str, path: Union[str, Path]) -> int:
+		"""Download a stored file unless the local file matches it. Returns bytes transferred."""
+		path = Path(path)
+		if self.matches(name, path):
+			return 0
+		path.parent.mkdir(parents=True, exist_ok=True)
+		return self._get(name, path)
+
+
+	def upload(self, path: Union[str, Path], name: str) -> int:
+		"""Upload a local file unless the stored file matches it. Returns bytes transferred."""
+		path = Path(path)
+		if self.matches(name, path):
+			return 0
+		return self._put(path, name)
+
+
+	@instrumented()
+	def download_files(self, glob: str, download_dir: Union[str, Path], max_workers: int = 8) -> List[Path]:
+		"""Download stored files matching a glob concurrently, keeping their names as paths.
+
+		Returns:
+			Local paths of the matching files.
+		"""
+		names = self.list(Path(glob).as_posix())
+		paths = [Path(download_dir) / name for name in names]
+
+		start = time.perf_counter()
+		with ThreadPoolExecutor(max_workers=max_workers) as executor:
+			sizes = list(executor.map(self.download, names, paths))
+
+		transferred = [size for size in sizes if size > 0]
+		_report("Downloaded", transferred, len(sizes) - len(transferred), start)
+		count(files_downloaded=len(transferred), files_skipped=len(sizes) - len(transferred),
+					bytes_downloaded=sum(transferred))
+
+		return paths
+
+
+	@instrumented()
+	def upload_files(self, uploads: List[Tuple[Path, str]], max_workers: int = 8) -> None:
+		"""Upload (local path, name) pairs concurrently."""
+		start = time.perf_counter()
+		with ThreadPoolExecutor(max_workers=max_workers) as executor:
+			sizes = list(executor.map(lambda upload: self.upload(*upload), uploads))
+
+		transferred = [size for size in sizes if size > 0]
+		_report("Uploaded", transferred, len(sizes) - len(transferred), start)
+		count(files_uploaded=len(transferred), files_skipped=len(sizes) - len(transferred),
+					bytes_uploaded=sum(transferred))
+
+
+class LocalStorage(Storage):
+	"""Files stored under a local directory, e.g. to run the pipeline offline.
+
+	Attributes:
+		root: directory files are stored in.
+	"""
+
+	def __init__(self, root: Union[str, Path]):
+		self.root = Path(root)
+
+
+	def list(self, glob: str) -> List[str]:
+		return sorted(path.relative_to(self.root).as_posix()
+									for path in self.root.glob(glob) if path.is_file())
+
+
+	def open(self, name: str) -> BinaryIO:
+		return open(self.root / name, 'rb')
+
+
+	def stat(self, name: str) -> Optional[Tuple[int, str]]:
+		path = self.root / name
+		if not path.is_file():
+			return None
+		return path.stat().st_size, file_crc32c(path)
+
+
+	def _get(self, name: str, path: Path) -> int:
+		shutil.copyfile(self.root / name, path)
+		return path.stat().st_size
+
+
+	def _put(self, path: Path, name: str) -> int:
+		dest = self.root / name
+		dest.parent.mkdir(parents=True, exist_ok=True)
+		shutil.copyfile(path, dest)
+		return dest.stat().st_size
+
+
+class MemoryStorage(Storage):
+	"""Files held in memory, e.g. for tests and benchmarks.
+
+	Attributes:
+		files: file contents by name.
+	"""
+
+	def __init__(self, files: Dict[str, bytes] = None):
+		self.files = {} if files is None else dict(files)
+
+
+	def list(self, glob: str) -> List[str]:
+		pattern = re.compile(glob_to_regex(glob))
+		return sorted(name for name in self.files if pattern.match(name))
+
+
+	def open(self, name: str) -> BinaryIO:
+		return io.BytesIO(self.files[name])
+
+
+	def stat(self, name: str) -> Optional[Tuple[int, str]]:
+		if name not in self.files:
+			return None
+		return len(self.files[name]), _encode_crc32c(google_crc32c.Checksum(self.files[name]))
+
+
+	def _get(self, name: str, path: Path) -> int:
+		path.write_bytes(self.files[name])
+		return len(self.files[name])
+
+
+	def _put(self, path: Path, name: str) -> int:
+		self.files[name] = path.read_bytes()
+		return len(self.files[name])
+
+
+class MirroredStorage(Storage):
+	"""Read-through local mirror of another storage.
+
+	Files fetched or uploaded through the mirror are recorded with the size and
+	CRC32C of the backend's copy in an index, `.mirror.json`, in the mirror
+	directory. A file whose index entry still matches the size of its mirror copy
+	is served from disk without listing or stat-ing the backend, so repeated runs
+	over a complete mirror make no remote calls. Other files are fetched from the
+	backend. Uploads are written to both the backend and the mirror.
+
+	Files the backend overwrites in place are only noticed with `verify`, which
+	checks every file against the backend as before the index.
+
+	Attributes:
+		backend: storage being mirrored.
+		mirror: local storage holding the mirror.
+		verify: whether to check mirrored files against the backend.
+	"""
+
+	INDEX_NAME = '.mirror.json'
+
+	def __init__(self, backend: Storage, mirror_root: Union[str, Path], verify: bool = False):
+		self.backend = backend
+		self.mirror = LocalStorage(mirror_root)
+		self.verify = verify
+		self._lock = threading.Lock()
+		index_path = self.mirror.root / self.INDEX_NAME
+		self._index: Dict[str, List] = json.loads(index_path.read_text()) if index_path.is_file() else {}
+
+
+	def _mirrored(self, name: str) -> Optional[Tuple[int, str]]:
+		"""Get the indexed (size, CRC32C) of a file if its mirror copy is current."""
+		if self.verify:
+			return None
+		with self._lock:
+			entry = self._index.get(name)
+		path = self.mirror.root / name
+		if entry is None or not path.is_file() or path.stat().st_size != entry[0]:
+			return None
+		return tuple(entry)
+
+
+	def _record(self, name: str, stat: Optional[Tuple[int, str]]) -> None:
+		"""Record the backend (size, CRC32C) of a mirrored file and save the index."""
+		with self._lock:
+			if stat is None:
+				self._index.pop(name, None)
+			else:
+				self._index[name] = list(stat)
+			index_path = self.mirror.root / self.INDEX_NAME
+			index_path.parent.mkdir(parents=True, exist_ok=True)
+			tmp_path = index_path.with_suffix('.tmp')
+			tmp_path.write_text(json.dumps(self._index))
+			tmp_path.replace(index_path)
+
+
+	def _fetch(self, name: str) -> int:
+		"""Bring the mirror copy of a file up to date. Returns bytes transferred."""
+		if self._mirrored(name) is not None:
+			return 0
+		transferred = self.backend.download(name, self.mirror.root / name)
+		self._record(name, self.backend.stat(name))
+		return transferred
+
+
+	def list(self, glob: str) -> List[str]:
+		if is_literal(glob) and self._mirrored(glob) is not None:
+			return [glob]
+		return self.backend.list(glob)
+
+
+	def open(self, name: str) -> BinaryIO:
+		"""Open the mirror copy of a file, fetching it first if it is missing or stale."""
+		self._fetch(name)
+		return self.mirror.open(name)
+
+
+	def stat(self, name: str) -> Optional[Tuple[int, str]]:
+		mirrored = self._mirrored(name)
+		return self.backend.stat(name) if mirrored is None else mirrored
+
+
+	def _get(self, name: str, path: Path) -> int:
+		mirror_path = self.mirror.root / name
+		transferred = self._fetch(name)
+		if mirror_path.resolve() != path.resolve():
+			shutil.copyfile(mirror_path, path)
+		return transferred
+
+
+	def _put(self, path: Path, name: str) -> int:
+		transferred = self.backend.upload(path, name)
+		self.mirror.upload(path, name)
+		self._record(name, self.mirror.stat(name))
+		return transferred
@@ -0,0 +1,229 @@
+"""Local Parquet store of modeling features partitioned by sample date."""
+import uuid
+from pathlib import Path
+from typing import List, Optional, Union
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .constants import TZ_STRING
+
+PARTITION_COLUMN = 'sample_date'
+KEY_COLUMNS = ['pond_id', 'sample_dt'] # Columns identifying a stored row.
+PROJECTED_COLUMN = 'projected' # Whether a row only has the features some model uses.
+
+
+class FeatureStore:
+	"""Modeling features stored as a Parquet dataset partitioned by sample date.
+
+	Rows are sorted by `pond_id` and `sample_dt` within each `sample_date=YYYY-MM-DD`
+	partition, float columns are stored as float32 and geometries as WKB. Reads
+	filter on partitions and row group statistics, so reading one day or pond only
+	touches the matching files.
+
+	Rows written with `projected=True` (e.g. by daily runs computing only a model's
+	features) are marked in `PROJECTED_COLUMN` and left out of reads unless asked
+	for, so reads of full datasets never see their missing features.
+
+	Attributes:
+		root: directory of the dataset.
+		timezone: timezone whose calendar dates partition samples.
+	"""
+
+	def __init__(self, root: Union[str, Path], timezone: str = TZ_STRING):
+		self.root = Path(root)
+		self.timezone = timezone
+
+
+	def write(self, features: pd.DataFrame, projected: bool = False) -> None:
+		"""Upsert features into the partitions of their sample dates.
+
+		Rows are matched to stored rows on `pond_id` and `sample_dt`. New rows are
+		added, and matched rows take the new values, keeping stored values where new
+		ones are missing (e.g. features left out of a run with `feature_names`), so
+		writing a subset of ponds, samples or features never drops stored rows. Each
+		touched partition is written to new files before its old files are removed.
+
+		Args:
+			features: features with `pond_id`, `sample_dt` and optionally geometry
+				columns, e.g. the output of `create_standard_dataset`.
+			projected: whether features only has some of the features, e.g. those of a
+				`feature_names` projection. New rows are then marked as projected, while
+				matched rows keep their mark, so a stored full row stays full.
+
+		Raises:
+			ValueError: if features lack a column of `KEY_COLUMNS`.
+		"""
+		missing = [col for col in KEY_COLUMNS if col not in features.columns]
+		if missing:
+			raise ValueError(f"Features are missing key columns: {missing}")
+
+		df = self._prepare(features)
+		df[PROJECTED_COLUMN] = np.nan if projected else False # Missing marks are taken from stored rows.
+		dates = df[PARTITION_COLUMN].unique().tolist()
+		old_files = self._files(dates)
+
+		stored = self.read(dates=dates, include_projected=True) if old_files else pd.DataFrame()
+		if not stored.empty:
+			stored = self._prepare(stored)
+			# Rows stored before projected rows were marked are full.
+			stored[PROJECTED_COLUMN] = stored.get(PROJECTED_COLUMN, pd.Series(False, index=stored.index)) \
+				.astype(object).fillna(False)
+			columns = list(dict.fromkeys(list(df.columns) + list(stored.columns)))
+			df = df.drop_duplicates(KEY_COLUMNS, keep='last').set_index(KEY_COLUMNS) \
+				.combine_first(stored.drop_duplicates(KEY_COLUMNS, keep='last').set_index(KEY_COLUMNS)) \
+				.reset_index()[columns]
+
+		df[PROJECTED_COLUMN] = df[PROJECTED_COLUMN].astype(object).fillna(True).astype(bool)
+		float_cols = df.select_dtypes(include='float64').columns
+		df[float_cols] = df[float_cols].astype(np.float32)
+		df = df.sort_values([PARTITION_COLUMN] + KEY_COLUMNS)
+
+		table = pa.Table.from_pandas(df, preserve_index=False)
+		pq.write_to_dataset(table, self.root, partition_cols=[PARTITION_COLUMN],
+												basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+												existing_data_behavior='overwrite_or_ignore')
+		for path in old_files:
+			path.unlink()
+
+
+	def _prepare(self, features: pd.DataFrame) -> pd.DataFrame:
+		"""Get features with UTC `sample_dt`, their partition and WGS84 WKB geometries."""
+		df = pd.DataFrame(features).copy()
+		sample_dt = pd.to_datetime(df['sample_dt'], utc=True)
+		df['sample_dt'] = sample_dt
+		df[PARTITION_COLUMN] = sample_dt.dt.tz_convert(self.timezone).dt.strftime('%Y-%m-%d')
+
+		if 'geometry' in df.columns:
+			geometry = gpd.GeoSeries(df['geometry'], crs=getattr(features, 'crs', None))
+			if geometry.crs is not None and not geometry.crs.equals("EPSG:4326"):
+				geometry = geometry.to_crs(4326)
+			df['geometry'] = geometry.to_wkb()
+
+		return df
+
+
+	def _files(self, dates: List[str] = None) -> List[Path]:
+		"""List the Parquet files of the dataset, optionally only of some dates."""
+		if not self.root.exists():
+			return []
+		if dates is None:
+			return sorted(self.root.glob(f"{PARTITION_COLUMN}=*/*.parquet"))
+		return sorted(path for date in dates for path in (self.root / f"{PARTITION_COLUMN}={date}").glob("*.parquet"))
+
+
+	def _dataset(self, dates: List[str] = None) -> Optional[ds.Dataset]:
+		"""Get the dataset of some dates, with the union of their files' columns.
+
+		Columns added by later writes are read as missing from files without them.
+		"""
+		files = self._files(dates)
+		if not files:
+			return None
+
+		partition_schema = pa.schema([(PARTITION_COLUMN, pa.string())])
+		schema = pa.unify_schemas([pq.read_schema(path) for path in files] + [partition_schema])
+		return ds.dataset([str(path) for path in files], schema=schema, format='parquet',
+											partitioning=ds.partitioning(partition_schema, flavor='hive'),
+											partition_base_dir=str(self.root))
+
+
+	def columns(self, dates: List[str] = None) -> List[str]:
+		"""List the stored columns, optionally only of some local sample dates."""
+		dataset = self._dataset(None if dates is None else [str(date) for date in dates])
+		return [] if dataset is None else dataset.schema.names
+
+
+	def read(self,
+					 dates: List[str] = None,
+					 pond_ids: List = None,
+					 columns: List[str] = None,
+					 include_projected: bool = False) -> pd.DataFrame:
+		"""Read stored features, optionally only for some dates, ponds and columns.
+
+		Args:
+			dates: local sample dates (YYYY-MM-DD) to read.
+			pond_ids: ponds to read.
+			columns: columns to read. Defaults to all columns. Columns not stored for
+				any of the dates are left out.
+			include_projected: whether to also read rows written with `projected=True`,
+				e.g. to read the columns of the model they were computed for.
+
+		Returns:
+			Features with `sample_dt` in the store timezone. A GeoDataFrame if
+			geometries are read.
+		"""
+		dataset = self._dataset(None if dates is None else [str(date) for date in dates])
+		if dataset is None:
+			return pd.DataFrame(columns=columns)
+
+		if columns is not None:
+			columns = [col for col in columns if col in dataset.schema.names] # Others are not stored.
+		expression = None
+		if pond_ids is not None:
+			expression = ds.field('pond_id').isin(list(pond_ids))
+		if not include_projected and PROJECTED_COLUMN in dataset.schema.names:
+			is_full = ds.field(PROJECTED_COLUMN).is_null() | (ds.field(PROJECTED_COLUMN) == False)
+			expression = is_full if expression is None else expression & is_full
+
+		df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+		if 'sample_dt' in df.columns:
+			df['sample_dt'] = df['sample_dt'].dt.tz_convert(self.timezone)
+		if PARTITION_COLUMN in df.columns:
+			df[PARTITION_COLUMN] = df[PARTITION_COLUMN].astype(str)
+		if 'geometry' in df.columns:
+			df['geometry'] = gpd.GeoSeries.from_wkb(df['geometry'], crs=4326)
+			df = gpd.GeoDataFrame(df, geometry='geometry')
+
+		return df
+
+
+	def dates(self) -> List[str]:
+		"""List the local sample dates with stored features, in order."""
+		if not self.root.exists():
+			return []
+		prefix = f"{PARTITION_COLUMN}="
+		return sorted(path.name[len(prefix):] for path in self.root.glob(f"{prefix}*") if path.is_dir())
+
+
+	def has_date(self, date: str) -> bool:
+		"""Check whether any features are stored for a local sample date."""
+		return (self.root / f"{PARTITION_COLUMN}={date}").exists()
+
+
+	def read_samples(self,
+									 samples: pd.DataFrame,
+									 columns: List[str] = None,
+									 include_projected: bool = False) -> Optional[pd.DataFrame]:
+		"""Read stored features for samples, matched on `pond_id` and `sample_dt`.
+
+		Args:
+			samples: samples with `pond_id` and `sample_dt` columns.
+			columns: columns to read. Defaults to all columns.
+			include_projected: whether to also read rows written with `projected=True`.
+
+		Returns:
+			Features in the order of samples, or None if any sample is not stored.
+		"""
+		sample_dt = pd.to_datetime(samples['sample_dt'], utc=True)
+		dates = sample_dt.dt.tz_convert(self.timezone).dt.strftime('%Y-%m-%d').unique().tolist()
+		if columns is not None:
+			columns = list(dict.fromkeys(['pond_id', 'sample_dt'] + list(columns)))
+		stored = self.read(dates=dates, pond_ids=samples['pond_id'].unique().tolist(), columns=columns,
+											 include_projected=include_projected)
+		if stored.empty:
+			return None
+
+		stored_keys = pd.MultiIndex.from_arrays([stored['pond_id'], stored['sample_dt'].dt.tz_convert('UTC')])
+		is_unique = ~stored_keys.duplicated(keep='last')
+		stored, stored_keys = stored[is_unique], stored_keys[is_unique]
+
+		sample_keys = pd.MultiIndex.from_arrays([samples['pond_id'], sample_dt])
+		if not sample_keys.isin(stored_keys).all():
+			return None
+
+		return stored.iloc[stored_keys.get_indexer(sample_keys)].reset_index(drop=True)
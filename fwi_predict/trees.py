@@ -0,0 +1,272 @@
+"""Vectorized NumPy inference for gradient-boosted tree ensembles.
+
+Fitted XGBoost and HistGradientBoosting classifiers are flattened into one set of
+node arrays over all trees (struct of arrays). Batches are evaluated by moving
+every (sample, tree) pair down one level per step, with trees grouped by depth
+and leaves pointing to themselves so no pair needs to stop early. Missing values
+are read as +inf or -inf from a doubled copy of the inputs, each split reading
+the copy that sends them its way, so no step checks for missing values. Blocks
+of rows small enough to stay in cache can be evaluated on several threads, as
+NumPy releases the GIL.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Tuple, Union
+
+import numpy as np
+
+# Node arrays, concatenated over trees. Children are interleaved (left of node i at
+# 2i, right at 2i + 1) and index the concatenated arrays; leaves are their own
+# children. Features of splits sending missing values left are offset by the
+# number of features, to read missing values as -inf rather than +inf.
+TREE_ARRAYS = {
+	'feature': np.int32,
+	'threshold': None, # Float dtype the ensemble compares inputs in.
+	'children': np.int32,
+	'value': np.float64
+}
+
+LOGISTIC = 'logistic'
+SOFTMAX = 'softmax'
+
+BLOCK_ROWS = 128 # Rows evaluated at once, keeping the (rows, trees) work arrays in cache.
+
+
+class TreeEnsemble:
+	"""Flattened tree ensemble predicting raw scores and class probabilities.
+
+	A sample goes to the left child of a split if its feature is at most the
+	split's threshold. Missing values go to the child the fitted split sent them to.
+
+	Attributes:
+		arrays: node arrays by name (see `TREE_ARRAYS`).
+		n_features: number of input features.
+		roots: root node of each tree.
+		depths: depth of each tree.
+		tree_outputs: raw score column each tree adds its leaf value to.
+		baseline: initial raw score of each column.
+		dtype: float dtype inputs are compared to thresholds in.
+		link: 'logistic' for binary classifiers with one raw score column, or
+			'softmax'.
+	"""
+
+	def __init__(self, arrays: Dict[str, np.ndarray], n_features: int, roots: np.ndarray, depths: np.ndarray,
+							 tree_outputs: np.ndarray, baseline: np.ndarray, dtype: np.dtype, link: str):
+		self.arrays = arrays
+		self.n_features = int(n_features)
+		self.roots = np.asarray(roots, dtype=np.int32)
+		self.depths = np.asarray(depths, dtype=np.int32)
+		self.tree_outputs = np.asarray(tree_outputs, dtype=np.int32)
+		self.baseline = np.asarray(baseline, dtype=np.float64)
+		self.dtype = np.dtype(dtype)
+		self.link = link
+
+		# Trees of each depth are moved down together for exactly that many levels.
+		self._depth_groups = [(depth, np.flatnonzero(self.depths == depth)) for depth in np.unique(self.depths)]
+		# Leaf values of each tree are summed into its output column by one matrix product.
+		self._outputs = np.zeros((len(self.roots), len(self.baseline)))
+		self._outputs[np.arange(len(self.roots)), self.tree_outputs] = 1
+
+
+	@classmethod
+	def from_trees(cls, trees, n_features: int, baseline: np.ndarray, dtype: np.dtype, link: str) -> 'TreeEnsemble':
+		"""Flatten trees, each given as (output column, node arrays with tree-local child indices)."""
+		arrays = {name: [] for name in TREE_ARRAYS}
+		roots, depths, tree_outputs = [], [], []
+		n_nodes = 0
+		for output, tree in trees:
+			is_leaf = tree['is_leaf']
+			own = np.arange(len(is_leaf))
+			# Missing values of splits sending them right are read as +inf, so must exceed the threshold.
+			threshold = np.asarray(tree['threshold'], dtype=dtype)
+			threshold = np.where(~tree['missing_left'] & (threshold == np.inf), np.finfo(dtype).max, threshold)
+
+			roots.append(n_nodes)
+			depths.append(_get_depth(tree['left'], tree['right'], is_leaf))
+			tree_outputs.append(output)
+			arrays['feature'].append(np.where(is_leaf, 0, tree['feature'] + np.where(tree['missing_left'], n_features, 0)))
+			arrays['threshold'].append(np.where(is_leaf, np.inf, threshold))
+			arrays['children'].append(np.column_stack([np.where(is_leaf, own, tree['left']),
+																								np.where(is_leaf, own, tree['right'])]).ravel() + n_nodes)
+			arrays['value'].append(np.where(is_leaf, tree['value'], 0))
+			n_nodes += len(is_leaf)
+
+		arrays = {
+			name: np.concatenate(values).astype(dtype if TREE_ARRAYS[name] is None else TREE_ARRAYS[name])
+			for name, values in arrays.items()
+		}
+		return cls(arrays, n_features, roots, depths, tree_outputs, baseline, dtype, link)
+
+
+	@classmethod
+	def from_hist_gradient_boosting(cls, classifier) -> 'TreeEnsemble':
+		"""Flatten a fitted HistGradientBoostingClassifier without categorical splits."""
+		if getattr(classifier, '_preprocessor', None) is not None:
+			raise ValueError("Cannot flatten HistGradientBoosting models with categorical features.")
+
+		trees = []
+		for iteration in classifier._predictors:
+			for output, predictor in enumerate(iteration):
+				nodes = predictor.nodes
+				if nodes['is_categorical'].any():
+					raise ValueError("Cannot flatten HistGradientBoosting models with categorical splits.")
+				trees.append((output, {
+					'feature': nodes['feature_idx'],
+					'threshold': nodes['num_threshold'],
+					'missing_left': nodes['missing_go_to_left'].astype(bool),
+					'left': nodes['left'].astype(np.int64),
+					'right': nodes['right'].astype(np.int64),
+					'is_leaf': nodes['is_leaf'].astype(bool),
+					'value': nodes['value']
+				}))
+
+		baseline = np.asarray(classifier._baseline_prediction, dtype=np.float64).ravel()
+		return cls.from_trees(trees, classifier.n_features_in_, baseline, np.float64,
+													LOGISTIC if len(baseline) == 1 else SOFTMAX)
+
+
+	@classmethod
+	def from_xgboost(cls, booster, iteration_range: Tuple[int, int] = (0, 0)) -> 'TreeEnsemble':
+		"""Flatten a binary:logistic or multi:softprob gbtree booster without categorical splits.
+
+		XGBoost sends a sample left if its float32 feature is strictly below the
+		split, which is the same as at most the next float32 below the split.
+		"""
+		model = json.loads(booster.save_raw('json'))['learner']
+		objective = model['objective']['name']
+		if model['gradient_booster']['name'] != 'gbtree' or objective not in ('binary:logistic', 'multi:softprob'):
+			raise ValueError(f"Cannot flatten {model['gradient_booster']['name']} boosters with {objective}.")
+
+		params = model['learner_model_param']
+		n_outputs = max(int(params['num_class']), 1)
+		base_score = np.asarray(json.loads(params['base_score']), dtype=np.float64).ravel()
+		base_score = np.broadcast_to(base_score, (n_outputs,)) if len(base_score) == 1 else base_score
+		baseline = np.log(base_score / (1 - base_score)) if objective == 'binary:logistic' else base_score
+
+		gbtree = model['gradient_booster']['model']
+		trees_per_iteration = n_outputs * int(gbtree['gbtree_model_param']['num_parallel_tree'])
+		start, end = iteration_range
+		tree_ids = range(start * trees_per_iteration,
+										 len(gbtree['trees']) if end == 0 else end * trees_per_iteration)
+
+		trees = []
+		for tree_id in tree_ids:
+			tree = gbtree['trees'][tree_id]
+			if any(tree['split_type']):
+				raise ValueError("Cannot flatten XGBoost models with categorical splits.")
+			left = np.asarray(tree['left_children'], dtype=np.int64)
+			split = np.asarray(tree['split_conditions'], dtype=np.float32) # Leaf values at leaves.
+			trees.append((gbtree['tree_info'][tree_id], {
+				'feature': np.asarray(tree['split_indices']),
+				'threshold': np.nextafter(split, np.float32(-np.inf)),
+				'missing_left': np.asarray(tree['default_left'], dtype=bool),
+				'left': left,
+				'right': np.asarray(tree['right_children'], dtype=np.int64),
+				'is_leaf': left == -1,
+				'value': split.astype(np.float64)
+			}))
+
+		return cls.from_trees(trees, int(params['num_feature']), baseline, np.float32,
+													LOGISTIC if objective == 'binary:logistic' else SOFTMAX)
+
+
+	def save(self, outdir: Union[str, Path]) -> Dict:
+		"""Save the node arrays as .npy files, returning the other attributes to keep in a manifest."""
+		outdir = Path(outdir)
+		outdir.mkdir(parents=True, exist_ok=True)
+		for name, array in self.arrays.items():
+			np.save(outdir / f"{name}.npy", array)
+		return {
+			'n_features': self.n_features,
+			'roots': self.roots.tolist(),
+			'depths': self.depths.tolist(),
+			'tree_outputs': self.tree_outputs.tolist(),
+			'baseline': self.baseline.tolist(),
+			'dtype': self.dtype.name,
+			'link': self.link
+		}
+
+
+	@classmethod
+	def load(cls, indir: Union[str, Path], params: Dict, mmap: bool = True) -> 'TreeEnsemble':
+		"""Load an ensemble saved with `save`, memory-mapping the node arrays by default."""
+		indir = Path(indir)
+		arrays = {name: np.load(indir / f"{name}.npy", mmap_mode='r' if mmap else None) for name in TREE_ARRAYS}
+		return cls(arrays, params['n_features'], params['roots'], params['depths'], params['tree_outputs'],
+							 params['baseline'], params['dtype'], params['link'])
+
+
+	def _predict_block(self, X: np.ndarray) -> np.ndarray:
+		feature, threshold, children = self.arrays['feature'], self.arrays['threshold'], self.arrays['children']
+		is_missing = np.isnan(X)
+		inputs = np.concatenate([np.where(is_missing, np.inf, X), np.where(is_missing, -np.inf, X)], axis=1).ravel()
+		row_offsets = (np.arange(len(X), dtype=np.int32) * 2 * self.n_features)[:, None]
+
+		values = np.empty((len(X), len(self.roots)))
+		for depth, trees in self._depth_groups:
+			node = np.broadcast_to(self.roots[trees], (len(X), len(trees)))
+			for _ in range(depth):
+				goes_right = ~(inputs.take(row_offsets + feature.take(node)) <= threshold.take(node))
+				node = children.take(2 * node + goes_right)
+			values[:, trees] = self.arrays['value'].take(node)
+		return self.baseline + values @ self._outputs
+
+
+	def predict_raw(self, X: np.ndarray, n_threads: int = 1, block_rows: int = BLOCK_ROWS) -> np.ndarray:
+		"""Get raw scores, one column per output, in blocks of rows over n_threads threads."""
+		X = np.ascontiguousarray(X, dtype=self.dtype)
+		if X.shape[1] != self.n_features:
+			raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}.")
+
+		starts = range(0, len(X), block_rows)
+		if n_threads == 1 or len(starts) <= 1:
+			blocks = [self._predict_block(X[start:start + block_rows]) for start in starts]
+		else:
+			with ThreadPoolExecutor(n_threads) as executor:
+				blocks = list(executor.map(lambda start: self._predict_block(X[start:start + block_rows]), starts))
+		return np.concatenate(blocks) if blocks else np.empty((0, len(self.baseline)))
+
+
+	def predict_proba(self, X: np.ndarray, n_threads: int = 1) -> np.ndarray:
+		"""Get class probabilities."""
+		raw = self.predict_raw(X, n_threads=n_threads)
+		if self.link == LOGISTIC:
+			proba = 1 / (1 + np.exp(-raw[:, 0]))
+			return np.column_stack([1 - proba, proba])
+		raw = raw - raw.max(axis=1, keepdims=True)
+		proba = np.exp(raw)
+		return proba / proba.sum(axis=1, keepdims=True)
+
+
+def _get_depth(left: np.ndarray, right: np.ndarray, is_leaf: np.ndarray) -> int:
+	"""Get the depth of a tree with root 0 and tree-local child indices."""
+	depth, level = 0, np.array([0])
+	while True:
+		level = level[~is_leaf[level]]
+		if len(level) == 0:
+			return depth
+		level = np.concatenate([left[level], right[level]])
+		depth += 1
+
+
+def check_ensemble(ensemble: TreeEnsemble, model, X: np.ndarray, atol: float = 1e-6) -> float:
+	"""Check an ensemble predicts the probabilities of the model it was flattened from.
+
+	Args:
+		ensemble: flattened ensemble.
+		model: the original classifier, given the same inputs.
+		X: inputs to check on.
+		atol: largest allowed absolute difference of any probability.
+
+	Returns:
+		The largest absolute difference.
+
+	Raises:
+		ValueError: if any probability differs by more than atol.
+	"""
+	expected = model.predict_proba(X)
+	max_abs_diff = float(np.abs(ensemble.predict_proba(np.asarray(X)) - expected).max()) if len(X) else 0.0
+	if max_abs_diff > atol:
+		raise ValueError(f"Flattened ensemble differs from the model by up to {max_abs_diff:.3g} (> {atol:.3g}).")
+	return max_abs_diff
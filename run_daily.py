@@ -1,53 +1,258 @@
 import os
-import pickle
+import time
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Union
+from typing import Dict, List, Optional, Union
 
 import click
 import geopandas as gpd
 import pandas as pd
-from pytz import timezone
-from timezonefinder import TimezoneFinder
 
+from fwi_predict.constants import FORECAST_TIMES
+from fwi_predict.daily import get_feature_columns, predict_in_range, prep_daily_sample, prep_model_input
+from fwi_predict.geo.ee import get_gfs_projection
+from fwi_predict.instrument import disable, enable, stage
 from fwi_predict.pipeline import create_standard_dataset
+from fwi_predict.registry import LoadedModel, get_registry
+from fwi_predict.run import PipelineRun
+from fwi_predict.store import FeatureStore
 
+MODEL_ROOT = './models'
+MODEL_SET = 'jun_21_dec_24_w_metadata'
+TARGET = 'do_in_range'
+MODEL_NAME = 'XGBoost'
 
-def prep_daily_sample(pond_metadata: gpd.GeoDataFrame,
-					  					target_date: Union[int, str] = 'tomorrow',
-					  					times_of_day: List[str] = ['08:00:00', '16:00:00']) -> gpd.GeoDataFrame:
-	"""Get dataframe of samples to predict for a given day and times of day."""
-
-	keep_cols = ['pond_id', 'farmer', 'village', 'geometry', 'pond_depth_meters']
-	ponds = pond_metadata[keep_cols].copy()
-	ponds['do_winkler'] = True
-
-	# Add timezone information
-	ponds['timezones'] = ponds['geometry'].apply(
-		lambda g: TimezoneFinder().timezone_at(lng=g.x, lat=g.y)
-	)
-	
-	predict_samples = ( # Check that this code is correct.
-		ponds.loc[ponds.index.repeat(len(times_of_day))]
-		.assign(
-			time_of_day=list(times_of_day) * len(ponds)
+
+def get_target_dates(start_date: str = 'tomorrow', end_date: str = None) -> List[str]:
+	"""Get the dates (YYYY-MM-DD) from start_date to end_date inclusive.
+
+	`start_date` may be 'tomorrow'. `end_date` defaults to `start_date`.
+	"""
+	if start_date == 'tomorrow':
+		start_date = (datetime.today() + timedelta(days=1)).strftime('%Y-%m-%d')
+	if end_date is None:
+		end_date = start_date
+
+	return pd.date_range(start_date, end_date, freq='D').strftime('%Y-%m-%d').tolist()
+
+
+def run_batch_inference(pond_metadata: gpd.GeoDataFrame,
+												target_dates: List[str],
+												times_of_day: List[str] = ['09:00:00', '16:00:00'],
+												download_dir: str = 'data/gcs',
+												bucket: str = 'fwi-predict',
+												project: str = 'fwi-water-quality-sensing',
+												gfs_cube_root: str = None,
+												feature_store_dir: str = './data/feature_store/daily',
+												predictions_store_dir: str = './data/feature_store/predictions',
+												run_root: str = './data/runs/daily',
+												metrics_dir: str = './output/daily/metrics',
+												num_shards: int = 1,
+												chunk_size: int = 1000) -> Optional[Dict[str, gpd.GeoDataFrame]]:
+	"""Run inference for several days and times of day in one run.
+
+	The model is loaded once, then ponds are processed in chunks of `chunk_size` with
+	bounded memory (see `predict_for_dates`). Features for each chunk's dates missing
+	from the feature store are computed with a single (optionally sharded) export,
+	and throughput is reported in ponds per second. Predictions for each date are
+	written to `./output/daily/{date}`, as for `run_daily_inference`, and to the
+	feature store in `predictions_store_dir` (unless it is None), which the
+	dashboard reads.
+
+	If `gfs_cube_root` is given, GFS features are computed locally from a cached
+	GFS cube rather than exported from Earth Engine. Features are written to and
+	reused from the feature store in `feature_store_dir`. Only the GFS features the
+	model uses are computed.
+
+	Stage state is kept in `{run_root}/{first date}_{last date}` (or `{run_root}/{date}`
+	for a single date), so re-running the same dates after a crash resumes after the
+	last completed chunk, waiting on export tasks already started. Each chunk keeps
+	its state in a `chunk_{i}` subdirectory, and starts over if its ponds, the
+	dates, times of day or model differ from those it was started with. Delete the
+	run directory to start the same dates over.
+
+	Wall time, CPU time, peak RSS, bytes transferred and row counts of each stage
+	are written as JSON to `metrics_dir`. Set it to None to turn instrumentation off.
+
+	Returns:
+		Samples with predictions by date, or None if feature extraction failed.
+	"""
+	run_name = target_dates[0] if len(target_dates) == 1 else f"{target_dates[0]}_{target_dates[-1]}"
+
+	recorder = None if metrics_dir is None else enable(f"daily_{run_name}_{datetime.now():%Y%m%dT%H%M%S}")
+	try:
+		run_dir = Path(run_root) / run_name
+		run = PipelineRun(run_dir)
+		predictions = predict_for_dates(pond_metadata, target_dates, times_of_day, run, run_name,
+																		download_dir=download_dir, bucket=bucket, project=project,
+																		gfs_cube_root=gfs_cube_root, feature_store_dir=feature_store_dir,
+																		num_shards=num_shards, chunk_size=chunk_size)
+		if predictions is None:
+			return None
+
+		for target_date, predict_samples in predictions.items():
+			predict_samples.to_csv(f"./output/daily/{target_date}")
+		if predictions_store_dir is not None:
+			FeatureStore(predictions_store_dir).write(pd.concat(predictions.values(), ignore_index=True))
+
+		return predictions
+	finally:
+		if recorder is not None:
+			disable()
+			recorder.write(Path(metrics_dir) / f"{recorder.run_id}.json")
+
+
+def predict_for_dates(pond_metadata: gpd.GeoDataFrame,
+											target_dates: List[str],
+											times_of_day: List[str],
+											run: PipelineRun,
+											run_name: str,
+											download_dir: str = 'data/gcs',
+											bucket: str = 'fwi-predict',
+											project: str = 'fwi-water-quality-sensing',
+											gfs_cube_root: str = None,
+											feature_store_dir: str = './data/feature_store/daily',
+											num_shards: int = 1,
+											chunk_size: int = 1000) -> Optional[Dict[str, gpd.GeoDataFrame]]:
+	"""Predict for samples on several dates. See `run_batch_inference`.
+
+	Ponds are processed in chunks of `chunk_size`, so memory is bounded by a chunk
+	rather than the roster. For each chunk, features for dates missing from the
+	feature store are computed into it, and predictions are made from the model's
+	feature columns read back from the store. Each chunk is a run of its own in
+	`chunk_{i}` under the run directory, persisting its predictions without
+	geometries, so a restarted run skips completed chunks. Geometries are only
+	rejoined from `pond_metadata` at output.
+	"""
+	# Load prediction model, kept warm by the process-wide registry across calls.
+	loaded = get_registry(MODEL_ROOT).get(TARGET, MODEL_NAME, model_set=MODEL_SET)
+	feature_names = loaded.feature_names
+
+	if feature_store_dir is None:
+		feature_store_dir = run.run_dir / "feature_store"
+
+	ponds = pond_metadata.reset_index(drop=True)
+	chunks = []
+	start = time.perf_counter()
+	with stage('predict') as predict_stage:
+		for i, chunk_start in enumerate(range(0, len(ponds), chunk_size)):
+			chunk_ponds = ponds.iloc[chunk_start:chunk_start + chunk_size]
+			chunk_run = PipelineRun(run.run_dir / f"chunk_{i:04d}", inputs={
+				'ponds': chunk_ponds, 'target_dates': target_dates, 'times_of_day': times_of_day,
+				'model': [MODEL_SET, TARGET, MODEL_NAME]
+			})
+			chunk = chunk_run.stage('predict', predict_chunk, chunk_ponds, target_dates, times_of_day, loaded,
+															chunk_run, f"{run_name}_chunk{i:04d}", download_dir=download_dir, bucket=bucket,
+															project=project, gfs_cube_root=gfs_cube_root, feature_store_dir=feature_store_dir,
+															num_shards=num_shards)
+			if chunk is None:
+				return None
+
+			chunks.append(chunk)
+			predict_stage.count(rows=len(chunk), ponds=len(chunk_ponds))
+
+	seconds = time.perf_counter() - start
+	n_samples = sum(map(len, chunks))
+	print(f"Predicted {len(ponds)} ponds ({n_samples} samples) in {seconds:.1f}s "
+				f"({len(ponds) / max(seconds, 1e-9):.1f} ponds/s).")
+
+	# Rejoin geometries to each date's predictions.
+	pond_geometries = ponds.drop_duplicates('pond_id').set_index('pond_id').geometry
+	predictions = pd.concat(chunks, ignore_index=True)
+	del chunks
+	predictions_by_date = {}
+	for target_date in target_dates:
+		predict_samples = predictions[predictions['target_date'] == target_date] \
+			.drop(columns='target_date') \
+			.reset_index(drop=True)
+		predict_samples['sample_idx'] = range(len(predict_samples))
+		predictions_by_date[target_date] = gpd.GeoDataFrame(
+			predict_samples, geometry=pond_geometries.reindex(predict_samples['pond_id']).to_numpy(), crs=ponds.crs
 		)
-	)
 
-	# Convert to datetime in the respective timezone
-	def localize_time(row):
-		tz = timezone(row['timezones'])
-		date = datetime.strptime(target_date, '%Y-%m-%d')
-		return tz.localize(datetime.combine(date, pd.to_datetime(row['time_of_day']).time()))
+	return predictions_by_date
+
+
+def predict_chunk(ponds: gpd.GeoDataFrame,
+									target_dates: List[str],
+									times_of_day: List[str],
+									loaded: LoadedModel,
+									run: PipelineRun,
+									run_name: str,
+									download_dir: str = 'data/gcs',
+									bucket: str = 'fwi-predict',
+									project: str = 'fwi-water-quality-sensing',
+									gfs_cube_root: str = None,
+									feature_store_dir: str = './data/feature_store/daily',
+									num_shards: int = 1) -> Optional[pd.DataFrame]:
+	"""Predict for a chunk of ponds on several dates. See `predict_for_dates`.
+
+	Args:
+		loaded: the model to predict with.
+		run: the chunk's run, whose `features` subdirectory holds feature extraction state.
+		run_name: name of the chunk's export.
+
+	Returns:
+		Samples of every date with `target_date`, `prediction` and `prob` columns and
+		without geometries, or None if feature extraction failed.
+	"""
+	feature_names = loaded.feature_names
+	gfs_cols = [f"{band}_{label}" for label, bands in get_gfs_projection(feature_names, FORECAST_TIMES).items()
+							for band in bands]
+	store = FeatureStore(feature_store_dir)
+
+	samples_by_date = {
+		target_date: prep_daily_sample(ponds, target_date, times_of_day)
+		for target_date in target_dates
+	}
 
-	predict_samples['sample_dt'] = predict_samples.apply(localize_time, axis=1)
-	predict_samples.reset_index(drop=True, inplace=True)
-	predict_samples['sample_idx'] = pd.Series(range(len(predict_samples)))
-	predict_samples = gpd.GeoDataFrame(predict_samples)
+	# Reuse stored features for dates where every sample already has the model's GFS features.
+	missing_dates = []
+	with stage('read_feature_store'):
+		for target_date, samples in samples_by_date.items():
+			stored = store.read_samples(samples, columns=gfs_cols, include_projected=True)
+			if stored is None or not set(gfs_cols).issubset(stored.columns) or stored[gfs_cols].isna().all().any():
+				missing_dates.append(target_date)
 
-	print(predict_samples.head())
+	if missing_dates:
+		print(f"Computing features for {len(missing_dates)} of {len(target_dates)} dates.")
+		to_compute = pd.concat([samples_by_date[target_date] for target_date in missing_dates], ignore_index=True)
+		to_compute['sample_idx'] = range(len(to_compute))
 
-	return predict_samples
+		computed = create_standard_dataset(to_compute,
+																			 f"daily_inference/{run_name}.csv",
+																			 download_dir,
+																			 f'daily_inference_{run_name}',
+																			 gcs_bucket=bucket,
+																			 gee_project=project,
+																			 gfs_cube_root=gfs_cube_root,
+																			 num_shards=num_shards,
+																			 feature_store_dir=feature_store_dir,
+																			 feature_names=feature_names,
+																			 run_dir=run.run_dir / 'features')
+		if computed is None:
+			return None
+		del computed, to_compute # Features are read back from the store.
+
+	# Geometries are no longer needed once features are stored.
+	samples = pd.concat([
+		pd.DataFrame(samples).drop(columns='geometry').assign(target_date=target_date)
+		for target_date, samples in samples_by_date.items()
+	], ignore_index=True)
+	del samples_by_date
+
+	read_cols = get_feature_columns(feature_names)
+	predict_df = store.read_samples(samples, columns=read_cols, include_projected=True)
+	if predict_df is None:
+		raise ValueError(f"Features are missing from {feature_store_dir} for ponds of {run_name}.")
+	missing_cols = [col for col in read_cols if col not in predict_df.columns]
+	if missing_cols:
+		raise ValueError(f"Features in {feature_store_dir} lack columns {missing_cols} needed by the model.")
+
+	X = prep_model_input(predict_df, feature_names)
+	samples['prediction'], samples['prob'] = predict_in_range(loaded.model, loaded.encoder, X)
+
+	return samples
 
 
 def run_daily_inference(pond_metadata: gpd.GeoDataFrame,
@@ -55,65 +260,39 @@ def run_daily_inference(pond_metadata: gpd.GeoDataFrame,
 												times_of_day: List[str] = ['09:00:00', '16:00:00'],
 												download_dir: str = 'data/gcs',
 												bucket: str = 'fwi-predict',
-												project: str = 'fwi-water-quality-sensing') -> gpd.GeoDataFrame:
-	"""Run daily inference for a given day and times of day."""
-	# Get prediction samples
-	if target_date == 'tomorrow':
-		target_date = datetime.today() + timedelta(days=1)
-		target_date = target_date.strftime('%Y-%m-%d')
-
-	predict_df_path = Path(f"./data/predict_dfs/daily/{target_date}.csv")
-	predict_samples = prep_daily_sample(pond_metadata, target_date, times_of_day)
-
-
-	if predict_df_path.exists(): 
-		predict_df = pd.read_csv(predict_df_path, parse_dates=['sample_dt'], index_col=0)
-	else:
-		gcs_fp = f"daily_inference/{target_date}.csv"
-		description = f'daily_inference_{target_date}'
-		predict_df = create_standard_dataset(predict_samples,
-																				 gcs_fp,
-																				 download_dir,
-																				 description,
-																				 gcs_bucket=bucket,
-																				 gee_project=project)
-		# Save predict df
-		predict_df.to_csv(predict_df_path)
-
-	num_sum_cols = predict_df.columns[predict_df.columns.str.contains('num_sum')].tolist()
-	drop_cols = ['sample_idx', 'pond_id', 'geometry'] + num_sum_cols
-	predict_df = predict_df.drop(columns=drop_cols)
-
-	# Get time parameters
-	predict_df['morning'] = predict_df['hour'] < 12
-
-	# Load prediction model
-	model_root = Path("./models/jun_21_dec_24_w_metadata").resolve()
-	model_name = 'XGBoost'
-	target = 'do_in_range'
-
-	target_root = model_root / target
-
-	with open(target_root / "encoder.pkl", 'rb') as f:
-			encoder = pickle.load(f)
-
-	with open(target_root / f"{model_name}.pkl", 'rb') as f:
-			model = pickle.load(f)
-
-	X = predict_df[model.feature_names_in_]
-	probs = model.predict_proba(X)
-	preds = encoder.inverse_transform(model.predict(X))
-
-	# Add prediction probabilities and results to dataframe
-	predict_samples['prediction'] = preds
-	predict_samples['prob'] = [probs[i, pred] for i, pred in enumerate(encoder.transform(preds))]
-	
-	predict_samples.to_csv(f"./output/daily/{target_date}")
+												project: str = 'fwi-water-quality-sensing',
+												gfs_cube_root: str = None,
+												feature_store_dir: str = './data/feature_store/daily',
+												run_root: str = './data/runs/daily',
+												metrics_dir: str = './output/daily/metrics') -> gpd.GeoDataFrame:
+	"""Run daily inference for a given day and times of day.
 
+	See `run_batch_inference`, which this runs for a single date.
+	"""
+	target_date = get_target_dates(target_date)[0]
+	predictions = run_batch_inference(pond_metadata, [target_date], times_of_day,
+																		download_dir=download_dir, bucket=bucket, project=project,
+																		gfs_cube_root=gfs_cube_root, feature_store_dir=feature_store_dir,
+																		run_root=run_root, metrics_dir=metrics_dir)
 
-if __name__ == "__main__":
+	return None if predictions is None else predictions[target_date]
 
+
+@click.command()
+@click.option('--start_date', type=str, default='tomorrow', help="First date to predict for (YYYY-MM-DD or 'tomorrow').")
+@click.option('--end_date', type=str, default=None, help='Last date to predict for. Defaults to start_date.')
+@click.option('--num_shards', type=int, default=1, help='Number of export tasks to split the GFS export into.')
+@click.option('--gfs_cube_root', type=click.Path(), default=None,
+							help='Compute GFS features from one cached pull of the latest GFS cycle in this directory.')
+@click.option('--chunk_size', type=int, default=1000, help='Number of ponds to predict for at once.')
+def main(start_date, end_date, num_shards, gfs_cube_root, chunk_size):
+	"""Predict for every pond on each date from start_date to end_date, e.g. to backfill or look ahead."""
 	ponds = gpd.read_file("./data/clean/pond_metadata_clean.geojson")
-	ponds = ponds[ponds['geometry'].is_valid].head(50)
+	ponds = ponds[ponds['geometry'].is_valid]
+
+	run_batch_inference(ponds, get_target_dates(start_date, end_date), num_shards=num_shards,
+											gfs_cube_root=gfs_cube_root, chunk_size=chunk_size)
 
-	run_daily_inference(ponds)
\ No newline at end of file
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,100 @@
+# Benchmark clean_gfs on a synthetic long format GFS export, comparing the
+# previous DataFrame.pivot implementation with the preallocated float32 pivot.
+import time
+import tracemalloc
+from pathlib import Path
+
+import click
+import numpy as np
+import pandas as pd
+
+from fwi_predict.constants import FORECAST_TIMES
+from fwi_predict.geo.ee import GFS_COMMON_BANDS
+from fwi_predict.pipeline import clean_gfs
+
+FORECAST_LABELS = [str(t) for t in FORECAST_TIMES] + \
+	['sample', 'three_day_cum', 'seven_day_cum', 'same_day_sum', 'before_day_sum']
+
+
+def clean_gfs_pivot(raw_gfs: pd.DataFrame) -> pd.DataFrame:
+	"""Previous `clean_gfs`, kept only for benchmarking."""
+	gfs = raw_gfs.copy()
+	gfs = gfs.drop(columns=['system:index', '.geo'], errors='ignore')
+
+	front_cols = ['sample_idx', 'forecast_time', 'forecast_creation_dt', 'forecast_hour']
+	gfs = gfs[front_cols + [col for col in gfs.columns if col not in front_cols]]
+	gfs = gfs.sort_values(['sample_idx', 'forecast_time'])
+
+	value_cols = gfs.columns[~gfs.columns.isin(front_cols)].tolist()
+	gfs_wide = gfs.pivot(index='sample_idx', columns='forecast_time', values=value_cols)
+	gfs_wide.columns = gfs_wide.columns.map('{0[0]}_{0[1]}'.format)
+
+	return gfs_wide
+
+
+def make_raw_gfs(n_rows: int, seed: int = 0) -> pd.DataFrame:
+	"""Make a shuffled synthetic export with about `n_rows` rows, like `pd.read_csv` returns it."""
+	rng = np.random.default_rng(seed)
+	n_samples = n_rows // len(FORECAST_LABELS)
+	n = n_samples * len(FORECAST_LABELS)
+
+	raw = pd.DataFrame({
+		'system:index': [f"{i}_0" for i in range(n)],
+		'sample_idx': np.repeat(np.arange(n_samples), len(FORECAST_LABELS)),
+		'forecast_time': np.tile(np.array(FORECAST_LABELS, dtype=object), n_samples),
+		'forecast_creation_dt': '2025022500',
+		'forecast_hour': '006',
+		**{band: rng.normal(size=n) for band in GFS_COMMON_BANDS},
+		'num_sum': rng.integers(1, 8, size=n),
+		'.geo': None
+	})
+
+	return raw.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def measure(fn, raw: pd.DataFrame):
+	"""Run fn on raw, returning (result, seconds, peak traced MB)."""
+	tracemalloc.start()
+	start = time.perf_counter()
+	result = fn(raw)
+	seconds = time.perf_counter() - start
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+
+	return result, seconds, peak / 1e6
+
+
+@click.command()
+@click.option('--n_rows', type=int, default=1_000_000, help='Number of rows in the synthetic export.')
+@click.option('--outpath', type=click.Path(), default="./output/benchmarks/clean_gfs.csv",
+							help='Where to save benchmark results.')
+def main(n_rows, outpath):
+	"""Benchmark clean_gfs time and peak memory on a synthetic export."""
+	raw = make_raw_gfs(n_rows)
+	print(f"Synthetic export: {len(raw)} rows, {raw.memory_usage(deep=True).sum() / 1e6:.0f} MB.")
+
+	implementations = {
+		'pivot': clean_gfs_pivot,
+		'preallocated': clean_gfs
+	}
+
+	results, outputs = [], {}
+	for name, fn in implementations.items():
+		outputs[name], seconds, peak_mb = measure(fn, raw)
+		results.append({'implementation': name, 'n_rows': len(raw), 'seconds': seconds, 'peak_mb': peak_mb})
+		print(results[-1])
+
+	expected, actual = outputs['pivot'], outputs['preallocated']
+	assert expected.columns.tolist() == actual.columns.tolist(), "Column names or order differ."
+	assert expected.index.equals(actual.index), "Index differs."
+	np.testing.assert_allclose(expected.to_numpy(dtype=np.float64), actual.to_numpy(dtype=np.float64), rtol=1e-6)
+	print("Outputs match.")
+
+	outpath = Path(outpath)
+	outpath.parent.mkdir(parents=True, exist_ok=True)
+	pd.DataFrame(results).to_csv(outpath, index=False)
+	print(f"Saved benchmark results to {outpath}.")
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,121 @@
+# Benchmark export task time against the number of forecast times, comparing
+# forecast_time labelling by list index (previous implementation) with labels
+# carried on the forecast images.
+import time
+from pathlib import Path
+
+import click
+import ee
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from geemap import gdf_to_ee
+
+from fwi_predict.geo.ee import (
+	GFS_COMMON_BANDS, GFS_LABEL_PROPERTIES, get_gfs, get_gfs_forecast_images,
+	get_sample_gfs_forecast, monitor_task
+)
+
+
+def get_sample_gfs_forecast_indexof(sample: ee.Feature, forecast_times: list) -> ee.FeatureCollection:
+	"""Previous `get_sample_gfs_forecast` labelling, kept only for benchmarking.
+
+	Samples unlabelled forecast images and recovers each feature's forecast time
+	with `indexOf` over the materialised list of sampled features.
+	"""
+	gfs = get_gfs().select(GFS_COMMON_BANDS)
+	sample_idx = sample.get('sample_idx')
+	images = get_gfs_forecast_images(ee.Date(sample.get('sample_dt')), forecast_times, gfs)
+	is_forecast = ee.Filter.inList('forecast_time', forecast_times)
+
+	def sample_image(img):
+		return img \
+			.sample(sample.geometry(), dropNulls=False) \
+			.first() \
+			.set('sample_idx', sample_idx)
+
+	forecast_values = images.filter(is_forecast).map(sample_image)
+	forecast_values_list = forecast_values.toList(forecast_values.size())
+	forecast_values = ee.FeatureCollection(
+		forecast_values.map(lambda f: f.set('forecast_time',
+			ee.List(forecast_times).get(forecast_values_list.indexOf(f))))
+	)
+	other_values = images.filter(is_forecast.Not()).map(
+		lambda img: sample_image(img).copyProperties(img, GFS_LABEL_PROPERTIES)
+	)
+
+	return forecast_values.merge(other_values)
+
+
+def get_task_runtime(task: ee.batch.Task) -> float:
+	"""Get seconds a finished task spent running."""
+	status = task.status()
+	return (status['update_timestamp_ms'] - status['start_timestamp_ms']) / 1000
+
+
+@click.command()
+@click.option('--samples_path', type=click.Path(exists=True), default="./data/clean/pond_metadata_clean.geojson",
+							help='Pond metadata to draw sample locations from.')
+@click.option('--n_samples', type=int, default=50, help='Number of samples per export.')
+@click.option('--sample_date', type=str, default='2025-02-27', help='Date of the samples.')
+@click.option('--lengths', type=str, default='2,4,7,14,28', help='Comma separated numbers of forecast times.')
+@click.option('--gcs_bucket', type=str, default='fwi-predict', help='GCS bucket to export to.')
+@click.option('--gee_project', type=str, default='fwi-water-quality-sensing', help='GEE project to use for export.')
+@click.option('--outpath', type=click.Path(), default="./output/benchmarks/gfs_forecast_labels.csv",
+							help='Where to save benchmark results.')
+def main(samples_path, n_samples, sample_date, lengths, gcs_bucket, gee_project, outpath):
+	"""Benchmark export task time as a function of len(FORECAST_TIMES)."""
+	ee.Authenticate()
+	ee.Initialize(project=gee_project)
+
+	ponds = gpd.read_file(samples_path)
+	ponds = ponds[ponds['geometry'].is_valid & ponds['geometry'].notna()].head(n_samples)
+	samples = gpd.GeoDataFrame({
+		'sample_idx': range(len(ponds)),
+		'sample_dt': pd.Timestamp(f"{sample_date} 09:00", tz='Asia/Kolkata'),
+	}, geometry=ponds['geometry'].to_numpy(), crs=ponds.crs)
+	samples_ee = gdf_to_ee(samples, date='sample_dt', date_format="yyyy-MM-dd'T'HH:mm:ssZ")
+
+	implementations = {
+		'indexof': get_sample_gfs_forecast_indexof,
+		'image_labels': get_sample_gfs_forecast
+	}
+
+	results = []
+	for length in [int(n) for n in lengths.split(',')]:
+		forecast_times = np.linspace(-33, 39, length).round().astype(int).tolist()
+
+		for name, get_forecast in implementations.items():
+			description = f"benchmark_labels_{name}_{length}"
+			task = ee.batch.Export.table.toCloudStorage(
+				collection=samples_ee.map(lambda f: get_forecast(f, forecast_times)).flatten(),
+				description=description,
+				bucket=gcs_bucket,
+				fileNamePrefix=f"benchmarks/{description}",
+				fileFormat='CSV'
+			)
+			start = time.perf_counter()
+			task.start()
+			success = monitor_task(task, check_interval=5)
+
+			results.append({
+				'implementation': name,
+				'n_forecast_times': length,
+				'n_samples': len(samples),
+				'success': success,
+				'task_runtime_s': get_task_runtime(task) if success else np.nan,
+				'wall_time_s': time.perf_counter() - start
+			})
+			print(results[-1])
+
+	results = pd.DataFrame(results)
+	print(results.pivot(index='n_forecast_times', columns='implementation', values='task_runtime_s'))
+
+	outpath = Path(outpath)
+	outpath.parent.mkdir(parents=True, exist_ok=True)
+	results.to_csv(outpath, index=False)
+	print(f"Saved benchmark results to {outpath}.")
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,84 @@
+# Benchmark loading models from pickles and from exported artifacts, both in a
+# fresh interpreter (startup, including imports) and in a warm process, checking
+# that both predict the same probabilities.
+import pickle
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import click
+import numpy as np
+import pandas as pd
+
+from fwi_predict.artifacts import load_artifact
+from fwi_predict.registry import ModelRegistry
+
+COLD_PICKLE = "import pickle, time; t = time.perf_counter(); pickle.load(open({path!r}, 'rb')); print(time.perf_counter() - t)"
+COLD_ARTIFACT = ("import time; t = time.perf_counter(); from fwi_predict.artifacts import load_artifact; "
+								 "load_artifact({path!r}); print(time.perf_counter() - t)")
+
+
+def time_cold(code: str, repeats: int) -> float:
+	"""Median seconds to run code in a fresh interpreter, as timed by the code itself."""
+	return float(np.median([
+		float(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout)
+		for _ in range(repeats)
+	]))
+
+
+def time_warm(fn, repeats: int) -> float:
+	"""Median seconds to run fn after a first, untimed call."""
+	fn()
+	seconds = []
+	for _ in range(repeats):
+		start = time.perf_counter()
+		fn()
+		seconds.append(time.perf_counter() - start)
+	return float(np.median(seconds))
+
+
+@click.command()
+@click.option('--model_root', type=click.Path(exists=True), default='./models', help='Directory of exported models.')
+@click.option('--repeats', type=int, default=5, help='Number of timed loads of each kind.')
+@click.option('--outpath', type=click.Path(), default="./output/benchmarks/model_loading.csv",
+							help='Where to save benchmark results.')
+def main(model_root, repeats, outpath):
+	"""Benchmark model loading from pickles and artifacts. Run scripts/export_models.py first."""
+	registry = ModelRegistry(model_root)
+	specs = [spec for spec in registry.list() if spec.path is not None and spec.artifact_path is not None]
+	if not specs:
+		raise click.ClickException(f"No exported models in {model_root}. Run scripts/export_models.py first.")
+
+	results = []
+	rng = np.random.default_rng(0)
+	for spec in specs:
+		pickle_path, artifact_path = str(spec.path.resolve()), str(spec.artifact_path.resolve())
+		model = pickle.load(open(pickle_path, 'rb'))
+		artifact, _ = load_artifact(artifact_path)
+
+		X = pd.DataFrame(rng.normal(size=(1000, len(model.feature_names_in_))).astype(np.float32),
+										 columns=model.feature_names_in_)
+		max_abs_diff = float(np.abs(model.predict_proba(X) - artifact.predict_proba(X)).max())
+
+		results.append({
+			'model': repr(spec),
+			'pickle_bytes': spec.path.stat().st_size,
+			'artifact_bytes': sum(path.stat().st_size for path in spec.artifact_path.rglob('*') if path.is_file()),
+			'pickle_cold_s': time_cold(COLD_PICKLE.format(path=pickle_path), repeats),
+			'artifact_cold_s': time_cold(COLD_ARTIFACT.format(path=artifact_path), repeats),
+			'pickle_warm_s': time_warm(lambda: pickle.load(open(pickle_path, 'rb')), repeats),
+			'artifact_warm_s': time_warm(lambda: load_artifact(artifact_path), repeats),
+			'artifact_warm_unverified_s': time_warm(lambda: load_artifact(artifact_path, verify=False), repeats),
+			'max_abs_diff': max_abs_diff
+		})
+		print(results[-1])
+
+	outpath = Path(outpath)
+	outpath.parent.mkdir(parents=True, exist_ok=True)
+	pd.DataFrame(results).to_csv(outpath, index=False)
+	print(f"Saved benchmark results to {outpath}.")
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,107 @@
+# Benchmark prep_daily_sample on synthetic ponds, comparing the previous row by
+# row implementation with the vectorized one using cached pond timezones.
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import click
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from pytz import timezone
+from timezonefinder import TimezoneFinder
+
+from fwi_predict.daily import prep_daily_sample
+
+TIMES_OF_DAY = ['06:00:00', '09:00:00', '12:00:00', '16:00:00']
+
+
+def prep_daily_sample_apply(pond_metadata: gpd.GeoDataFrame,
+														target_date: str,
+														times_of_day: list) -> gpd.GeoDataFrame:
+	"""Previous `prep_daily_sample`, kept only for benchmarking."""
+	keep_cols = ['pond_id', 'farmer', 'village', 'geometry', 'pond_depth_meters']
+	ponds = pond_metadata[keep_cols].copy()
+	ponds['do_winkler'] = True
+
+	ponds['timezones'] = ponds['geometry'].apply(
+		lambda g: TimezoneFinder().timezone_at(lng=g.x, lat=g.y)
+	)
+
+	predict_samples = (
+		ponds.loc[ponds.index.repeat(len(times_of_day))]
+		.assign(
+			time_of_day=list(times_of_day) * len(ponds)
+		)
+	)
+
+	def localize_time(row):
+		tz = timezone(row['timezones'])
+		date = datetime.strptime(target_date, '%Y-%m-%d')
+		return tz.localize(datetime.combine(date, pd.to_datetime(row['time_of_day']).time()))
+
+	predict_samples['sample_dt'] = predict_samples.apply(localize_time, axis=1)
+	predict_samples.reset_index(drop=True, inplace=True)
+	predict_samples['sample_idx'] = pd.Series(range(len(predict_samples)))
+	return gpd.GeoDataFrame(predict_samples)
+
+
+def make_ponds(n_ponds: int, seed: int = 0) -> gpd.GeoDataFrame:
+	"""Make synthetic ponds in Andhra Pradesh, a few sharing each location."""
+	rng = np.random.default_rng(seed)
+	n_locations = max(n_ponds // 4, 1)
+	loc = rng.integers(0, n_locations, size=n_ponds)
+	lon = rng.uniform(80.5, 82.5, size=n_locations)[loc]
+	lat = rng.uniform(16, 17.5, size=n_locations)[loc]
+
+	return gpd.GeoDataFrame({
+		'pond_id': np.arange(n_ponds),
+		'farmer': 'farmer',
+		'village': 'village',
+		'pond_depth_meters': 1.5,
+	}, geometry=gpd.points_from_xy(lon, lat), crs=4326)
+
+
+@click.command()
+@click.option('--n_ponds', type=int, default=2000, help='Number of synthetic ponds.')
+@click.option('--target_date', type=str, default='2025-03-01', help='Date to build samples for.')
+@click.option('--outpath', type=click.Path(), default="./output/benchmarks/prep_daily_sample.csv",
+							help='Where to save benchmark results.')
+def main(n_ponds, target_date, outpath):
+	"""Benchmark prep_daily_sample with cold and warm timezone caches."""
+	ponds = make_ponds(n_ponds)
+	results, outputs = [], {}
+
+	with tempfile.TemporaryDirectory() as cache_dir:
+		cache_path = Path(cache_dir) / "pond_timezones.csv"
+		implementations = {
+			'apply': lambda: prep_daily_sample_apply(ponds, target_date, TIMES_OF_DAY),
+			'vectorized_cold_cache': lambda: prep_daily_sample(ponds, target_date, TIMES_OF_DAY, cache_path),
+			'vectorized_warm_cache': lambda: prep_daily_sample(ponds, target_date, TIMES_OF_DAY, cache_path)
+		}
+
+		for name, fn in implementations.items():
+			start = time.perf_counter()
+			outputs[name] = fn()
+			seconds = time.perf_counter() - start
+			results.append({'implementation': name, 'n_ponds': n_ponds, 'n_samples': len(outputs[name]), 'seconds': seconds})
+			print(results[-1])
+
+	expected = outputs['apply']
+	for name in ['vectorized_cold_cache', 'vectorized_warm_cache']:
+		actual = outputs[name]
+		assert (expected['timezones'] == actual['timezones']).all(), f"Timezones differ ({name})."
+		assert (pd.to_datetime(expected['sample_dt'], utc=True) == pd.to_datetime(actual['sample_dt'], utc=True)).all(), (
+			f"Sample times differ ({name})."
+		)
+	print("Outputs match.")
+
+	outpath = Path(outpath)
+	outpath.parent.mkdir(parents=True, exist_ok=True)
+	pd.DataFrame(results).to_csv(outpath, index=False)
+	print(f"Saved benchmark results to {outpath}.")
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,80 @@
+# Benchmark predicting with pickled pipelines against exported artifacts evaluated
+# with flattened trees (fwi_predict.trees) and, for XGBoost models exported with
+# --native, the booster, checking that all predict the same probabilities.
+import os
+import pickle
+import time
+from pathlib import Path
+
+import click
+import numpy as np
+import pandas as pd
+
+from fwi_predict.artifacts import BOOSTER_NAME, COMPILED, NATIVE, load_artifact
+from fwi_predict.registry import ModelRegistry
+
+
+def time_predict(predict, X, repeats: int) -> float:
+	"""Median seconds to predict X."""
+	seconds = []
+	for _ in range(repeats):
+		start = time.perf_counter()
+		predict(X)
+		seconds.append(time.perf_counter() - start)
+	return float(np.median(seconds))
+
+
+@click.command()
+@click.option('--model_root', type=click.Path(exists=True), default='./models', help='Directory of exported models.')
+@click.option('--n_rows', type=int, default=20000, help='Number of synthetic samples to predict.')
+@click.option('--n_threads', type=int, default=os.cpu_count(), help='Threads for the multithreaded compiled path.')
+@click.option('--repeats', type=int, default=3, help='Number of timed predictions of each kind.')
+@click.option('--outpath', type=click.Path(), default="./output/benchmarks/tree_inference.csv",
+							help='Where to save benchmark results.')
+def main(model_root, n_rows, n_threads, repeats, outpath):
+	"""Benchmark tree ensemble inference. Run scripts/export_models.py first."""
+	registry = ModelRegistry(model_root)
+	specs = [spec for spec in registry.list() if spec.path is not None and spec.artifact_path is not None]
+	if not specs:
+		raise click.ClickException(f"No exported models in {model_root}. Run scripts/export_models.py first.")
+
+	results = []
+	rng = np.random.default_rng(0)
+	for spec in specs:
+		with open(spec.path, 'rb') as f:
+			pipeline = pickle.load(f)
+		compiled, _ = load_artifact(spec.artifact_path, backend=COMPILED)
+		threaded, _ = load_artifact(spec.artifact_path, backend=COMPILED, n_threads=n_threads)
+
+		# Features spread around the scaler's statistics, with some missing.
+		scaler = pipeline.steps[0][1] if hasattr(pipeline, 'steps') and len(pipeline.steps) > 1 else None
+		X = rng.normal(size=(n_rows, len(pipeline.feature_names_in_)))
+		if scaler is not None:
+			X = X * scaler.scale_ + scaler.mean_
+		X[rng.random(X.shape) < 0.05] = np.nan
+		X = pd.DataFrame(X.astype(np.float32), columns=pipeline.feature_names_in_)
+
+		predictors = {'pipeline': pipeline.predict_proba, 'compiled': compiled.predict_proba,
+									f'compiled_{n_threads}_threads': threaded.predict_proba}
+		if BOOSTER_NAME in compiled.manifest['files']:
+			native, _ = load_artifact(spec.artifact_path, backend=NATIVE)
+			predictors['native'] = native.predict_proba
+
+		expected = pipeline.predict_proba(X)
+		result = {'model': repr(spec), 'n_rows': n_rows, 'n_trees': len(compiled.ensemble.roots)}
+		for name, predict in predictors.items():
+			seconds = time_predict(predict, X, repeats)
+			result[f'{name}_rows_per_s'] = n_rows / seconds
+			if name != 'pipeline':
+				result[f'{name}_max_abs_diff'] = float(np.abs(predict(X) - expected).max())
+		results.append(result)
+		print(result)
+
+	outpath = Path(outpath)
+	outpath.parent.mkdir(parents=True, exist_ok=True)
+	pd.DataFrame(results).to_csv(outpath, index=False)
+	print(f"Saved benchmark results to {outpath}.")
+
+
+if __name__ == '__main__':
+	main()
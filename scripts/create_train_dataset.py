@@ -5,6 +5,7 @@ import geopandas as gpd
 
 from fwi_predict.gcs import upload_files
 from fwi_predict.pipeline import create_standard_dataset
+from fwi_predict.storage import LocalStorage
 
 @click.command()
 @click.argument('samples_path', type=click.Path(exists=True))
@@ -12,7 +13,19 @@ from fwi_predict.pipeline import create_standard_dataset
 @click.option('--gfs_download_root', type=str, default='./data/gcs', help='Root directory in which to save file.')
 @click.option('--gcs_bucket', type=str, default='fwi-predict', help='GCS bucket to save file to.')
 @click.option('--gee_project', type=str, default='fwi-water-quality-sensing', help='GEE project to use for export.')
-def create_dataset(samples_path, outdir, gfs_download_root, gcs_bucket, gee_project):
+@click.option('--gfs_cube_root', type=click.Path(), default=None, help='Compute GFS features from local GFS cubes in this directory.')
+@click.option('--num_shards', type=int, default=1, help='Number of export tasks to split the GFS export into.')
+@click.option('--shard_by', type=click.Choice(['date', 'cell']), default='date', help='Shard samples by date range or GFS grid cell.')
+@click.option('--max_concurrent_tasks', type=int, default=4, help='Maximum number of export tasks running at once.')
+@click.option('--feature_cache_dir', type=click.Path(), default='./data/feature_cache',
+							help='Reuse GFS features cached here so only new samples are exported.')
+@click.option('--feature_store_dir', type=click.Path(), default='./data/feature_store/train',
+							help='Feature store to write the dataset to.')
+@click.option('--storage_root', type=click.Path(), default=None,
+							help='Store the dataset in this local directory instead of the GCS bucket.')
+def create_dataset(samples_path, outdir, gfs_download_root, gcs_bucket, gee_project, gfs_cube_root,
+									 num_shards, shard_by, max_concurrent_tasks, feature_cache_dir, feature_store_dir,
+									 storage_root):
 	"""Create standard training dataset."""
 	filename = Path(samples_path).stem
 	gcs_filepath = Path("train") / "gfs" / f"{filename}.csv"
@@ -20,7 +33,13 @@ def create_dataset(samples_path, outdir, gfs_download_root, gcs_bucket, gee_proj
 
 	samples = gpd.read_file(samples_path)
 	ds = create_standard_dataset(samples, gcs_filepath, gfs_download_root,
-															 filename, gcs_bucket, gee_project)
+															 filename, gcs_bucket, gee_project,
+															 gfs_cube_root=gfs_cube_root,
+															 num_shards=num_shards,
+															 shard_by=shard_by,
+															 max_concurrent_tasks=max_concurrent_tasks,
+															 feature_cache_dir=feature_cache_dir,
+															 feature_store_dir=feature_store_dir)
 		
 	if ds is not None:
 		# Save locally
@@ -30,10 +49,11 @@ def create_dataset(samples_path, outdir, gfs_download_root, gcs_bucket, gee_proj
 		ds.to_csv(outpath)
 		print(f"Training data created.\nSaved to {outpath}.")
 
-		# Upload to GCS
+		# Upload to GCS, or keep on local disk
 		gcs_dest = Path("train") / "predict_dfs" / f"{filename}_predict_df.csv"
-		upload_files(outpath, gcs_dest, gcs_bucket, project=gee_project)
-		print(f"Uploaded to gs://{gcs_bucket}/{gcs_dest}")
+		storage_backend = None if storage_root is None else LocalStorage(storage_root)
+		upload_files(outpath, gcs_dest, gcs_bucket, project=gee_project, storage_backend=storage_backend)
+		print(f"Uploaded to {f'gs://{gcs_bucket}' if storage_root is None else storage_root}/{gcs_dest}")
 	else:
 		print("Training data creation failed.")
 
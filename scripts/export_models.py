@@ -0,0 +1,41 @@
+# Export every model under models/ that artifacts can represent as a `{name}.model`
+# artifact beside its pickle (see fwi_predict.artifacts).
+import pickle
+
+import click
+
+from fwi_predict.artifacts import UnsupportedModelError, export_model, get_artifact_path
+from fwi_predict.registry import ModelRegistry
+
+
+@click.command()
+@click.option('--model_root', type=click.Path(exists=True), default='./models', help='Directory of models to export.')
+@click.option('--native', is_flag=True, help='Also save XGBoost boosters, for the native backend.')
+def main(model_root, native):
+	"""Export model pickles as compact artifacts.
+
+	Models artifacts cannot represent are skipped, while flattened trees that do
+	not match their model fail the export.
+	"""
+	registry = ModelRegistry(model_root, use_artifacts=False)
+	for spec in registry.list():
+		if spec.path is None:
+			continue
+
+		with open(spec.path, 'rb') as f:
+			model = pickle.load(f)
+		encoder = None
+		if spec.encoder_path is not None:
+			with open(spec.encoder_path, 'rb') as f:
+				encoder = pickle.load(f)
+
+		try:
+			manifest = export_model(model, get_artifact_path(spec.path), encoder=encoder, native=native)
+		except UnsupportedModelError as e:
+			print(f"Skipping {spec}: {e}")
+			continue
+		print(f"Exported {spec} as {manifest['kind']} ({manifest['content_hash'][:12]}).")
+
+
+if __name__ == '__main__':
+	main()
@@ -7,6 +7,8 @@ import pandas as pd
 from sklearn.model_selection import GroupShuffleSplit, StratifiedShuffleSplit, StratifiedGroupKFold, train_test_split
 from ydata_profiling import compare, ProfileReport
 
+from fwi_predict.store import FeatureStore
+
 
 def discretize_col(col, qtiles=10):
     return pd.qcut(col, q=qtiles, labels=False, duplicates='drop')
@@ -74,8 +76,11 @@ def split_dataset(input_file,
                   stratify_column,
                   stratify_qtiles,
                   compare_splits):
-    # Load dataset
-    df = pd.read_csv(input_file) # MIght need to add header specification
+    # Load dataset, from a feature store directory or a CSV
+    if os.path.isdir(input_file):
+        df = pd.DataFrame(FeatureStore(input_file).read()).drop(columns=['geometry'], errors='ignore')
+    else:
+        df = pd.read_csv(input_file) # MIght need to add header specification
     
     train_idx, test_idx = split_data(df,
                                      split_type,
@@ -1,17 +1,21 @@
 # Test performance of models on measurements from June to December 2024.
-import pickle
 from pathlib import Path
 
 import click
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 
 from fwi_predict.constants import TZ_STRING
 from fwi_predict.pipeline import create_standard_dataset
+from fwi_predict.registry import get_registry
+from fwi_predict.scoring import ScoringEngine
+from fwi_predict.store import FeatureStore
 
 @click.command()
 @click.option('--re-export', is_flag=True, help='Re-export GFS data even if it already exists.')
-def main(re_export):
+@click.option('--n_jobs', type=int, default=1, help='Number of threads to score models in.')
+def main(re_export, n_jobs):
   """Test performance of models on measurements from June to December 2024."""
   # Clean measurements to get sample and pond ID
   measurements = pd.read_excel("./data/raw/Testing Data Jun-Dec 2024_ID,Date,Time only.xls")
@@ -47,10 +51,11 @@ def main(re_export):
   samples = samples[samples['geometry'].notna()]
   assert(samples['geometry'].isna().sum() == 0)
 
-  # Create feature df if it doesn't exist or reexport flag is True
-  predict_df_path = Path("./data/predict_dfs/trial/testing_data_jun_dec.csv")
-  
-  if not predict_df_path.exists() or re_export:
+  # Create feature df if it isn't stored or reexport flag is True
+  feature_store_dir = Path("./data/feature_store/trial")
+  predict_df = None if re_export else FeatureStore(feature_store_dir).read_samples(samples)
+
+  if predict_df is None:
     print("Creating feature data for measurements.")
     gfs_gcs_filepath = "trial/gfs/testing_data_jun_dec.csv"
     gfs_download_root = Path("./data/gcs").resolve()
@@ -59,50 +64,41 @@ def main(re_export):
     predict_df = create_standard_dataset(samples,
                                          gfs_gcs_filepath,
                                          gfs_download_root,
-                                         description=description)
-    
-    predict_df_path.parent.mkdir(parents=True, exist_ok=True)
-    predict_df.to_csv(predict_df_path)
+                                         description=description,
+                                         feature_store_dir=feature_store_dir)
   else:
     print("Loading existing feature data.")
-    predict_df = pd.read_csv(predict_df_path)
-
-  # Create X frame
-  sample_idx = predict_df['sample_idx'].copy() # Keep sample idx for later merge.
-  X = predict_df.drop(columns=['sample_dt', 'pond_id', 'geometry', 'sample_idx'])
 
-  # Predict
+  # Predict every model of every target from one shared feature matrix
   targets = ['do_in_range', 'ph_in_range', 'ammonia_in_range', 'turbidity_in_range']
-  results_df = measurements.copy()
-
-  for target in targets:
-    model_dir = Path("./models").resolve() / "measurements_with_metadata_simple" / target
-
-    #Load encoder
-    with open(model_dir / "encoder.pkl", 'rb') as f:
-      encoder = pickle.load(f)
-
-    # Load model
-    model_names = [file.stem for file in model_dir.iterdir() if file.stem != 'encoder']
-    for model_name in model_names:
-      with open(model_dir / f"{model_name}.pkl", 'rb') as f:
-        model = pickle.load(f)
-      
-      # Check that X has all required features in correct order
-      model_features = model.feature_names_in_
-      missing_features = set(model_features) - set(X.columns)
-      if missing_features:
-          raise ValueError(f"Missing required features: {missing_features}")
-      extra_features = set(X.columns) - set(model_features) 
-      if extra_features:
-          print(f"Warning: Extra features will be ignored: {extra_features}")
-
-      # Predict and store
-      probs = model.predict_proba(X[model_features])
-      for i, class_name in enumerate(encoder.classes_):
-          var_name = f"{target}_{class_name}_{model_name.lower().replace(' ', '_')}"
-          preds = pd.Series(probs[:, i], index=sample_idx)
-          results_df[var_name] = results_df['sample_idx'].map(preds)
+  model_set = "measurements_with_metadata_simple"
+  registry = get_registry("./models")
+  models = registry.get_all(model_set=model_set)
+  missing_targets = [target for target in targets if not any(loaded.spec.target == target for loaded in models)]
+  if len(missing_targets) == len(targets):
+    raise click.ClickException(f"No models for any of {targets} in model set '{model_set}'.")
+  if missing_targets:
+    print(f"Warning: No models in model set '{model_set}' for targets {missing_targets}. They will not be scored.")
+  engine = ScoringEngine([loaded for target in targets for loaded in models if loaded.spec.target == target])
+
+  extra_features = set(predict_df.columns) - set(engine.feature_names) - \
+    {'sample_dt', 'pond_id', 'geometry', 'sample_idx', 'sample_date'}
+  if extra_features:
+      print(f"Warning: Extra features will be ignored: {extra_features}")
+
+  probs = engine.score(predict_df, n_jobs=n_jobs)
+
+  # Align predictions with measurements on pond and sample time, as the feature store
+  # keeps one row per key; measurements of ponds without locations get NaN.
+  predict_keys = pd.MultiIndex.from_arrays([predict_df['pond_id'],
+                                            pd.to_datetime(predict_df['sample_dt'], utc=True)])
+  is_unique = ~predict_keys.duplicated(keep='last')
+  sample_keys = pd.MultiIndex.from_arrays([samples['pond_id'], pd.to_datetime(samples['sample_dt'], utc=True)])
+  rows = predict_keys[is_unique].get_indexer(sample_keys)
+  assert (rows >= 0).all(), f"{(rows < 0).sum()} samples have no features."
+  aligned = np.full((len(measurements), len(engine.labels)), np.nan, dtype=np.float32)
+  aligned[measurements.index.get_indexer(samples.index)] = probs[is_unique][rows]
+  results_df = pd.concat([measurements, pd.DataFrame(aligned, index=measurements.index, columns=engine.labels)], axis=1)
 
   outpath = Path("./output").resolve() / "trial" / "testing_data_jun_dec_results.csv"
   outpath.parent.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,26 @@
+import click
+
+from fwi_predict.service import POND_METADATA_PATH, PredictionService, serve
+
+
+@click.command()
+@click.option('--host', type=str, default='127.0.0.1', help='Address to listen on.')
+@click.option('--port', type=int, default=8080, help='Port to listen on.')
+@click.option('--target', type=str, default='do_in_range', help='Target to predict.')
+@click.option('--model_name', type=str, default='XGBoost', help='Name of the model to predict with.')
+@click.option('--model_set', type=str, default='jun_21_dec_24_w_metadata', help='Model set under ./models holding the model.')
+@click.option('--feature_store_dir', type=click.Path(), default='./data/feature_store/daily',
+							help='Feature store written by run_daily.py.')
+@click.option('--pond_metadata_path', type=click.Path(exists=True), default=POND_METADATA_PATH, help='Pond metadata GeoJSON.')
+@click.option('--preload_days', type=int, default=7, help='Number of latest stored dates to load on start.')
+@click.option('--max_wait_ms', type=float, default=2, help='Longest time to wait to batch concurrent requests.')
+def main(host, port, target, model_name, model_set, feature_store_dir, pond_metadata_path, preload_days, max_wait_ms):
+	"""Serve predictions for ponds from models and stored features kept in memory."""
+	service = PredictionService(target=target, model_name=model_name, model_set=model_set,
+															feature_store_dir=feature_store_dir, pond_metadata_path=pond_metadata_path,
+															preload_days=preload_days, max_wait_s=max_wait_ms / 1000)
+	serve(service, host=host, port=port)
+
+
+if __name__ == "__main__":
+	main()
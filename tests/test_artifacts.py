@@ -0,0 +1,78 @@
+"""Compact model artifacts."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+from xgboost import XGBClassifier
+
+from fwi_predict import artifacts
+from fwi_predict.artifacts import (BOOSTER_NAME, COMPILED, NATIVE, UnsupportedModelError, export_model,
+																	 load_artifact)
+
+
+def make_data(n: int = 200, seed: int = 0):
+	rng = np.random.default_rng(seed)
+	X = pd.DataFrame(rng.normal(size=(n, 3)), columns=['a', 'b', 'c'])
+	y = np.where(X['a'] + X['b'] > 0, 'above', 'below')
+	return X, y
+
+
+@pytest.fixture
+def xgboost_model():
+	X, y = make_data()
+	encoder = LabelEncoder().fit(y)
+	return make_pipeline(StandardScaler(), XGBClassifier(n_estimators=10, max_depth=3)).fit(X, encoder.transform(y)), encoder
+
+
+@pytest.mark.parametrize('native', [False, True])
+def test_xgboost_boosters_are_only_saved_when_asked_for(tmp_path, xgboost_model, native):
+	model, encoder = xgboost_model
+	manifest = export_model(model, tmp_path / 'XGBoost.model', encoder=encoder, native=native)
+	assert (BOOSTER_NAME in manifest['files']) == native
+
+	X, _ = make_data(seed=1)
+	loaded, loaded_encoder = load_artifact(tmp_path / 'XGBoost.model')
+	assert loaded.backend == (NATIVE if native else COMPILED)
+	np.testing.assert_allclose(loaded.predict_proba(X.astype(np.float32)), model.predict_proba(X.astype(np.float32)),
+														 atol=1e-6)
+	assert list(loaded_encoder.classes_) == ['above', 'below']
+
+	if not native:
+		with pytest.raises(ValueError, match='no booster'):
+			load_artifact(tmp_path / 'XGBoost.model', backend=NATIVE)
+
+
+def test_files_are_only_hashed_when_verifying(tmp_path, xgboost_model, monkeypatch):
+	export_model(xgboost_model[0], tmp_path / 'XGBoost.model')
+	hashed = []
+	sha256 = artifacts._sha256
+	monkeypatch.setattr(artifacts, '_sha256', lambda path: hashed.append(path) or sha256(path))
+
+	load_artifact(tmp_path / 'XGBoost.model')
+	assert hashed == []
+	load_artifact(tmp_path / 'XGBoost.model', verify=True)
+	assert len(hashed) > 0
+
+	(tmp_path / 'XGBoost.model' / 'trees' / 'threshold.npy').write_bytes(b'corrupt')
+	with pytest.raises(ValueError, match='does not match its hash'):
+		load_artifact(tmp_path / 'XGBoost.model', verify=True)
+
+
+def test_unsupported_models_raise(tmp_path):
+	X, y = make_data()
+	with pytest.raises(UnsupportedModelError, match='LogisticRegression'):
+		export_model(make_pipeline(LogisticRegression()).fit(X, y), tmp_path / 'Logistic.model')
+	assert not list(tmp_path.iterdir())
+
+
+def test_mismatched_trees_fail_the_export(tmp_path, xgboost_model, monkeypatch):
+	def check_ensemble(ensemble, classifier, X, atol):
+		raise ValueError("Flattened ensemble differs from the model.")
+
+	monkeypatch.setattr(artifacts, 'check_ensemble', check_ensemble)
+	with pytest.raises(ValueError, match='differs') as excinfo:
+		export_model(xgboost_model[0], tmp_path / 'XGBoost.model')
+	assert not isinstance(excinfo.value, UnsupportedModelError)
+	assert not (tmp_path / 'XGBoost.model').exists()
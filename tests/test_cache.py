@@ -0,0 +1,50 @@
+"""Content-addressed GFS feature cache."""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from fwi_predict import cache as feature_cache
+from fwi_predict.cache import KEY_COLUMN, FeatureCache
+
+
+def make_features(keys, seed: int = 0) -> pd.DataFrame:
+	rng = np.random.default_rng(seed)
+	return pd.DataFrame({'temperature_2m_above_ground_8': rng.normal(size=len(keys)).astype(np.float32),
+											 'num_sum_8': np.ones(len(keys), dtype=np.float32)},
+											index=pd.Index(keys, name=KEY_COLUMN))
+
+
+def make_keys(n: int, salt: str = '') -> list:
+	return [hashlib.sha256(f"{salt}{i}".encode()).hexdigest() for i in range(n)]
+
+
+def test_load_returns_saved_features(tmp_path):
+	cache = FeatureCache(tmp_path)
+	keys = make_keys(300)
+	features = make_features(keys)
+	cache.save(features.iloc[:200])
+	cache.save(features.iloc[150:])
+
+	loaded = cache.load(pd.Series(keys[100:] + make_keys(5, salt='missing')))
+	pd.testing.assert_frame_equal(loaded.sort_index(), features.iloc[100:].sort_index())
+
+
+def test_load_only_reads_shards_of_requested_keys(tmp_path, monkeypatch):
+	cache = FeatureCache(tmp_path)
+	keys = make_keys(2000)
+	cache.save(make_features(keys))
+
+	read_paths = []
+	read_table = feature_cache.pq.read_table
+	monkeypatch.setattr(feature_cache.pq, 'read_table',
+											lambda path, **kwargs: read_paths.append(path) or read_table(path, **kwargs))
+	loaded = cache.load(pd.Series(keys[:3]))
+
+	assert sorted(loaded.index) == sorted(keys[:3])
+	assert {path.parent.name for path in read_paths} == {key[:2] for key in keys[:3]}
+
+
+def test_empty_cache_loads_nothing(tmp_path):
+	loaded = FeatureCache(tmp_path / 'missing').load(pd.Series(make_keys(3)))
+	assert loaded.empty and loaded.index.name == KEY_COLUMN
@@ -0,0 +1,184 @@
+"""Parity of the NumPy GFS feature engine with the Earth Engine feature definitions."""
+import json
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Point
+
+from fwi_predict.geo import cube as gfs_cube
+from fwi_predict.geo.cube import (CYCLE_MS, DAY_MS, HOUR_MS, GFSCube, download_gfs_cube, get_cube_gfs_forecasts,
+																	get_gfs_cube_nbytes)
+
+BANDS = ['temperature_2m_above_ground', 'total_precipitation_surface']
+FORECAST_TIMES = [8, 15, -9, -33]
+TIMEZONE = 'Asia/Kolkata'
+
+
+def make_cube(seed: int = 0) -> GFSCube:
+	"""Cube of random forecasts over a 2 x 3 cell grid, with some cycles and leads missing."""
+	rng = np.random.default_rng(seed)
+	first_cycle = pd.Timestamp('2024-06-01', tz='UTC').value // 10 ** 6
+	creation_times = first_cycle + np.arange(48) * CYCLE_MS # Twelve days of cycles.
+	max_lead_hours = 96
+	times = np.arange(creation_times[0], creation_times[-1] + (max_lead_hours + 1) * HOUR_MS, HOUR_MS)
+	lats, lons = np.array([22.5, 22.25]), np.array([88.0, 88.25, 88.5])
+
+	values = np.full((len(times), len(creation_times), len(BANDS), len(lats), len(lons)), np.nan, dtype=np.float32)
+	for c_idx, creation in enumerate(creation_times):
+		if c_idx % 7 == 3:
+			continue # A cycle missing from the collection.
+		leads = np.arange(max_lead_hours + 1)
+		leads = leads[rng.random(len(leads)) > 0.1]
+		t_idx = (creation + leads * HOUR_MS - times[0]) // HOUR_MS
+		values[t_idx, c_idx] = rng.normal(size=(len(t_idx), len(BANDS), len(lats), len(lons)))
+
+	return GFSCube(values, times, creation_times, BANDS, lats, lons)
+
+
+def make_samples() -> gpd.GeoDataFrame:
+	sample_dt = pd.to_datetime(['2024-06-08 08:10', '2024-06-08 16:40', '2024-06-10 06:30', '2024-06-09 23:50'])
+	return gpd.GeoDataFrame({
+		'sample_idx': [10, 11, 12, 13],
+		'sample_dt': sample_dt.tz_localize(TIMEZONE),
+		'geometry': [Point(88.02, 22.48), Point(88.3, 22.3), Point(88.45, 22.2), Point(88.02, 22.48)]
+	}, crs=4326)
+
+
+def latest(cube: GFSCube, t: int, lat: int, lon: int, min_creation: int, max_creation: int,
+					 before_forecast_time: bool = False):
+	"""Latest forecast for a time created in [min_creation, max_creation), as (values, creation)."""
+	if (t - cube.times[0]) % HOUR_MS or not 0 <= (t - cube.times[0]) // HOUR_MS < len(cube.times):
+		return None, None
+	t_idx = (t - cube.times[0]) // HOUR_MS
+	for c_idx in range(len(cube.creation_times) - 1, -1, -1):
+		creation = cube.creation_times[c_idx]
+		if not min_creation <= creation < max_creation or (before_forecast_time and creation >= t):
+			continue
+		if np.isfinite(cube.values[t_idx, c_idx, 0]).any():
+			return cube.values[t_idx, c_idx, :, lat, lon].astype(np.float64), creation
+	return None, None
+
+
+def local_time(utc_ms: int, hour: int, minute: int) -> int:
+	"""Epoch millis of a local time of day on the local date of a UTC time."""
+	local = pd.Timestamp(utc_ms, unit='ms', tz='UTC').tz_convert(TIMEZONE).normalize()
+	return (local + pd.Timedelta(hour * 60 + minute, unit='m')).tz_convert('UTC').value // 10 ** 6
+
+
+def reference_features(cube: GFSCube, sample) -> dict:
+	"""Features of one sample following `get_gfs_forecast_images`, one forecast at a time."""
+	lat = int(np.argmin(np.abs(cube.lats - round(sample.geometry.y * 4) / 4)))
+	lon = int(np.argmin(np.abs(cube.lons - round(sample.geometry.x * 4) / 4)))
+	sample_ms = sample.sample_dt.tz_convert('UTC').value // 10 ** 6
+	day_prior = sample_ms // DAY_MS * DAY_MS - DAY_MS
+	rounded = (sample_ms + HOUR_MS // 2) // HOUR_MS * HOUR_MS
+	earliest = day_prior + (min(FORECAST_TIMES) - 6) * HOUR_MS - 36 * HOUR_MS
+
+	features = {}
+	for label, t in [(str(h), day_prior + (h - 6) * HOUR_MS) for h in FORECAST_TIMES] + [('sample', rounded)]:
+		values, creation = latest(cube, t, lat, lon, earliest, day_prior, before_forecast_time=True)
+		lead = None if creation is None else (t - creation) // HOUR_MS
+		features[label] = (values, int(values is not None), creation, lead)
+
+	def add_sum(label, times, min_creation, max_creation):
+		found = [latest(cube, t, lat, lon, min_creation, max_creation)[0] for t in times]
+		found = [values for values in found if values is not None]
+		total = np.nansum(found, axis=0) if found else np.full(len(BANDS), np.nan)
+		features[label] = (total, len(found), None, None)
+
+	for lookback_days, label in [(3, 'three_day_cum'), (7, 'seven_day_cum')]:
+		times = [day_prior - day * DAY_MS + 9 * HOUR_MS for day in range(lookback_days + 1)]
+		add_sum(label, times, day_prior - (lookback_days + 1) * DAY_MS, sample_ms)
+
+	same_day_start = local_time(rounded, 0, 30)
+	before_day_start = local_time(rounded - DAY_MS, 0, 30)
+	for label, start, end in [('same_day_sum', same_day_start, rounded),
+														('before_day_sum', before_day_start, before_day_start + DAY_MS)]:
+		add_sum(label, range(start, end + 1, HOUR_MS), start - 4 * DAY_MS, day_prior)
+
+	return features
+
+
+def test_cube_features_match_reference():
+	cube, samples = make_cube(), make_samples()
+	forecasts = get_cube_gfs_forecasts(cube, samples, FORECAST_TIMES, timezone=TIMEZONE)
+
+	labels = [str(h) for h in FORECAST_TIMES] + ['sample', 'three_day_cum', 'seven_day_cum',
+																							 'same_day_sum', 'before_day_sum']
+	assert len(forecasts) == len(samples) * len(labels)
+	forecasts = forecasts.set_index(['sample_idx', 'forecast_time'])
+
+	for sample in samples.itertuples():
+		for label, (values, num_sum, creation, lead) in reference_features(cube, sample).items():
+			row = forecasts.loc[(sample.sample_idx, label)]
+			assert row['num_sum'] == num_sum, (sample.sample_idx, label)
+			if num_sum == 0:
+				assert row[BANDS].isna().all(), (sample.sample_idx, label)
+				continue
+			np.testing.assert_allclose(row[BANDS].to_numpy(dtype=np.float64), values, rtol=1e-6,
+																 err_msg=f"{sample.sample_idx} {label}")
+			if creation is not None:
+				assert row['forecast_creation_dt'] == pd.Timestamp(creation, unit='ms').strftime('%Y%m%d%H')
+				assert row['forecast_hour'] == f"{lead:03d}"
+
+
+def test_cube_features_find_forecasts():
+	"""Guard against a reference and engine that agree only because nothing is found."""
+	forecasts = get_cube_gfs_forecasts(make_cube(), make_samples(), FORECAST_TIMES, timezone=TIMEZONE)
+	assert (forecasts['num_sum'] > 0).mean() > 0.9
+
+
+def test_samples_outside_cube_raise():
+	samples = make_samples()
+	samples.loc[0, 'geometry'] = Point(80, 10)
+	with pytest.raises(ValueError):
+		get_cube_gfs_forecasts(make_cube(), samples, FORECAST_TIMES, timezone=TIMEZONE)
+
+
+def test_cube_round_trips_through_disk(tmp_path):
+	cube = make_cube()
+	cube.save(tmp_path)
+	loaded = GFSCube.load(tmp_path)
+	assert isinstance(loaded.values, np.memmap)
+	pd.testing.assert_frame_equal(get_cube_gfs_forecasts(loaded, make_samples(), FORECAST_TIMES, timezone=TIMEZONE),
+																get_cube_gfs_forecasts(cube, make_samples(), FORECAST_TIMES, timezone=TIMEZONE))
+
+
+def test_download_refuses_oversized_cubes(tmp_path):
+	bounds = (80.0, 15.0, 90.0, 25.0)
+	start = pd.Timestamp('2021-06-01', tz='UTC').value // 10 ** 6
+	end = pd.Timestamp('2024-12-31', tz='UTC').value // 10 ** 6
+	assert get_gfs_cube_nbytes(bounds, start, end) > 2 ** 40
+
+	with pytest.raises(ValueError, match='GiB'):
+		download_gfs_cube(tmp_path / 'cube', bounds, start, end)
+	assert not (tmp_path / 'cube').exists()
+
+
+def test_cube_size_bound_matches_pulled_cube():
+	cube = make_cube()
+	bounds = (cube.lons.min(), cube.lats.min(), cube.lons.max(), cube.lats.max())
+	nbytes = get_gfs_cube_nbytes(bounds, cube.start, cube.end, max_lead_hours=96, n_bands=len(BANDS))
+	assert nbytes == cube.values.nbytes
+
+
+def test_cached_cycle_needs_no_earth_engine_and_warns_past_horizon(tmp_path, monkeypatch, capsys):
+	current_cycle = pd.Timestamp.now(tz='UTC').floor('6h')
+	(tmp_path / 'latest_cycle.json').write_text(json.dumps({
+		'creation_time': current_cycle.value // 10 ** 6,
+		'checked_at': pd.Timestamp.now(tz='UTC').value // 10 ** 6
+	}))
+	monkeypatch.setattr(gfs_cube, 'initialize', lambda project: pytest.fail("Earth Engine was initialized."))
+	pulled = {}
+	monkeypatch.setattr(gfs_cube, 'download_gfs_cube', lambda path, *args, **kwargs: pulled.update(kwargs))
+
+	samples = make_samples()
+	days_ahead = [1, 2, 6, 7]
+	samples['sample_dt'] = [(current_cycle + pd.Timedelta(days, unit='D')).tz_convert(TIMEZONE).floor('D') +
+													pd.Timedelta(9, unit='h') for days in days_ahead]
+	gfs_cube.get_gfs_cube(tmp_path, samples, forecast_times=FORECAST_TIMES)
+
+	assert "2 of 4 samples are past the single forecast horizon" in capsys.readouterr().out
+	assert pulled['project'] == 'fwi-water-quality-sensing'
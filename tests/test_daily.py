@@ -0,0 +1,78 @@
+"""Prediction samples for daily inference."""
+from datetime import datetime
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from pytz import timezone
+from shapely.geometry import Point
+from timezonefinder import TimezoneFinder
+
+from fwi_predict import daily
+from fwi_predict.daily import get_pond_timezones, prep_daily_sample
+
+# Ponds in India and the eastern US, whose timezone has DST transitions.
+POND_LOCATIONS = [(81.5, 16.5), (81.5, 16.5), (-75.5, 39.5), (80.2, 13.1)]
+
+
+def make_ponds(locations=POND_LOCATIONS) -> gpd.GeoDataFrame:
+	return gpd.GeoDataFrame({
+		'pond_id': np.arange(len(locations)),
+		'farmer': 'farmer',
+		'village': 'village',
+		'pond_depth_meters': 1.5
+	}, geometry=[Point(lon, lat) for lon, lat in locations], crs=4326)
+
+
+def localize_row_by_row(ponds: gpd.GeoDataFrame, target_date: str, times_of_day: list) -> list:
+	"""Sample times as localized by the row by row implementation prep_daily_sample replaced."""
+	date = datetime.strptime(target_date, '%Y-%m-%d')
+	sample_dt = []
+	for point in ponds.geometry:
+		tz = timezone(TimezoneFinder().timezone_at(lng=point.x, lat=point.y))
+		sample_dt += [tz.localize(datetime.combine(date, pd.to_datetime(time_of_day).time()))
+									for time_of_day in times_of_day]
+	return sample_dt
+
+
+@pytest.mark.parametrize('target_date, times_of_day', [
+	('2024-06-01', ['09:00:00', '16:00:00']),
+	('2024-03-10', ['02:30:00', '09:00:00']), # 02:30 does not exist in New York.
+	('2024-11-03', ['01:30:00', '16:00:00']) # 01:30 happens twice in New York.
+])
+def test_sample_times_match_row_by_row_localization(tmp_path, target_date, times_of_day):
+	ponds = make_ponds()
+	samples = prep_daily_sample(ponds, target_date, times_of_day, tmp_path / 'timezones.csv')
+
+	expected = localize_row_by_row(ponds, target_date, times_of_day)
+	timezones = ['Asia/Kolkata'] * 2 + ['America/New_York', 'Asia/Kolkata']
+	assert samples['timezones'].tolist() == np.repeat(timezones, len(times_of_day)).tolist()
+	assert [pd.Timestamp(dt) for dt in samples['sample_dt']] == [pd.Timestamp(dt) for dt in expected]
+	assert samples['pond_id'].tolist() == np.repeat(ponds['pond_id'], len(times_of_day)).tolist()
+	assert samples['sample_idx'].tolist() == list(range(len(ponds) * len(times_of_day)))
+
+
+def test_timezone_cache_looks_up_new_locations_only(tmp_path, monkeypatch):
+	lookups = []
+
+	class CountingFinder(TimezoneFinder):
+		def timezone_at(self, lng, lat):
+			lookups.append((lng, lat))
+			return super().timezone_at(lng=lng, lat=lat)
+
+	monkeypatch.setattr(daily, 'TimezoneFinder', CountingFinder)
+	cache_path = tmp_path / 'clean' / 'pond_timezones.csv'
+
+	ponds = make_ponds()
+	assert get_pond_timezones(ponds, cache_path).tolist() == ['Asia/Kolkata'] * 2 + ['America/New_York', 'Asia/Kolkata']
+	assert len(lookups) == 3 and cache_path.exists()
+
+	assert get_pond_timezones(ponds, cache_path).tolist() == ['Asia/Kolkata'] * 2 + ['America/New_York', 'Asia/Kolkata']
+	assert len(lookups) == 3
+
+	# A pond moved to another timezone is looked up at its new coordinates.
+	moved = make_ponds(POND_LOCATIONS[:2] + [(-122.4, 37.8)] + POND_LOCATIONS[3:])
+	assert get_pond_timezones(moved, cache_path).tolist() == ['Asia/Kolkata'] * 2 + ['America/Los_Angeles', 'Asia/Kolkata']
+	assert lookups[3:] == [(-122.4, 37.8)]
+	assert len(pd.read_csv(cache_path)) == 4
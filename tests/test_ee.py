@@ -0,0 +1,76 @@
+"""Synchronous GFS forecast computation without Earth Engine."""
+import threading
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Point
+
+from fwi_predict.geo import ee as gee
+
+FORECAST_TIMES = [8, -9]
+
+
+class FakeClient:
+	"""Stands in for `EarthEngineClient`, returning one row per sample and forecast time."""
+
+	def __init__(self, fail_on: int = None):
+		self.fail_on = fail_on
+		self.chunks = []
+		self._lock = threading.Lock()
+
+
+	def compute_gfs_forecasts(self, samples: gpd.GeoDataFrame, forecast_times):
+		with self._lock:
+			self.chunks.append(samples['sample_idx'].tolist())
+		if self.fail_on is not None and self.fail_on in samples['sample_idx'].to_numpy():
+			raise RuntimeError("Earth Engine request failed.")
+
+		labels = [str(t) for t in forecast_times]
+		return pd.DataFrame({
+			'sample_idx': np.repeat(samples['sample_idx'].to_numpy(), len(labels)),
+			'forecast_time': labels * len(samples),
+			'temperature_2m_above_ground': np.repeat(samples['sample_idx'].to_numpy() * 1.5, len(labels))
+		})
+
+
+def make_samples(n: int) -> gpd.GeoDataFrame:
+	return gpd.GeoDataFrame({
+		'sample_idx': np.arange(n),
+		'sample_dt': pd.date_range('2024-06-01 08:00', periods=n, freq='h', tz='Asia/Kolkata'),
+		'geometry': [Point(88 + i / 100, 22) for i in range(n)]
+	}, crs=4326)
+
+
+def test_compute_forecasts_chunks_every_sample_once():
+	client = FakeClient()
+	forecasts = gee.compute_forecasts_for_samples(make_samples(23), FORECAST_TIMES, chunk_size=5,
+																								max_workers=3, client=client)
+
+	assert sorted(len(chunk) for chunk in client.chunks) == [3, 5, 5, 5, 5]
+	assert sorted(idx for chunk in client.chunks for idx in chunk) == list(range(23))
+	assert len(forecasts) == 23 * len(FORECAST_TIMES)
+	assert forecasts.index.tolist() == list(range(len(forecasts)))
+	assert forecasts.groupby('sample_idx')['forecast_time'].apply(sorted).tolist() == [['-9', '8']] * 23
+	np.testing.assert_array_equal(forecasts['temperature_2m_above_ground'], forecasts['sample_idx'] * 1.5)
+
+
+def test_compute_forecasts_raises_failed_chunks():
+	with pytest.raises(RuntimeError):
+		gee.compute_forecasts_for_samples(make_samples(10), FORECAST_TIMES, chunk_size=4, client=FakeClient(fail_on=6))
+
+
+def test_client_labels_forecast_times_like_exports(monkeypatch):
+	"""Numeric forecast times of any type are read back as the text of an export CSV."""
+	computed = pd.DataFrame({
+		'geo': [None] * 5,
+		'sample_idx': [0] * 5,
+		'forecast_time': [np.int64(8), np.float64(-9.0), 15, 21.0, 'same_day_sum']
+	})
+	monkeypatch.setattr(gee, 'get_forecasts_for_samples', lambda *args, **kwargs: None)
+	monkeypatch.setattr(gee.ee.data, 'computeFeatures', lambda params: computed.copy())
+
+	forecasts = gee.EarthEngineClient().compute_gfs_forecasts(make_samples(1), [8, -9, 15, 21])
+	assert forecasts['forecast_time'].tolist() == ['8', '-9', '15', '21', 'same_day_sum']
+	assert 'geo' not in forecasts.columns
@@ -0,0 +1,102 @@
+"""Per-stage timing and resource instrumentation."""
+import json
+
+import pytest
+
+from fwi_predict import instrument
+from fwi_predict.instrument import count, disable, enable, instrumented, stage
+
+
+@pytest.fixture
+def recorder():
+	recorder = enable('test')
+	yield recorder
+	disable()
+
+
+def records_by_name(recorder) -> dict:
+	return {record['name']: record for record in recorder.records}
+
+
+def test_stages_record_their_parents(recorder):
+	with stage('outer'):
+		with stage('inner'):
+			pass
+		with stage('sibling'):
+			pass
+
+	assert [record['name'] for record in recorder.records] == ['inner', 'sibling', 'outer']
+	records = records_by_name(recorder)
+	assert records['outer']['parent'] is None
+	assert records['inner']['parent'] == 'outer' and records['sibling']['parent'] == 'outer'
+	assert records['outer']['wall_s'] >= records['inner']['wall_s'] >= 0
+	assert instrument._current_stage.get() is None
+
+
+def test_failed_stages_record_their_error(recorder):
+	with pytest.raises(KeyError):
+		with stage('lookup'):
+			raise KeyError('pond')
+	assert recorder.records[0]['error'] == 'KeyError'
+
+
+def test_counts_add_up_in_the_current_stage(recorder):
+	with stage('outer') as outer:
+		count(rows=10)
+		with stage('inner'):
+			count(rows=1, bytes_downloaded=100)
+			count(rows=2)
+		outer.count(rows=5)
+
+	records = records_by_name(recorder)
+	assert records['inner']['rows'] == 3 and records['inner']['bytes_downloaded'] == 100
+	assert records['outer']['rows'] == 15 and 'bytes_downloaded' not in records['outer']
+
+
+def test_count_outside_stages_is_ignored(recorder):
+	count(rows=1)
+	assert recorder.records == []
+
+
+class Model:
+
+	@instrumented()
+	def predict(self, x):
+		return x * 2
+
+	@instrumented('fit_model')
+	def fit(self, x):
+		with stage('prep'):
+			return x
+
+
+def test_instrumented_methods_run_as_stages(recorder):
+	model = Model()
+	assert model.predict(2) == 4
+	assert model.fit(3) == 3
+	assert Model.predict.__name__ == 'predict'
+
+	records = records_by_name(recorder)
+	assert set(records) == {'predict', 'fit_model', 'prep'}
+	assert records['prep']['parent'] == 'fit_model'
+
+
+def test_disabled_instrumentation_is_a_no_op(tmp_path):
+	assert disable() is None
+	with stage('outer') as outer:
+		count(rows=1)
+		outer.count(rows=1)
+	assert outer is instrument._NULL_STAGE
+	assert Model().predict(2) == 4
+
+	recorder = enable('test')
+	with stage('measured'):
+		pass
+	assert disable() is recorder
+	with stage('ignored'):
+		pass
+	assert [record['name'] for record in recorder.records] == ['measured']
+
+	path = recorder.write(tmp_path / 'metrics' / 'test.json')
+	written = json.loads(path.read_text())
+	assert written['run_id'] == 'test' and [record['name'] for record in written['stages']] == ['measured']
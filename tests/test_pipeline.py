@@ -0,0 +1,78 @@
+"""Reading and cleaning GFS exports."""
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+from shapely.geometry import Point
+
+from fwi_predict import pipeline
+from fwi_predict.geo.ee import GFS_COMMON_BANDS
+from fwi_predict.pipeline import clean_gfs, read_gfs_export
+from fwi_predict.storage import MemoryStorage
+
+FORECAST_LABELS = ['8', '15', '-9', 'sample', 'three_day_cum']
+
+
+def make_export(sample_idx: list, seed: int = 0) -> pd.DataFrame:
+	"""Long format export with every column Earth Engine writes, in its column order."""
+	rng = np.random.default_rng(seed)
+	export = pd.DataFrame({
+		'system:index': [f"{i}_{j}" for i in sample_idx for j in range(len(FORECAST_LABELS))],
+		'forecast_creation_dt': '2024060100',
+		'forecast_hour': '012',
+		'forecast_time': FORECAST_LABELS * len(sample_idx),
+		'num_sum': 1.0,
+		'sample_idx': np.repeat(sample_idx, len(FORECAST_LABELS)),
+		**{band: rng.normal(size=len(sample_idx) * len(FORECAST_LABELS)).round(4) for band in GFS_COMMON_BANDS},
+		'.geo': '{"type":"Point","coordinates":[88.0,22.0]}'
+	})
+	# Missing values are written as empty fields.
+	export.loc[1, GFS_COMMON_BANDS[0]] = np.nan
+	return export.sample(frac=1, random_state=seed)
+
+
+def test_clean_gfs_round_trips_export():
+	shards = [make_export([3, 0, 7], seed=0), make_export([1, 5], seed=1)]
+	storage = MemoryStorage({f"export/shard{i:03d}.csv": shard.to_csv(index=False).encode()
+													 for i, shard in enumerate(shards)})
+
+	cleaned = clean_gfs(read_gfs_export(storage, storage.list('export/*.csv')))
+
+	expected = pd.concat(shards).pivot(index='sample_idx', columns='forecast_time',
+																		 values=GFS_COMMON_BANDS + ['num_sum'])
+	expected.columns = [f"{col}_{time}" for col, time in expected.columns]
+	assert cleaned.index.name == 'sample_idx'
+	assert cleaned.index.tolist() == [0, 1, 3, 5, 7]
+	assert cleaned.columns.tolist() == expected.columns.tolist()
+	assert (cleaned.dtypes == np.float32).all()
+	np.testing.assert_allclose(cleaned.to_numpy(), expected.to_numpy(dtype=np.float32), rtol=1e-6)
+	assert cleaned.isna().sum().sum() == len(shards)
+
+
+def test_clean_gfs_rejects_duplicate_forecasts():
+	export = make_export([0, 1]).sort_values(['sample_idx', 'forecast_time'])
+	export.iloc[1, export.columns.get_loc('forecast_time')] = export.iloc[0]['forecast_time']
+	with pytest.raises(ValueError, match='duplicate'):
+		clean_gfs(export)
+
+
+@pytest.mark.parametrize('error', [TimeoutError("timed out"), ConnectionResetError("reset"),
+																	 requests.ConnectionError("dropped")])
+def test_sync_transport_errors_fall_back_to_export(monkeypatch, error):
+	samples = gpd.GeoDataFrame({
+		'sample_idx': [0, 1],
+		'sample_dt': pd.to_datetime(['2024-06-01 09:00', '2024-06-01 16:00']).tz_localize('Asia/Kolkata'),
+		'geometry': [Point(88, 22), Point(88.5, 22)]
+	}, crs=4326)
+
+	def compute(*args, **kwargs):
+		raise error
+
+	exported = make_export([0, 1])
+	monkeypatch.setattr(pipeline, 'initialize', lambda project: None)
+	monkeypatch.setattr(pipeline, 'compute_forecasts_for_samples', compute)
+	monkeypatch.setattr(pipeline, 'export_gfs_features', lambda *args, **kwargs: exported)
+
+	features = pipeline.get_gfs_features(samples, 'export.csv', None, 'test', deduplicate=False)
+	assert features.index.tolist() == [0, 1]
@@ -0,0 +1,111 @@
+"""In-process registry of trained models."""
+import json
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import LabelEncoder
+
+from fwi_predict import registry as model_registry
+from fwi_predict.registry import ModelRegistry
+
+FEATURES = ['temperature_2m_above_ground_8', 'hour', 'month']
+
+
+def make_data(n: int = 60, seed: int = 0):
+	rng = np.random.default_rng(seed)
+	X = pd.DataFrame(rng.normal(size=(n, len(FEATURES))), columns=FEATURES)
+	y = np.where(X['temperature_2m_above_ground_8'] > 0, 'above', 'below')
+	return X, y
+
+
+def save_pickle(obj, path) -> None:
+	path.parent.mkdir(parents=True, exist_ok=True)
+	with open(path, 'wb') as f:
+		pickle.dump(obj, f)
+
+
+def save_model(root, model_set: str, target: str, name: str, numpy_fit: bool = False):
+	X, y = make_data()
+	encoder = LabelEncoder().fit(y)
+	model = LogisticRegression().fit(X.to_numpy() if numpy_fit else X, encoder.transform(y))
+	save_pickle(model, root / model_set / target / f"{name}.pkl")
+	save_pickle(encoder, root / model_set / target / 'encoder.pkl')
+	return model
+
+
+@pytest.fixture
+def pickle_loads(monkeypatch):
+	loads = []
+	load_pickle = model_registry._load_pickle
+	monkeypatch.setattr(model_registry, '_load_pickle', lambda path: loads.append(path.name) or load_pickle(path))
+	return loads
+
+
+def test_models_are_indexed_without_loading(tmp_path, pickle_loads):
+	for name in ['XGBoost', 'Random Forest']:
+		save_model(tmp_path, 'jun_21_dec_24', 'do_in_range', name)
+	save_model(tmp_path, 'other_set', 'do_in_range', 'XGBoost')
+
+	registry = ModelRegistry(tmp_path)
+	assert len(registry.list()) == 3 and len(registry.list(model_set='other_set')) == 1
+	assert pickle_loads == []
+
+	with pytest.raises(KeyError, match='Pass model_set'):
+		registry.find('do_in_range', 'XGBoost')
+	with pytest.raises(KeyError, match='No model'):
+		registry.find('do_in_range', 'SVM')
+	assert registry.find('do_in_range', 'XGBoost', model_set='other_set').model_set == 'other_set'
+
+
+def test_least_recently_used_models_are_evicted(tmp_path, pickle_loads):
+	for name in ['a', 'b', 'c']:
+		save_model(tmp_path, 'set', 'do_in_range', name)
+	registry = ModelRegistry(tmp_path, max_loaded=2)
+
+	first = registry.get('do_in_range', 'a')
+	registry.get('do_in_range', 'b')
+	assert registry.get('do_in_range', 'a') is first # Now the most recently used.
+	registry.get('do_in_range', 'c') # Evicts b.
+	assert list(key[2] for key in registry._loaded) == ['a', 'c']
+
+	registry.get('do_in_range', 'b')
+	assert [name for name in pickle_loads if name != 'encoder.pkl'] == ['a.pkl', 'b.pkl', 'c.pkl', 'b.pkl']
+	assert list(key[2] for key in registry._loaded) == ['c', 'b']
+
+
+def test_encoders_are_loaded_once_per_target(tmp_path, pickle_loads):
+	for name in ['a', 'b']:
+		save_model(tmp_path, 'set', 'do_in_range', name)
+	save_model(tmp_path, 'set', 'ph_in_range', 'a')
+	registry = ModelRegistry(tmp_path, max_loaded=1)
+
+	a, b = registry.get('do_in_range', 'a'), registry.get('do_in_range', 'b')
+	assert a.encoder is b.encoder and list(a.encoder.classes_) == ['above', 'below']
+	assert registry.get('do_in_range', 'a').encoder is a.encoder # Reloaded after eviction.
+	assert registry.get('ph_in_range', 'a').encoder is not a.encoder
+	assert pickle_loads.count('encoder.pkl') == 2
+
+
+def test_missing_features_raise(tmp_path):
+	save_model(tmp_path, 'set', 'do_in_range', 'named')
+	save_model(tmp_path, 'set', 'do_in_range', 'unnamed', numpy_fit=True)
+	save_model(tmp_path, 'set', 'do_in_range', 'listed', numpy_fit=True)
+	(tmp_path / 'set' / 'do_in_range' / 'listed_features.json').write_text(json.dumps(FEATURES))
+	save_model(tmp_path, 'set', 'do_in_range', 'mismatched')
+	(tmp_path / 'set' / 'do_in_range' / 'mismatched_features.json').write_text(json.dumps(FEATURES[::-1]))
+	registry = ModelRegistry(tmp_path)
+
+	loaded = registry.get('do_in_range', 'named')
+	assert loaded.feature_names == FEATURES
+	loaded.check_features(FEATURES + ['pond_id'])
+	with pytest.raises(ValueError, match=r"missing required features: \['month'\]"):
+		loaded.check_features(FEATURES[:2])
+
+	assert registry.get('do_in_range', 'listed').feature_names == FEATURES
+	with pytest.raises(ValueError, match='no feature_names_in_'):
+		registry.get('do_in_range', 'unnamed')
+	with pytest.raises(ValueError, match='do not match'):
+		registry.get('do_in_range', 'mismatched')
@@ -0,0 +1,63 @@
+"""Resumable pipeline runs."""
+from concurrent.futures import ThreadPoolExecutor
+
+import geopandas as gpd
+import pandas as pd
+from shapely.geometry import Point
+
+from fwi_predict.run import PipelineRun, fingerprint
+
+
+def make_samples(x: float = 88.0) -> gpd.GeoDataFrame:
+	return gpd.GeoDataFrame({
+		'sample_idx': [0, 1],
+		'sample_dt': pd.to_datetime(['2024-06-01 09:00', '2024-06-01 16:00']).tz_localize('Asia/Kolkata'),
+		'geometry': [Point(x, 22), Point(88.5, 22)]
+	}, crs=4326)
+
+
+def test_completed_stages_are_reused(tmp_path):
+	calls = []
+	PipelineRun(tmp_path).stage('plan', lambda: calls.append('plan') or [1, 2])
+	assert PipelineRun(tmp_path).stage('plan', lambda: calls.append('plan') or [3]) == [1, 2]
+	assert calls == ['plan']
+
+
+def test_failed_stages_run_again(tmp_path):
+	run = PipelineRun(tmp_path)
+	assert run.stage('export', lambda: None) is None
+	assert not PipelineRun(tmp_path).is_complete('export')
+
+
+def test_fingerprint_hashes_frames_by_content():
+	inputs = {'samples': make_samples(), 'feature_names': ['month']}
+	assert fingerprint(inputs) == fingerprint({'feature_names': ['month'], 'samples': make_samples()})
+	assert fingerprint(inputs) != fingerprint({'samples': make_samples(x=88.25), 'feature_names': ['month']})
+	assert fingerprint(inputs) != fingerprint({'samples': make_samples(), 'feature_names': ['hour']})
+
+
+def test_changed_inputs_start_run_over(tmp_path):
+	inputs = {'samples': make_samples(), 'feature_names': ['month']}
+	run = PipelineRun(tmp_path, inputs=inputs)
+	run.stage('plan', lambda: 'plan')
+	run.set('tasks', {'export.csv': 'TASK'})
+
+	resumed = PipelineRun(tmp_path, inputs={'samples': make_samples(), 'feature_names': ['month']})
+	assert resumed.is_complete('plan') and resumed.get('tasks') == {'export.csv': 'TASK'}
+
+	restarted = PipelineRun(tmp_path, inputs={'samples': make_samples(x=88.25), 'feature_names': ['month']})
+	assert not restarted.is_complete('plan') and restarted.get('tasks') is None
+	assert not (tmp_path / 'plan.pkl').exists()
+	assert restarted.stage('plan', lambda: 'new plan') == 'new plan'
+	assert PipelineRun(tmp_path, inputs={'samples': make_samples(x=88.25), 'feature_names': ['month']}).is_complete('plan')
+
+
+def test_concurrent_updates_keep_every_entry(tmp_path):
+	run = PipelineRun(tmp_path)
+	with ThreadPoolExecutor(8) as executor:
+		list(executor.map(lambda i: run.update('tasks', {f"shard_{i}.csv": f"TASK_{i}"}), range(64)))
+
+	expected = {f"shard_{i}.csv": f"TASK_{i}" for i in range(64)}
+	assert run.get('tasks') == expected
+	assert PipelineRun(tmp_path).get('tasks') == expected
+	assert not list(tmp_path.glob('*.tmp'))
@@ -0,0 +1,81 @@
+"""Scoring many models on one shared feature matrix."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import LabelEncoder
+from sklearn.tree import DecisionTreeClassifier
+
+from fwi_predict.registry import LoadedModel, ModelSpec
+from fwi_predict.scoring import ScoringEngine, get_score_label
+
+
+def make_features(n: int = 80, seed: int = 0) -> pd.DataFrame:
+	rng = np.random.default_rng(seed)
+	return pd.DataFrame(rng.normal(size=(n, 4)).astype(np.float32), columns=['a', 'b', 'c', 'd'])
+
+
+def fit(target: str, name: str, feature_names: list, y: np.ndarray, model, encode: bool = True) -> LoadedModel:
+	X = make_features()[feature_names]
+	encoder = LabelEncoder().fit(y) if encode else None
+	model.fit(X, encoder.transform(y) if encode else y)
+	return LoadedModel(ModelSpec('set', target, name), model, encoder, feature_names)
+
+
+@pytest.fixture
+def models():
+	features = make_features()
+	do_classes = np.where(features['a'] > 0, 'above', 'below')
+	ph_classes = np.digitize(features['c'] + features['d'], [-0.5, 0.5])
+	return [
+		fit('do_in_range', 'Logistic', ['a', 'b'], do_classes, LogisticRegression()),
+		# Non-contiguous columns of the shared matrix.
+		fit('do_in_range', 'Decision Tree', ['a', 'c'], do_classes, DecisionTreeClassifier(max_depth=3)),
+		# Three classes, not encoded.
+		fit('ph_in_range', 'Logistic', ['d', 'c', 'a'], ph_classes, LogisticRegression(), encode=False)
+	]
+
+
+def test_columns_are_sliced_per_model(models):
+	engine = ScoringEngine(models)
+	assert engine.feature_names == ['a', 'b', 'c', 'd']
+	assert engine._columns[0] == slice(0, 2)
+	np.testing.assert_array_equal(engine._columns[1], [0, 2])
+	np.testing.assert_array_equal(engine._columns[2], [3, 2, 0])
+
+	X = engine.build(make_features(seed=1))
+	assert X.dtype == np.float32 and X.flags['C_CONTIGUOUS']
+	assert np.shares_memory(X[:, engine._columns[0]], X)
+
+
+def test_labels_decode_classes(models):
+	labels = ScoringEngine(models).labels
+	assert labels == ['do_in_range_above_logistic', 'do_in_range_below_logistic',
+										'do_in_range_above_decision_tree', 'do_in_range_below_decision_tree',
+										'ph_in_range_0_logistic', 'ph_in_range_1_logistic', 'ph_in_range_2_logistic']
+
+
+@pytest.mark.parametrize('n_jobs', [1, 3])
+def test_scores_match_model_predictions(models, n_jobs):
+	engine = ScoringEngine(models)
+	features = make_features(seed=2)
+	scores = engine.score_frame(features.assign(pond_id=1), n_jobs=n_jobs)
+	assert scores.index.equals(features.index) and list(scores.columns) == engine.labels
+
+	for loaded, outputs in zip(models, engine._outputs):
+		X = features[loaded.feature_names]
+		probs = scores.iloc[:, outputs].to_numpy()
+		np.testing.assert_allclose(probs, loaded.model.predict_proba(X), rtol=1e-6)
+
+		# The most probable label decodes to the model's prediction.
+		predicted = loaded.model.predict(X)
+		if loaded.encoder is not None:
+			predicted = loaded.encoder.inverse_transform(predicted)
+		best_labels = np.asarray(engine.labels[outputs])[probs.argmax(axis=1)]
+		expected = [get_score_label(loaded.spec.target, label, loaded.spec.name) for label in predicted]
+		np.testing.assert_array_equal(best_labels, expected)
+
+
+def test_missing_features_raise(models):
+	with pytest.raises(ValueError, match=r"Missing required features: \['d'\]"):
+		ScoringEngine(models).score(make_features().drop(columns='d'))
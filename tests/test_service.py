@@ -0,0 +1,109 @@
+"""Model inputs from stored features and the prediction service built on them."""
+import json
+import threading
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Point
+
+from fwi_predict import service as prediction_service
+from fwi_predict.daily import get_feature_columns, prep_model_input
+from fwi_predict.registry import LoadedModel, ModelSpec
+from fwi_predict.service import PredictionServer, PredictionService, make_handler
+from fwi_predict.store import FeatureStore
+
+FEATURE_NAMES = ['winkler', 'pond_depth_meters', 'month', 'half_hour', 'morning']
+
+
+def make_features(n_ponds: int = 3) -> gpd.GeoDataFrame:
+	sample_dt = pd.to_datetime(['2024-06-01 09:00', '2024-06-01 16:40']).tz_localize('Asia/Kolkata')
+	return gpd.GeoDataFrame({
+		'pond_id': np.repeat(np.arange(n_ponds), 2),
+		'sample_dt': np.tile(sample_dt, n_ponds),
+		'do_winkler': True,
+		'pond_depth_meters': 1.5,
+		'hour': np.tile(sample_dt.hour, n_ponds),
+		'month': 6,
+		'geometry': [Point(88 + i / 10, 22) for i in np.repeat(np.arange(n_ponds), 2)]
+	}, crs=4326)
+
+
+def test_model_inputs_derive_training_features():
+	assert get_feature_columns(FEATURE_NAMES) == ['do_winkler', 'pond_depth_meters', 'month', 'sample_dt', 'hour']
+
+	X = prep_model_input(make_features(1), FEATURE_NAMES)
+	assert X.columns.tolist() == FEATURE_NAMES
+	assert X['winkler'].tolist() == [True, True]
+	assert X['half_hour'].tolist() == [18, 33]
+	assert X['morning'].tolist() == [True, False]
+
+
+class FakeModel:
+	classes_ = np.array([0, 1])
+
+	def __init__(self, fail: bool = False):
+		self.fail = fail
+
+
+	def predict_proba(self, X):
+		if self.fail:
+			raise RuntimeError("Model failed.")
+		return np.tile([0.25, 0.75], (len(X), 1))
+
+
+class FakeEncoder:
+
+	def inverse_transform(self, y):
+		return np.where(y == 1, 'in_range', 'out_of_range')
+
+
+class FakeRegistry:
+
+	def __init__(self, model: FakeModel):
+		self.model = model
+
+
+	def get(self, target, name, model_set=None):
+		return LoadedModel(ModelSpec(model_set, target, name), self.model, FakeEncoder(), FEATURE_NAMES)
+
+
+def make_service(tmp_path, monkeypatch, features: pd.DataFrame, model: FakeModel = None) -> PredictionService:
+	FeatureStore(tmp_path / 'store').write(features)
+	make_features().drop_duplicates('pond_id')[['pond_id', 'geometry']].to_file(tmp_path / 'ponds.geojson')
+	monkeypatch.setattr(prediction_service, 'get_registry', lambda root: FakeRegistry(model or FakeModel()))
+	return PredictionService(feature_store_dir=tmp_path / 'store', pond_metadata_path=tmp_path / 'ponds.geojson')
+
+
+def test_service_predicts_from_stored_features(tmp_path, monkeypatch):
+	service = make_service(tmp_path, monkeypatch, make_features())
+	try:
+		prediction = service.predict_pond(1, '2024-06-01 17:00')
+		assert prediction['prediction'] == 'in_range' and prediction['prob'] == 0.75
+		assert prediction['sample_dt'] == '2024-06-01T16:40:00+05:30'
+	finally:
+		service.close()
+
+
+def test_service_refuses_stores_missing_model_columns(tmp_path, monkeypatch):
+	with pytest.raises(ValueError, match=r"lack columns \['do_winkler'\]"):
+		make_service(tmp_path, monkeypatch, make_features().drop(columns='do_winkler'))
+
+
+def test_unexpected_errors_answer_500(tmp_path, monkeypatch):
+	service = make_service(tmp_path, monkeypatch, make_features(), model=FakeModel(fail=True))
+	server = PredictionServer(('127.0.0.1', 0), make_handler(service))
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	try:
+		with pytest.raises(HTTPError) as error:
+			urlopen(f"http://127.0.0.1:{server.server_port}/predict?date=2024-06-01", timeout=10)
+		assert error.value.code == 500
+		assert json.loads(error.value.read()) == {'error': "RuntimeError: Model failed."}
+	finally:
+		server.shutdown()
+		server.server_close()
+		service.close()
@@ -0,0 +1,250 @@
+"""Skipping and resuming file transfers between storage backends."""
+import numpy as np
+import pytest
+
+from fwi_predict.gcs import GCSStorage, download_files, upload_files
+from fwi_predict.storage import LocalStorage, MemoryStorage, MirroredStorage, Storage, file_crc32c
+
+
+def make_files(n: int = 5, size: int = 1000, seed: int = 0) -> dict:
+	rng = np.random.default_rng(seed)
+	return {f"exports/part_{i}.csv": rng.bytes(size) for i in range(n)}
+
+
+class CountingStorage(MemoryStorage):
+	"""`MemoryStorage` recording the names it transfers."""
+
+	def __init__(self, files: dict = None):
+		super().__init__(files)
+		self.gets, self.puts = [], []
+
+
+	def _get(self, name, path):
+		self.gets.append(name)
+		return super()._get(name, path)
+
+
+	def _put(self, path, name):
+		self.puts.append(name)
+		return super()._put(path, name)
+
+
+def test_download_skips_matching_files(tmp_path):
+	files = make_files()
+	storage = CountingStorage(files)
+	paths = download_files('bucket', 'exports/*.csv', tmp_path, storage_backend=storage)
+
+	assert sorted(storage.gets) == sorted(files)
+	assert all(path.read_bytes() == files[path.relative_to(tmp_path).as_posix()] for path in paths)
+
+	# An interrupted run left one file missing; re-running only fetches that file.
+	paths[2].unlink()
+	storage.gets.clear()
+	download_files('bucket', 'exports/*.csv', tmp_path, storage_backend=storage)
+	assert storage.gets == ['exports/part_2.csv']
+
+
+def test_download_refetches_files_with_different_content(tmp_path):
+	files = make_files()
+	storage = CountingStorage(files)
+	download_files('bucket', 'exports/*.csv', tmp_path, storage_backend=storage)
+
+	# Same size, different bytes: only the CRC32C tells them apart.
+	storage.files['exports/part_1.csv'] = bytes(reversed(files['exports/part_1.csv']))
+	storage.gets.clear()
+	download_files('bucket', 'exports/*.csv', tmp_path, storage_backend=storage)
+
+	assert storage.gets == ['exports/part_1.csv']
+	assert (tmp_path / 'exports/part_1.csv').read_bytes() == storage.files['exports/part_1.csv']
+
+
+def test_upload_skips_matching_files(tmp_path):
+	source = tmp_path / 'source'
+	for name, content in make_files().items():
+		(source / name).parent.mkdir(parents=True, exist_ok=True)
+		(source / name).write_bytes(content)
+
+	storage = CountingStorage()
+	upload_files(source, 'uploads', 'bucket', storage_backend=storage)
+	assert sorted(storage.puts) == [f"uploads/exports/part_{i}.csv" for i in range(5)]
+
+	(source / 'exports/part_3.csv').write_bytes(bytes(1000))
+	storage.puts.clear()
+	upload_files(source, 'uploads', 'bucket', storage_backend=storage)
+	assert storage.puts == ['uploads/exports/part_3.csv']
+	assert storage.files['uploads/exports/part_3.csv'] == bytes(1000)
+
+
+def test_local_storage_round_trip(tmp_path):
+	storage = LocalStorage(tmp_path / 'bucket')
+	source = tmp_path / 'source.csv'
+	source.write_bytes(b'a,b\n1,2\n')
+
+	assert storage.upload(source, 'nested/file.csv') > 0
+	assert storage.upload(source, 'nested/file.csv') == 0
+	assert storage.list('nested/*.csv') == ['nested/file.csv']
+	assert storage.stat('nested/file.csv') == (source.stat().st_size, file_crc32c(source))
+	assert storage.stat('nested/missing.csv') is None
+
+	dest = tmp_path / 'download/file.csv'
+	assert storage.download('nested/file.csv', dest) > 0
+	assert storage.download('nested/file.csv', dest) == 0
+	assert dest.read_bytes() == source.read_bytes()
+
+
+class FakeBlob:
+	"""Blob metadata and ranged downloads of in-memory content."""
+
+	def __init__(self, name: str, content: bytes):
+		self.name = name
+		self.content = content
+		self.size = len(content)
+		self.crc32c = MemoryStorage({name: content}).stat(name)[1]
+		self.starts = []
+
+
+	def download_to_file(self, f, start=None, checksum=None):
+		self.starts.append(start)
+		f.write(self.content[start or 0:])
+
+
+class FakeBucket:
+
+	def __init__(self, blobs: dict):
+		self.name = 'bucket'
+		self.blobs = {name: FakeBlob(name, content) for name, content in blobs.items()}
+
+
+	def get_blob(self, name):
+		return self.blobs.get(name)
+
+
+class FakeClient:
+
+	def __init__(self, blobs: dict):
+		self._bucket = FakeBucket(blobs)
+
+
+	def bucket(self, name):
+		return self._bucket
+
+
+def test_gcs_download_resumes_partial_file(tmp_path):
+	content = make_files(n=1, size=5000)['exports/part_0.csv']
+	client = FakeClient({'part.csv': content})
+	storage = GCSStorage('bucket', client=client)
+
+	(tmp_path / 'part.csv.part').write_bytes(content[:2000])
+	assert storage.download('part.csv', tmp_path / 'part.csv') == 3000
+	assert client._bucket.blobs['part.csv'].starts == [2000]
+	assert (tmp_path / 'part.csv').read_bytes() == content
+	assert not (tmp_path / 'part.csv.part').exists()
+
+
+def test_gcs_download_restarts_stale_partial_file(tmp_path):
+	content = make_files(n=1, size=5000)['exports/part_0.csv']
+	client = FakeClient({'part.csv': content})
+	storage = GCSStorage('bucket', client=client)
+
+	# A partial file of an older version of the blob fails the checksum and is discarded.
+	(tmp_path / 'part.csv.part').write_bytes(bytes(2000))
+	assert storage.download('part.csv', tmp_path / 'part.csv') == 5000
+	assert client._bucket.blobs['part.csv'].starts == [2000, None]
+	assert (tmp_path / 'part.csv').read_bytes() == content
+
+
+def test_gcs_download_raises_on_corrupt_content(tmp_path):
+	client = FakeClient({'part.csv': b'abc'})
+	client._bucket.blobs['part.csv'].content = b'abd'
+	with pytest.raises(IOError, match='Checksum mismatch'):
+		GCSStorage('bucket', client=client).download('part.csv', tmp_path / 'part.csv')
+
+
+@pytest.mark.parametrize('glob, expected', [
+	('exports/*.csv', ['exports/a.csv', 'exports/b.csv']),
+	('exports/**.csv', ['exports/a.csv', 'exports/b.csv', 'exports/shard_1/c.csv', 'exports/shard_2/d.csv']),
+	('exports/**/c.csv', ['exports/shard_1/c.csv']),
+	('exports/**/a.csv', ['exports/a.csv']),
+	('exports/shard_?/*.csv', ['exports/shard_1/c.csv', 'exports/shard_2/d.csv']),
+	('exports/[!a].csv', ['exports/b.csv']),
+	('exports/shard_[2-9]/*', ['exports/shard_2/d.csv']),
+	('exports/a.csv', ['exports/a.csv'])
+])
+def test_memory_storage_glob_matches_gcs(glob, expected):
+	names = ['exports/a.csv', 'exports/b.csv', 'exports/shard_1/c.csv', 'exports/shard_2/d.csv', 'exportsXa.csv']
+	assert MemoryStorage({name: b'' for name in names}).list(glob) == expected
+
+
+def test_storage_requires_all_methods():
+	class ListOnlyStorage(Storage):
+		def list(self, glob):
+			return []
+
+	with pytest.raises(TypeError):
+		ListOnlyStorage()
+
+
+class RemoteStorage(MemoryStorage):
+	"""`MemoryStorage` counting the calls a mirror makes to it."""
+
+	def __init__(self, files: dict = None):
+		super().__init__(files)
+		self.calls = 0
+
+
+	def list(self, glob):
+		self.calls += 1
+		return super().list(glob)
+
+
+	def stat(self, name):
+		self.calls += 1
+		return super().stat(name)
+
+
+def test_complete_mirror_makes_no_remote_calls(tmp_path):
+	files = make_files()
+	remote = RemoteStorage(files)
+	mirror = MirroredStorage(remote, tmp_path / 'mirror')
+	names = list(files)
+	read_all = lambda storage: [storage.open(storage.list(name)[0]).read() for name in names]
+
+	assert read_all(mirror) == list(files.values())
+	assert remote.calls > 0
+
+	# A new process reads the index the previous one left in the mirror.
+	remote.calls = 0
+	mirror = MirroredStorage(remote, tmp_path / 'mirror')
+	assert read_all(mirror) == list(files.values())
+	download_files('bucket', names[0], tmp_path / 'download', storage_backend=mirror)
+	assert remote.calls == 0
+	assert (tmp_path / 'download' / names[0]).read_bytes() == files[names[0]]
+
+	# Verifying checks each file against the backend again.
+	remote.files[names[0]] = bytes(reversed(files[names[0]]))
+	assert MirroredStorage(remote, tmp_path / 'mirror', verify=True).open(names[0]).read() == remote.files[names[0]]
+	assert remote.calls > 0
+
+
+def test_mirror_refetches_truncated_copies(tmp_path):
+	files = make_files()
+	remote = RemoteStorage(files)
+	mirror = MirroredStorage(remote, tmp_path / 'mirror')
+	name = next(iter(files))
+	mirror.open(name).close()
+
+	(tmp_path / 'mirror' / name).write_bytes(files[name][:10])
+	assert mirror.open(name).read() == files[name]
+
+
+def test_mirror_uploads_to_backend_and_mirror(tmp_path):
+	source = tmp_path / 'source.csv'
+	source.write_bytes(b'a,b\n1,2\n')
+	remote = RemoteStorage()
+	mirror = MirroredStorage(remote, tmp_path / 'mirror')
+	mirror.upload(source, 'uploads/source.csv')
+
+	assert remote.files['uploads/source.csv'] == source.read_bytes()
+	remote.calls = 0
+	assert mirror.stat('uploads/source.csv') == (source.stat().st_size, file_crc32c(source))
+	assert remote.calls == 0
@@ -0,0 +1,114 @@
+"""Date-partitioned Parquet feature store."""
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Point
+
+from fwi_predict.store import PROJECTED_COLUMN, FeatureStore
+
+
+def make_features(n_ponds: int = 4, n_days: int = 2) -> gpd.GeoDataFrame:
+	sample_dt = pd.date_range('2024-06-01 09:00', periods=n_days, freq='D', tz='Asia/Kolkata')
+	pond_id = np.tile(np.arange(n_ponds), n_days)
+	return gpd.GeoDataFrame({
+		'pond_id': pond_id,
+		'sample_dt': np.repeat(sample_dt, n_ponds),
+		'temperature_2m_above_ground_8': np.arange(n_ponds * n_days, dtype=np.float64),
+		'total_precipitation_surface_8': np.arange(n_ponds * n_days, dtype=np.float64) * 10,
+		'geometry': [Point(88 + i / 10, 22) for i in pond_id]
+	}, crs=4326)
+
+
+def read_sorted(store: FeatureStore, **kwargs) -> pd.DataFrame:
+	return store.read(**kwargs).sort_values(['sample_dt', 'pond_id']).reset_index(drop=True)
+
+
+def test_round_trip(tmp_path):
+	store = FeatureStore(tmp_path)
+	features = make_features()
+	store.write(features)
+
+	stored = read_sorted(store)
+	assert store.dates() == ['2024-06-01', '2024-06-02']
+	assert stored['temperature_2m_above_ground_8'].dtype == np.float32
+	np.testing.assert_array_equal(stored['temperature_2m_above_ground_8'], features['temperature_2m_above_ground_8'])
+	assert stored.geometry.geom_equals(features.geometry).all()
+	assert (stored['sample_dt'] == features['sample_dt']).all()
+
+
+def test_partial_writes_keep_stored_rows(tmp_path):
+	store = FeatureStore(tmp_path)
+	features = make_features()
+	store.write(features)
+
+	# Recompute two ponds on the first day, with one band left out as by a projected run.
+	update = features.iloc[[0, 1]].copy()
+	update['temperature_2m_above_ground_8'] = [100.0, 101.0]
+	update['total_precipitation_surface_8'] = np.nan
+	update['new_feature'] = [1.0, 2.0]
+	store.write(update)
+
+	stored = read_sorted(store)
+	assert len(stored) == len(features)
+	np.testing.assert_array_equal(stored['temperature_2m_above_ground_8'], [100, 101, 2, 3, 4, 5, 6, 7])
+	np.testing.assert_array_equal(stored['total_precipitation_surface_8'], features['total_precipitation_surface_8'])
+	np.testing.assert_array_equal(stored['new_feature'], [1, 2] + [np.nan] * 6)
+	assert len(list((tmp_path / 'sample_date=2024-06-01').glob('*.parquet'))) == 1
+
+
+@pytest.mark.parametrize('key', ['pond_id', 'sample_dt'])
+def test_write_requires_key_columns(tmp_path, key):
+	store = FeatureStore(tmp_path)
+	with pytest.raises(ValueError, match=key):
+		store.write(make_features().drop(columns=key))
+	assert not store.dates()
+
+
+def test_projected_rows_are_only_read_when_asked_for(tmp_path):
+	store = FeatureStore(tmp_path)
+	features = make_features()
+	store.write(features.iloc[:4]) # Full rows of the first day.
+
+	# A projected run over the first day's ponds 0 and 1 and the whole second day.
+	projected = features.iloc[[0, 1, 4, 5, 6, 7]].assign(total_precipitation_surface_8=np.nan)
+	store.write(projected, projected=True)
+
+	full = read_sorted(store)
+	assert len(full) == 4 and not full[PROJECTED_COLUMN].any()
+	np.testing.assert_array_equal(full['total_precipitation_surface_8'], [0, 10, 20, 30])
+	assert len(store.read(dates=['2024-06-02'])) == 0
+	assert store.read_samples(features.iloc[[0, 4]]) is None
+
+	stored = read_sorted(store, include_projected=True)
+	np.testing.assert_array_equal(stored[PROJECTED_COLUMN], [False] * 4 + [True] * 4)
+	assert len(store.read_samples(features.iloc[[0, 4]], include_projected=True)) == 2
+
+	# Full features computed later make projected rows full.
+	store.write(features.iloc[[4]])
+	assert read_sorted(store, dates=['2024-06-02'])['pond_id'].tolist() == [0]
+
+
+def test_read_filters_dates_ponds_and_columns(tmp_path):
+	store = FeatureStore(tmp_path)
+	store.write(make_features())
+	store.write(make_features().iloc[[0]].assign(new_feature=1.0))
+
+	stored = store.read(dates=['2024-06-02'], pond_ids=[1, 3], columns=['pond_id', 'new_feature'])
+	assert sorted(stored['pond_id']) == [1, 3]
+	assert list(stored.columns) == ['pond_id'] # new_feature is only stored for the first day.
+	assert 'new_feature' in store.columns(['2024-06-01'])
+	assert 'new_feature' not in store.columns(['2024-06-02'])
+
+
+def test_read_samples_aligns_to_samples(tmp_path):
+	store = FeatureStore(tmp_path)
+	features = make_features()
+	store.write(features)
+
+	samples = features.iloc[[5, 0, 3]][['pond_id', 'sample_dt']]
+	stored = store.read_samples(samples, columns=['temperature_2m_above_ground_8'])
+	np.testing.assert_array_equal(stored['temperature_2m_above_ground_8'], [5, 0, 3])
+
+	missing = samples.assign(pond_id=[5, 0, 3])
+	assert store.read_samples(missing) is None
@@ -0,0 +1,103 @@
+"""Vectorized NumPy inference for flattened tree ensembles."""
+import numpy as np
+import pytest
+from sklearn.ensemble import HistGradientBoostingClassifier
+from xgboost import XGBClassifier
+
+from fwi_predict.trees import TreeEnsemble, check_ensemble
+
+
+def make_data(n_classes: int, n: int = 400, missing: float = 0.1, seed: int = 0):
+	"""Inputs on a coarse grid, so many equal split thresholds, with missing values."""
+	rng = np.random.default_rng(seed)
+	X = np.round(rng.normal(scale=2, size=(n, 4)) * 2) / 2
+	score = X[:, 0] + X[:, 1]
+	y = np.digitize(score, np.quantile(score, np.linspace(0, 1, n_classes + 1)[1:-1]))
+	# Missing values of a feature that drives the target, so they are routed both ways.
+	is_missing = rng.random(X.shape) < missing
+	y = np.where(is_missing[:, 0], n_classes - 1, y)
+	X[is_missing] = np.nan
+	return X, y
+
+
+def fit_xgboost(n_classes: int):
+	X, y = make_data(n_classes)
+	return XGBClassifier(n_estimators=20, max_depth=4, learning_rate=0.3).fit(X, y)
+
+
+def fit_hist_gradient_boosting(n_classes: int, missing: float = 0.1):
+	X, y = make_data(n_classes, missing=missing)
+	return HistGradientBoostingClassifier(max_iter=20, max_depth=4, random_state=0).fit(X, y)
+
+
+@pytest.mark.parametrize('n_classes', [2, 3])
+def test_xgboost_probabilities_match(n_classes):
+	classifier = fit_xgboost(n_classes)
+	ensemble = TreeEnsemble.from_xgboost(classifier.get_booster())
+	X, _ = make_data(n_classes, seed=1)
+	X = X.astype(np.float32)
+
+	assert ensemble.predict_proba(X).shape == (len(X), n_classes)
+	np.testing.assert_allclose(ensemble.predict_proba(X), classifier.predict_proba(X), atol=1e-6)
+	assert check_ensemble(ensemble, classifier, X) <= 1e-6
+
+
+@pytest.mark.parametrize('n_classes', [2, 3])
+def test_hist_gradient_boosting_probabilities_match(n_classes):
+	classifier = fit_hist_gradient_boosting(n_classes)
+	nodes = [predictor.nodes for iteration in classifier._predictors for predictor in iteration]
+	splits = np.concatenate([node['missing_go_to_left'][~node['is_leaf'].astype(bool)] for node in nodes])
+	assert splits.any() and not splits.all() # Missing values are sent both left and right.
+
+	ensemble = TreeEnsemble.from_hist_gradient_boosting(classifier)
+	X, _ = make_data(n_classes, seed=1)
+	np.testing.assert_allclose(ensemble.predict_proba(X), classifier.predict_proba(X), atol=1e-10)
+
+
+def test_missing_values_unseen_in_training_match():
+	classifier = fit_hist_gradient_boosting(2, missing=0)
+	ensemble = TreeEnsemble.from_hist_gradient_boosting(classifier)
+	X, _ = make_data(2, missing=0.3, seed=1)
+	np.testing.assert_allclose(ensemble.predict_proba(X), classifier.predict_proba(X), atol=1e-10)
+
+
+def test_all_missing_rows_follow_default_directions():
+	classifier = fit_xgboost(2)
+	ensemble = TreeEnsemble.from_xgboost(classifier.get_booster())
+	X = np.full((3, 4), np.nan, dtype=np.float32)
+	np.testing.assert_allclose(ensemble.predict_proba(X), classifier.predict_proba(X), atol=1e-6)
+
+
+@pytest.mark.parametrize('n_classes', [2, 3])
+def test_threads_and_blocks_do_not_change_results(n_classes):
+	ensemble = TreeEnsemble.from_hist_gradient_boosting(fit_hist_gradient_boosting(n_classes))
+	X, _ = make_data(n_classes, n=1000, seed=2)
+
+	# Leaf values are summed by a matrix product, whose rounding may depend on the block size.
+	single = ensemble.predict_raw(X, block_rows=len(X))
+	np.testing.assert_allclose(ensemble.predict_raw(X), single, rtol=0, atol=1e-12)
+	np.testing.assert_allclose(ensemble.predict_raw(X, n_threads=4, block_rows=37), single, rtol=0, atol=1e-12)
+	np.testing.assert_array_equal(ensemble.predict_proba(X, n_threads=4), ensemble.predict_proba(X))
+	assert ensemble.predict_raw(X[:0]).shape == (0, len(ensemble.baseline))
+
+
+def test_saved_ensembles_load_memory_mapped(tmp_path):
+	ensemble = TreeEnsemble.from_xgboost(fit_xgboost(3).get_booster())
+	params = ensemble.save(tmp_path / 'trees')
+	loaded = TreeEnsemble.load(tmp_path / 'trees', params)
+
+	assert isinstance(loaded.arrays['threshold'], np.memmap) and loaded.dtype == np.float32
+	X, _ = make_data(3, seed=1)
+	np.testing.assert_array_equal(loaded.predict_proba(X), ensemble.predict_proba(X))
+
+
+def test_unsupported_inputs_raise():
+	ensemble = TreeEnsemble.from_xgboost(fit_xgboost(2).get_booster())
+	with pytest.raises(ValueError, match='Expected 4 features'):
+		ensemble.predict_proba(np.zeros((2, 3)))
+
+	X, y = make_data(2, missing=0)
+	X[:, 3] = np.arange(len(X)) % 3
+	categorical = HistGradientBoostingClassifier(max_iter=5, categorical_features=[3]).fit(X, y)
+	with pytest.raises(ValueError, match='categorical'):
+		TreeEnsemble.from_hist_gradient_boosting(categorical)